@@ -0,0 +1,100 @@
+import argparse
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy.sql.expression import text
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_ingest import truncate  # noqa: E402
+from bench_stats_sources import prepare  # noqa: E402
+from candy_delivery.db.dao import DAO  # noqa: E402
+
+COURIER_ID = 1
+
+# every order of the history gets the delivery hours a real order has
+INSERT_DELIVERY_HOURS = text(
+    """
+    INSERT INTO order_delivery_hours (order_id, from_border, to_border)
+    SELECT id, 600 + id % 4 * 200, 759 + id % 4 * 200
+    FROM orders
+    CROSS JOIN generate_series(1, 2)
+    """
+)
+
+TABLE_SIZES = text(
+    """
+    SELECT
+        pg_total_relation_size('orders')
+            + pg_total_relation_size('order_delivery_hours') AS hot,
+        pg_total_relation_size('orders_archive') AS archive
+    """
+)
+
+
+async def sizes(dao: DAO):
+    # VACUUM can't run inside a transaction
+    async with dao._engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.execute(text("VACUUM orders, order_delivery_hours"))
+        result = await conn.execute(TABLE_SIZES)
+        return result.one()
+
+
+async def main(args):
+    db_url = os.getenv("DB_URL")
+    if not db_url:
+        sys.exit("no DB URL!")
+
+    dao = DAO(db_url)
+    await dao.migrate()
+    for orders in args.orders:
+        await prepare(dao, orders, args.regions)
+        async with dao._async_session() as session:
+            async with session.begin():
+                await session.execute(INSERT_DELIVERY_HOURS)
+        before = await dao.get_courier_with_rating(COURIER_ID)
+        hot_before, _ = await sizes(dao)
+
+        # the whole history is older than the horizon
+        horizon = datetime.now(timezone.utc) - timedelta(days=1)
+        batches = []
+        started = time.perf_counter()
+        while True:
+            batch_started = time.perf_counter()
+            moved = await dao.archive_orders(horizon, args.batch_size)
+            batches.append(time.perf_counter() - batch_started)
+            if moved < args.batch_size:
+                break
+        elapsed = time.perf_counter() - started
+
+        after = await dao.get_courier_with_rating(COURIER_ID)
+        assert after == before, (after, before)
+        hot_after, archive = await sizes(dao)
+        mib = 2 ** 20
+        # the space freed in the hot tables is reused by new orders, VACUUM
+        # does not give it back to the file system
+        print(
+            f"{orders:>8} orders {orders / elapsed:>9.0f} orders/s"
+            f"   longest batch {max(batches) * 1000:>7.1f} ms"
+            f"   hot {hot_before / mib:>7.1f} -> {hot_after / mib:>5.1f} MiB"
+            f"   archive {archive / mib:>7.1f} MiB"
+        )
+    await truncate(dao)
+    await dao.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="moving completed orders to orders_archive: throughput,"
+        " time of one batch transaction and table sizes"
+    )
+    parser.add_argument(
+        "--orders", type=int, nargs="+", default=[10000, 100000]
+    )
+    parser.add_argument("--regions", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,203 @@
+import argparse
+import asyncio
+import math
+import os
+import random
+import sys
+import time
+from datetime import datetime
+from functools import partial
+from typing import List, Optional
+
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.sql.expression import text
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_ingest import truncate  # noqa: E402
+from candy_delivery.api.assign_orders import (  # noqa: E402
+    ASSIGN_LOCK_MODES,
+    ASSIGN_LOCK_SKIP_LOCKED,
+    ASSIGN_LOCK_WAIT,
+)
+from candy_delivery.db.dao import DAO  # noqa: E402
+from candy_delivery.db.pool import PoolSettings  # noqa: E402
+from candy_delivery.dispatch import Dispatcher  # noqa: E402
+from candy_delivery.dto.dto import (  # noqa: E402
+    CourierDTO,
+    CourierType,
+    OrderDTO,
+    WorkingHoursDTO,
+)
+
+# every courier and order is in the same few regions and hours, so all
+# assigners compete for one candidate set, as at a dispatch peak; with
+# --spread every courier works in one region of --regions instead
+SHIFT = WorkingHoursDTO(from_border=900, to_border=2100)
+
+COMPLETE_ASSIGNED = text(
+    """
+    UPDATE orders SET completed_at = now()
+    WHERE courier_id IS NOT NULL AND completed_at IS NULL
+    """
+)
+
+
+async def prepare(
+    dao: DAO,
+    rnd: random.Random,
+    assigners: int,
+    orders: int,
+    regions: List[int],
+    spread: bool,
+):
+    await truncate(dao)
+    await dao.add_couriers(
+        [
+            CourierDTO(
+                courier_id=i,
+                courier_type=CourierType.car,
+                regions=[regions[i % len(regions)]] if spread else regions,
+                working_hours=[SHIFT],
+            )
+            for i in range(1, assigners + 1)
+        ]
+    )
+    hours = []
+    for _ in range(orders):
+        start = rnd.randrange(9, 20)
+        hours.append(
+            [
+                WorkingHoursDTO(
+                    from_border=start * 100, to_border=(start + 1) * 100
+                )
+            ]
+        )
+    await dao.add_orders(
+        [
+            OrderDTO(
+                order_id=i,
+                weight=round(rnd.uniform(0.5, 5), 2),
+                region=rnd.choice(regions),
+                delivery_hours=hours[i - 1],
+            )
+            for i in range(1, orders + 1)
+        ]
+    )
+
+
+def percentile(latencies: List[float], p: int) -> float:
+    return latencies[math.ceil(p / 100 * len(latencies)) - 1] * 1000
+
+
+async def run(
+    dao: DAO,
+    assigners: int,
+    rounds: int,
+    skip_locked: bool,
+    dispatcher: Optional[Dispatcher],
+):
+    latencies, errors, assigned = [], 0, 0
+
+    async def assign(courier_id: int):
+        nonlocal errors, assigned
+        started = time.perf_counter()
+        try:
+            func = partial(
+                dao.assign_orders,
+                courier_id,
+                datetime.now(),
+                skip_locked=skip_locked,
+            )
+            # routed the way AssignOrders does with ASSIGN_SHARDS
+            if dispatcher is None:
+                order_ids = await func()
+            else:
+                courier = await dao.get_courier(courier_id)
+                order_ids = await dispatcher.run(courier.regions, func)
+            assigned += len(order_ids)
+        except DBAPIError:
+            errors += 1
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    for _ in range(rounds):
+        await asyncio.gather(
+            *(assign(courier_id) for courier_id in range(1, assigners + 1))
+        )
+        # frees the capacity for the next round
+        async with dao._async_session() as session:
+            async with session.begin():
+                await session.execute(COMPLETE_ASSIGNED)
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return latencies, errors, assigned, elapsed
+
+
+async def main(args):
+    db_url = os.getenv("DB_URL")
+    if not db_url:
+        sys.exit("no DB URL!")
+
+    rnd = random.Random(args.seed)
+    regions = list(range(1, args.regions + 1))
+    modes = [(mode, mode, 0) for mode in ASSIGN_LOCK_MODES] + [
+        (f"{ASSIGN_LOCK_WAIT}+shards", ASSIGN_LOCK_WAIT, args.shards)
+    ]
+    print(
+        f"{'mode':<12} {'assigners':>9} {'calls/s':>9} {'p50 ms':>9}"
+        f" {'p95 ms':>9} {'p99 ms':>9} {'errors':>7} {'orders':>7}"
+    )
+    for assigners in args.assigners:
+        dao = DAO(
+            db_url,
+            pool_settings=PoolSettings(pool_size=assigners, max_overflow=0),
+        )
+        await dao.migrate()
+        for name, mode, shards in modes:
+            await prepare(
+                dao, rnd, assigners, args.orders, regions, args.spread
+            )
+            dispatcher = Dispatcher(shards) if shards else None
+            latencies, errors, assigned, elapsed = await run(
+                dao,
+                assigners,
+                args.rounds,
+                mode == ASSIGN_LOCK_SKIP_LOCKED,
+                dispatcher,
+            )
+            if dispatcher is not None:
+                await dispatcher.close()
+            print(
+                f"{name:<12} {assigners:>9}"
+                f" {len(latencies) / elapsed:>9.1f}"
+                f" {percentile(latencies, 50):>9.2f}"
+                f" {percentile(latencies, 95):>9.2f}"
+                f" {percentile(latencies, 99):>9.2f}"
+                f" {errors:>7} {assigned:>7}"
+            )
+        await truncate(dao)
+        await dao._engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="POST /orders/assign latency with N concurrent assigners"
+    )
+    parser.add_argument(
+        "--assigners", type=int, nargs="+", default=[1, 4, 8, 16]
+    )
+    parser.add_argument("--orders", type=int, default=2000)
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--regions", type=int, default=3)
+    parser.add_argument(
+        "--spread",
+        action="store_true",
+        help="every courier works in one region instead of all of them",
+    )
+    parser.add_argument(
+        "--shards", type=int, default=4, help="ASSIGN_SHARDS of wait+shards"
+    )
+    parser.add_argument("--seed", type=int, default=42)
+    asyncio.run(main(parser.parse_args()))
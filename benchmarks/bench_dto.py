@@ -0,0 +1,154 @@
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from candy_delivery.api.schema import (  # noqa: E402
+    AddOrdersRequest,
+    AddOrdersResponse,
+    CourierType,
+    IdResponse,
+)
+from candy_delivery.dto.dto import OrderDTO, WorkingHoursDTO  # noqa: E402
+
+
+def gen_request(rnd: random.Random, n: int) -> AddOrdersRequest:
+    return AddOrdersRequest(
+        data=[
+            {
+                "order_id": i,
+                "weight": round(rnd.uniform(0.01, 50), 2),
+                "region": rnd.randrange(1, 100),
+                "delivery_hours": ["10:00-12:00", "14:00-15:30"],
+            }
+            for i in range(1, n + 1)
+        ]
+    )
+
+
+def gen_history(rnd: random.Random, n: int):
+    started = datetime(2021, 3, 1)
+    rows = []
+    for i in range(1, n + 1):
+        assigned_at = started + timedelta(minutes=i)
+        rows.append(
+            (
+                i,
+                rnd.randrange(1, 10),
+                assigned_at,
+                assigned_at + timedelta(minutes=rnd.randrange(5, 60)),
+                rnd.choice(list(CourierType)),
+            )
+        )
+    return rows
+
+
+def import_dtos(order_dto, hours_dto, request: AddOrdersRequest):
+    return [
+        order_dto(
+            order_id=order.order_id,
+            weight=order.weight,
+            region=order.region,
+            delivery_hours=[
+                hours_dto(from_border=1000, to_border=1200),
+                hours_dto(from_border=1400, to_border=1530),
+            ],
+        )
+        for order in request.data
+    ]
+
+
+def history_dtos(dto, rows):
+    return [
+        dto(
+            order_id=order_id,
+            region=region,
+            assigned_at=assigned_at,
+            completed_at=completed_at,
+            delivery_type=delivery_type,
+        )
+        for order_id, region, assigned_at, completed_at, delivery_type in rows
+    ]
+
+
+def import_response(response, id_response, request: AddOrdersRequest):
+    return response(
+        orders=[id_response(id=order.order_id) for order in request.data]
+    )
+
+
+def measure(name: str, func, items: int):
+    # timed and traced in separate runs, tracing slows allocations down
+    started = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - started
+
+    tracemalloc.start()
+    result = func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    print(
+        f"{name:<34} {items:>8} items {elapsed * 1000:>9.1f} ms"
+        f" {peak / 2 ** 20:>8.1f} MiB peak"
+    )
+
+
+def main(args):
+    rnd = random.Random(args.seed)
+    request = gen_request(rnd, args.orders)
+    rows = gen_history(rnd, args.history)
+
+    cases = [
+        (
+            "import DTOs, validated",
+            lambda: import_dtos(OrderDTO, WorkingHoursDTO, request),
+            args.orders,
+        ),
+        (
+            "import DTOs, construct",
+            lambda: import_dtos(
+                OrderDTO.construct, WorkingHoursDTO.construct, request
+            ),
+            args.orders,
+        ),
+        (
+            "import response, validated",
+            lambda: import_response(AddOrdersResponse, IdResponse, request),
+            args.orders,
+        ),
+        (
+            "import response, construct",
+            lambda: import_response(
+                AddOrdersResponse.construct, IdResponse.construct, request
+            ),
+            args.orders,
+        ),
+        (
+            "order history, validated",
+            lambda: history_dtos(OrderDTO, rows),
+            args.history,
+        ),
+        (
+            "order history, construct",
+            lambda: history_dtos(OrderDTO.construct, rows),
+            args.history,
+        ),
+    ]
+    for name, func, items in cases:
+        measure(name, func, items)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="validated vs construct() DTOs on trusted paths"
+    )
+    parser.add_argument("--orders", type=int, default=100000)
+    parser.add_argument("--history", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=42)
+    main(parser.parse_args())
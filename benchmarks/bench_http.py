@@ -0,0 +1,419 @@
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import aiohttp
+from aiohttp import web
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datagen import DataGenerator  # noqa: E402
+
+TIME_FORMAT = "%Y-%m-%dT%H:%M:%S.%f%z"
+
+# GET /couriers/{courier_id} is reported per size of the courier history
+HISTORY_BUCKETS = ((0, 0), (1, 9), (10, 99), (100, None))
+
+PERCENTILES = (50, 95, 99)
+
+Request = Tuple[str, Optional[dict]]
+Response = Tuple[int, Optional[dict]]
+
+
+class Recorder:
+    def __init__(self, session: aiohttp.ClientSession, base_url: str):
+        self.session = session
+        self.base_url = base_url.rstrip("/")
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+        self.wall = defaultdict(float)
+
+    async def call(
+        self, endpoint: str, method: str, path: str, payload: Optional[dict]
+    ) -> Response:
+        status, body = 0, None
+        started = time.perf_counter()
+        try:
+            async with self.session.request(
+                method, self.base_url + path, json=payload
+            ) as resp:
+                status = resp.status
+                raw = await resp.read()
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            raw = b""
+        self.latencies[endpoint].append(time.perf_counter() - started)
+        self.statuses[endpoint][status] += 1
+
+        if 200 <= status < 300 and raw[:1] == b"{":
+            body = json.loads(raw)
+        return status, body
+
+    async def run(
+        self,
+        endpoint: str,
+        method: str,
+        requests: Sequence[Request],
+        concurrency: int,
+    ) -> List[Response]:
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def bounded(path: str, payload: Optional[dict]) -> Response:
+            async with semaphore:
+                return await self.call(endpoint, method, path, payload)
+
+        started = time.perf_counter()
+        responses = await asyncio.gather(
+            *(bounded(path, payload) for path, payload in requests)
+        )
+        self.wall[endpoint] += time.perf_counter() - started
+        return responses
+
+    def merge(self, endpoint: str, sources: Sequence[str]):
+        for source in sources:
+            self.latencies[endpoint].extend(self.latencies[source])
+            self.statuses[endpoint].update(self.statuses[source])
+            self.wall[endpoint] += self.wall[source]
+
+    def report(self) -> Dict[str, dict]:
+        report = {}
+        for endpoint, latencies in sorted(self.latencies.items()):
+            if not latencies:
+                continue
+            latencies = sorted(latencies)
+            statuses = self.statuses[endpoint]
+            stats = {
+                "requests": len(latencies),
+                "errors": sum(
+                    count
+                    for status, count in statuses.items()
+                    if not 200 <= status < 300
+                ),
+                "statuses": {
+                    str(status): count
+                    for status, count in sorted(statuses.items())
+                },
+                "rps": round(len(latencies) / self.wall[endpoint], 1),
+            }
+            for p in PERCENTILES:
+                rank = math.ceil(p / 100 * len(latencies)) - 1
+                stats[f"p{p}_ms"] = round(latencies[rank] * 1000, 2)
+            stats["max_ms"] = round(latencies[-1] * 1000, 2)
+            report[endpoint] = stats
+        return report
+
+
+def chunks(items: Sequence, size: int) -> List[Sequence]:
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def now() -> str:
+    return datetime.now().astimezone().strftime(TIME_FORMAT)
+
+
+def bucket_label(completed: int) -> str:
+    for low, high in HISTORY_BUCKETS:
+        if high is None:
+            return f"{low}+"
+        if low <= completed <= high:
+            return f"{low}" if low == high else f"{low}-{high}"
+
+
+async def complete_some(
+    recorder: Recorder,
+    rnd: random.Random,
+    activity: Dict[int, float],
+    history: Counter,
+    assignments: List[Tuple[int, List[dict]]],
+    concurrency: int,
+    batch_size: Optional[int] = None,
+):
+    # each courier delivers its share of the assigned orders, so histories
+    # grow unevenly across couriers
+    completions = []
+    for courier_id, orders in assignments:
+        for order in orders:
+            if rnd.random() < activity[courier_id]:
+                completions.append(
+                    {
+                        "courier_id": courier_id,
+                        "order_id": order["id"],
+                        "complete_time": now(),
+                    }
+                )
+
+    if batch_size is None:
+        responses = await recorder.run(
+            "POST /orders/complete",
+            "POST",
+            [("/orders/complete", payload) for payload in completions],
+            concurrency,
+        )
+        for payload, (status, _) in zip(completions, responses):
+            if status == 200:
+                history[payload["courier_id"]] += 1
+        return
+
+    # as apps syncing offline completions send them
+    batches = chunks(completions, batch_size)
+    responses = await recorder.run(
+        "POST /orders/complete/batch",
+        "POST",
+        [("/orders/complete/batch", {"data": batch}) for batch in batches],
+        concurrency,
+    )
+    for batch, (status, _) in zip(batches, responses):
+        if status == 200:
+            history.update(payload["courier_id"] for payload in batch)
+
+
+async def scenario(recorder: Recorder, args):
+    gen = DataGenerator(args.seed, args.regions)
+    rnd = random.Random(args.seed)
+    courier_ids = list(
+        range(args.id_offset + 1, args.id_offset + args.couriers + 1)
+    )
+    order_ids = list(
+        range(args.id_offset + 1, args.id_offset + args.orders + 1)
+    )
+    activity = {c_id: rnd.betavariate(0.5, 1.5) for c_id in courier_ids}
+    history = Counter()
+    c = args.concurrency
+
+    await recorder.run(
+        "POST /couriers",
+        "POST",
+        [
+            ("/couriers", {"data": gen.couriers(ids)})
+            for ids in chunks(courier_ids, args.chunk_size)
+        ],
+        c,
+    )
+    await recorder.run(
+        "POST /orders",
+        "POST",
+        [
+            ("/orders", {"data": gen.orders(ids)})
+            for ids in chunks(order_ids, args.chunk_size)
+        ],
+        c,
+    )
+
+    for _ in range(args.rounds):
+        responses = await recorder.run(
+            "POST /orders/assign",
+            "POST",
+            [
+                ("/orders/assign", {"courier_id": c_id})
+                for c_id in courier_ids
+            ],
+            c,
+        )
+        assignments = [
+            (c_id, body["orders"])
+            for c_id, (status, body) in zip(courier_ids, responses)
+            if status == 200
+        ]
+        await complete_some(recorder, rnd, activity, history, assignments, c)
+
+    responses = await recorder.run(
+        "POST /orders/assign/batch",
+        "POST",
+        [
+            ("/orders/assign/batch", {"courier_ids": list(ids)})
+            for ids in chunks(courier_ids, args.batch_size)
+        ],
+        c,
+    )
+    assignments = [
+        (assignment["courier_id"], assignment["orders"])
+        for status, body in responses
+        if status == 200
+        for assignment in body["couriers"]
+    ]
+    await complete_some(
+        recorder, rnd, activity, history, assignments, c, args.batch_size
+    )
+
+    updated = rnd.sample(courier_ids, max(1, len(courier_ids) // 10))
+    await recorder.run(
+        "PATCH /couriers/{courier_id}",
+        "PATCH",
+        [
+            (f"/couriers/{c_id}", gen.courier_update())
+            for c_id in updated
+        ],
+        c,
+    )
+    await recorder.run(
+        "PATCH /couriers",
+        "PATCH",
+        [
+            (
+                "/couriers",
+                {
+                    "data": [
+                        {"courier_id": c_id, **gen.courier_update()}
+                        for c_id in ids
+                    ]
+                },
+            )
+            for ids in chunks(courier_ids, args.batch_size)
+        ],
+        c,
+    )
+
+    by_bucket = defaultdict(list)
+    for c_id in courier_ids:
+        by_bucket[bucket_label(history[c_id])].append(c_id)
+    buckets = []
+    for label, ids in sorted(by_bucket.items()):
+        endpoint = f"GET /couriers/{{courier_id}} [history {label}]"
+        buckets.append(endpoint)
+        await recorder.run(
+            endpoint,
+            "GET",
+            [(f"/couriers/{c_id}", None) for c_id in ids] * args.get_repeats,
+            c,
+        )
+    recorder.merge("GET /couriers/{courier_id}", buckets)
+
+    await recorder.run(
+        "GET /metrics", "GET", [("/metrics", None)] * args.metrics_requests, c
+    )
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            check=True,
+            text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def start_in_process() -> Tuple[web.AppRunner, str]:
+    # the application from main.py on a free local port; it still needs
+    # DB_URL, like the real server
+    from main import app
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    host, port = runner.addresses[0][:2]
+    return runner, f"http://{host}:{port}"
+
+
+def print_report(report: Dict[str, dict], baseline: Optional[dict]):
+    print(
+        f"{'endpoint':<48} {'req':>7} {'err':>5} {'rps':>9}"
+        + "".join(f" {f'p{p} ms':>9}" for p in PERCENTILES)
+    )
+    for endpoint, stats in report.items():
+        print(
+            f"{endpoint:<48} {stats['requests']:>7} {stats['errors']:>5}"
+            f" {stats['rps']:>9.1f}"
+            + "".join(f" {stats[f'p{p}_ms']:>9.2f}" for p in PERCENTILES)
+        )
+        old = (baseline or {}).get(endpoint)
+        if old:
+            print(
+                f"{'  vs baseline':<48} {'':>7} {'':>5}"
+                f" {stats['rps'] / old['rps'] - 1:>+9.0%}"
+                + "".join(
+                    f" {stats[f'p{p}_ms'] / old[f'p{p}_ms'] - 1:>+9.0%}"
+                    for p in PERCENTILES
+                )
+            )
+
+
+async def main(args):
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["endpoints"]
+
+    runner, base_url = None, args.url
+    if args.in_process:
+        runner, base_url = await start_in_process()
+
+    started_at = datetime.now().astimezone().isoformat()
+    connector = aiohttp.TCPConnector(limit=args.concurrency)
+    timeout = aiohttp.ClientTimeout(total=args.timeout)
+    try:
+        async with aiohttp.ClientSession(
+            connector=connector, timeout=timeout
+        ) as session:
+            recorder = Recorder(session, base_url)
+            await scenario(recorder, args)
+    finally:
+        if runner is not None:
+            await runner.cleanup()
+
+    report = recorder.report()
+    with open(args.output, "w") as f:
+        json.dump(
+            {
+                "meta": {
+                    "commit": git_commit(),
+                    "started_at": started_at,
+                    "url": None if args.in_process else base_url,
+                    "args": {
+                        k: v
+                        for k, v in vars(args).items()
+                        if k not in ("output", "baseline", "url")
+                    },
+                },
+                "endpoints": report,
+            },
+            f,
+            indent=2,
+            sort_keys=True,
+        )
+        f.write("\n")
+    print_report(report, baseline)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="load every HTTP route and report latency and RPS"
+    )
+    parser.add_argument("--url", default="http://localhost:8080")
+    parser.add_argument(
+        "--in-process",
+        action="store_true",
+        help="serve main.py in this process instead of using --url",
+    )
+    parser.add_argument("--output", default="bench_http.json")
+    parser.add_argument("--baseline", help="report of an earlier run")
+    parser.add_argument("--couriers", type=int, default=200)
+    parser.add_argument("--orders", type=int, default=20000)
+    parser.add_argument("--regions", type=int, default=20)
+    parser.add_argument(
+        "--id-offset",
+        type=int,
+        default=0,
+        help="first courier and order ids are offset + 1",
+    )
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--get-repeats", type=int, default=5)
+    parser.add_argument("--metrics-requests", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--seed", type=int, default=42)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,174 @@
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from typing import List
+
+from sqlalchemy.sql.expression import text
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from candy_delivery.db.dao import DAO  # noqa: E402
+from candy_delivery.db.schema import (  # noqa: E402
+    CourierType,
+    CouriersTable,
+    CourierRegionsTable,
+    CourierWorkingHoursTable,
+    OrderDeliveryHoursTable,
+    OrdersTable,
+)
+from candy_delivery.dto.dto import (  # noqa: E402
+    CourierDTO,
+    CourierType as CourierTypeDTO,
+    OrderDTO,
+    WorkingHoursDTO,
+)
+
+
+def gen_hours(rnd: random.Random, count: int) -> List[WorkingHoursDTO]:
+    hours = []
+    for _ in range(count):
+        start = rnd.randrange(0, 22)
+        hours.append(
+            WorkingHoursDTO(
+                from_border=start * 100, to_border=(start + 2) * 100
+            )
+        )
+    return hours
+
+
+def gen_couriers(rnd: random.Random, n: int) -> List[CourierDTO]:
+    return [
+        CourierDTO(
+            courier_id=i,
+            courier_type=rnd.choice(list(CourierTypeDTO)),
+            regions=rnd.sample(range(1, 100), 3),
+            working_hours=gen_hours(rnd, 2),
+        )
+        for i in range(1, n + 1)
+    ]
+
+
+def gen_orders(rnd: random.Random, n: int) -> List[OrderDTO]:
+    return [
+        OrderDTO(
+            order_id=i,
+            weight=round(rnd.uniform(0.01, 50), 2),
+            region=rnd.randrange(1, 100),
+            delivery_hours=gen_hours(rnd, rnd.randint(1, 3)),
+        )
+        for i in range(1, n + 1)
+    ]
+
+
+# the per-row ORM path DAO used before bulk ingestion, kept as the baseline
+async def orm_add_couriers(dao: DAO, courier_list: List[CourierDTO]):
+    couriers = []
+    for courier in courier_list:
+        courier_model = CouriersTable(
+            id=courier.courier_id,
+            courier_type=CourierType(courier.courier_type.value),
+        )
+        courier_model.regions = [
+            CourierRegionsTable(courier_id=courier.courier_id, region=r)
+            for r in courier.regions
+        ]
+        courier_model.working_hours = [
+            CourierWorkingHoursTable(
+                courier_id=courier.courier_id,
+                from_border=h.from_border,
+                to_border=h.to_border,
+            )
+            for h in courier.working_hours
+        ]
+        couriers.append(courier_model)
+
+    async with dao._async_session() as session:
+        session.add_all(couriers)
+        await session.commit()
+
+
+async def orm_add_orders(dao: DAO, orders_list: List[OrderDTO]):
+    orders = []
+    for order in orders_list:
+        o = OrdersTable(
+            id=order.order_id, weight=order.weight, region=order.region
+        )
+        o.order_hours = [
+            OrderDeliveryHoursTable(
+                order_id=order.order_id,
+                from_border=h.from_border,
+                to_border=h.to_border,
+            )
+            for h in order.delivery_hours
+        ]
+        orders.append(o)
+
+    async with dao._async_session() as session:
+        session.add_all(orders)
+        await session.commit()
+
+
+async def truncate(dao: DAO):
+    async with dao._async_session() as session:
+        async with session.begin():
+            await session.execute(
+                text(
+                    "TRUNCATE couriers, courier_regions,"
+                    " courier_working_hours, orders, order_delivery_hours"
+                    " CASCADE"
+                )
+            )
+
+
+async def measure(dao: DAO, name: str, func, items, rows: int):
+    await truncate(dao)
+    started = time.perf_counter()
+    await func(items)
+    elapsed = time.perf_counter() - started
+    print(
+        f"{name:<16} {rows:>9} rows {elapsed:>8.3f} s"
+        f" {rows / elapsed:>12.0f} rows/s"
+    )
+
+
+async def main(args):
+    db_url = os.getenv("DB_URL")
+    if not db_url:
+        sys.exit("no DB URL!")
+
+    rnd = random.Random(args.seed)
+    couriers = gen_couriers(rnd, args.couriers)
+    orders = gen_orders(rnd, args.orders)
+    courier_rows = sum(
+        1 + len(c.regions) + len(c.working_hours) for c in couriers
+    )
+    order_rows = sum(1 + len(o.delivery_hours) for o in orders)
+
+    dao = DAO(db_url)
+    await dao.migrate()
+    await measure(
+        dao, "orm couriers",
+        lambda items: orm_add_couriers(dao, items), couriers, courier_rows,
+    )
+    await measure(
+        dao, "bulk couriers", dao.add_couriers, couriers, courier_rows
+    )
+    await measure(
+        dao, "orm orders",
+        lambda items: orm_add_orders(dao, items), orders, order_rows,
+    )
+    await measure(dao, "bulk orders", dao.add_orders, orders, order_rows)
+    await truncate(dao)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="rows/sec of POST /couriers and POST /orders ingestion"
+    )
+    parser.add_argument("--couriers", type=int, default=2000)
+    parser.add_argument("--orders", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=42)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,109 @@
+import argparse
+import os
+import random
+import sys
+import timeit
+from typing import List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from candy_delivery.intervals import (  # noqa: E402
+    IntervalSet,
+    format_minutes,
+    parse_window,
+)
+
+
+def gen_windows(rnd: random.Random, count: int) -> List[str]:
+    windows = []
+    for _ in range(count):
+        start = rnd.randrange(0, 24 * 60)
+        end = (start + rnd.randrange(15, 240)) % (24 * 60)
+        windows.append(f"{format_minutes(start)}-{format_minutes(end)}")
+    return windows
+
+
+# the HHMM parsing and the nested loop DAO used before, kept as the baseline
+def parse_hhmm(str_times: List[str]) -> List[Tuple[int, int]]:
+    parsed = []
+    for str_time in str_times:
+        from_border, to_border = str_time.split("-")
+        from_hours, from_minutes = from_border.split(":")
+        to_hours, to_minutes = to_border.split(":")
+
+        from_border = int(from_hours) * 100 + int(from_minutes)
+        to_border = int(to_hours) * 100 + int(to_minutes)
+        if from_border > to_border:
+            parsed.append((from_border, 2400))
+            from_border = 0
+        parsed.append((from_border, to_border))
+    return parsed
+
+
+def nested_loop_fits(shifts, order_hours) -> bool:
+    for order_from, order_to in order_hours:
+        for from_border, to_border in shifts:
+            if order_from >= from_border and order_to <= to_border:
+                return True
+    return False
+
+
+def main(args):
+    rnd = random.Random(args.seed)
+    shift_windows = gen_windows(rnd, args.shifts)
+    orders = [
+        gen_windows(rnd, rnd.randint(1, args.order_windows))
+        for _ in range(args.orders)
+    ]
+
+    old_shifts = parse_hhmm(shift_windows)
+    old_orders = [parse_hhmm(windows) for windows in orders]
+    new_shifts = IntervalSet.parse(shift_windows)
+    new_orders = [
+        [i for window in windows for i in parse_window(window)]
+        for windows in orders
+    ]
+
+    old_fits = [nested_loop_fits(old_shifts, o) for o in old_orders]
+    new_fits = [new_shifts.contains_any(o) for o in new_orders]
+    changed = sum(old != new for old, new in zip(old_fits, new_fits))
+
+    cases = [
+        ("parse hhmm", lambda: [parse_hhmm(w) for w in orders]),
+        (
+            "parse minutes",
+            lambda: [[parse_window(w) for w in ws] for ws in orders],
+        ),
+        ("parse shift sets", lambda: [IntervalSet.parse(w) for w in orders]),
+        (
+            "fits nested loop",
+            lambda: [nested_loop_fits(old_shifts, o) for o in old_orders],
+        ),
+        (
+            "fits interval set",
+            lambda: [new_shifts.contains_any(o) for o in new_orders],
+        ),
+    ]
+    print(
+        f"{args.orders} orders, {args.shifts} shifts"
+        f" ({len(new_shifts)} after merge),"
+        f" {changed} orders fit only across merged shifts"
+    )
+    for name, func in cases:
+        elapsed = min(timeit.repeat(func, number=1, repeat=args.repeat))
+        print(
+            f"{name:<20} {elapsed * 1000:>9.2f} ms"
+            f" {elapsed / args.orders * 1e6:>8.2f} us/order"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="time window parsing and order fit checks"
+    )
+    parser.add_argument("--orders", type=int, default=10000)
+    parser.add_argument("--shifts", type=int, default=8)
+    parser.add_argument("--order-windows", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    main(parser.parse_args())
@@ -0,0 +1,144 @@
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from candy_delivery.db.rating import (  # noqa: E402
+    CourierRating,
+    RatingAccumulator,
+    rating_by_delivery_time,
+)
+from candy_delivery.db.schema import CourierType  # noqa: E402
+from candy_delivery.dto.dto import OrderDTO  # noqa: E402
+
+
+def gen_history(rnd: random.Random, orders: int, regions: int):
+    # (region, assigned_at, completed_at, delivery_type) sorted by region and
+    # completed_at, as the DAO query returns them
+    started = datetime(2021, 3, 1)
+    rows = []
+    for region in range(1, regions + 1):
+        completed_at = started
+        for _ in range(orders // regions):
+            assigned_at = completed_at + timedelta(
+                seconds=rnd.randrange(0, 600)
+            )
+            completed_at = assigned_at + timedelta(
+                seconds=rnd.randrange(60, 3600),
+                microseconds=rnd.randrange(1000),
+            )
+            delivery_type = rnd.choice(list(CourierType))
+            rows.append((region, assigned_at, completed_at, delivery_type))
+    return rows
+
+
+# the view computed the rating like this before, kept as the baseline
+def lists_rating(rows) -> CourierRating:
+    orders = [
+        OrderDTO.construct(
+            region=region,
+            assigned_at=assigned_at,
+            completed_at=completed_at,
+            delivery_type=delivery_type,
+        )
+        for region, assigned_at, completed_at, delivery_type in rows
+    ]
+
+    orders_by_regions = dict()
+    for order in orders:
+        if order.region not in orders_by_regions:
+            orders_by_regions[order.region] = []
+        orders_by_regions[order.region].append(order)
+
+    delivery_times = []
+    for _, region_orders in orders_by_regions.items():
+        region_orders.sort(key=lambda order: order.completed_at)
+        diffs = []
+        for i in range(len(region_orders)):
+            if i == 0:
+                diff = (
+                    region_orders[i].completed_at
+                    - region_orders[i].assigned_at
+                ).total_seconds()
+            else:
+                diff = (
+                    region_orders[i].completed_at
+                    - region_orders[i - 1].completed_at
+                ).total_seconds()
+            diffs.append(diff)
+        delivery_times.append(sum(diffs) / len(diffs))
+
+    money = 0
+    for order in orders:
+        C = 0
+        if order.delivery_type == CourierType.foot:
+            C = 2
+        if order.delivery_type == CourierType.bike:
+            C = 5
+        if order.delivery_type == CourierType.car:
+            C = 9
+        money += 500 * C
+
+    return CourierRating(
+        len(orders), rating_by_delivery_time(min(delivery_times)), money
+    )
+
+
+def streaming_rating(rows) -> CourierRating:
+    accumulator = RatingAccumulator()
+    # fed in batches, the way the DAO reads partitions of the cursor
+    for start in range(0, len(rows), 1000):
+        accumulator.extend(rows[start:start + 1000])
+    return accumulator.result()
+
+
+def measure(name: str, func, rows):
+    # timed and traced in separate runs, tracing slows allocations down
+    started = time.perf_counter()
+    result = func(rows)
+    elapsed = time.perf_counter() - started
+
+    tracemalloc.start()
+    func(rows)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(
+        f"{name:<10} {len(rows):>8} orders {elapsed * 1000:>9.1f} ms"
+        f" {peak / 2 ** 20:>8.2f} MiB peak"
+    )
+    return result
+
+
+def main(args):
+    rnd = random.Random(args.seed)
+
+    # the same numbers to the last bit on many small random histories
+    for _ in range(args.checks):
+        rows = gen_history(
+            rnd, rnd.randrange(1, 50), rnd.randrange(1, 5)
+        ) or gen_history(rnd, 1, 1)
+        assert streaming_rating(rows) == lists_rating(rows), rows
+
+    for orders in args.orders:
+        rows = gen_history(rnd, orders, args.regions)
+        expected = measure("lists", lists_rating, rows)
+        result = measure("streaming", streaming_rating, rows)
+        assert result == expected, (result, expected)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="courier rating and earnings from the order history"
+    )
+    parser.add_argument(
+        "--orders", type=int, nargs="+", default=[1000, 10000, 100000]
+    )
+    parser.add_argument("--regions", type=int, default=5)
+    parser.add_argument("--checks", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=42)
+    main(parser.parse_args())
@@ -0,0 +1,127 @@
+import argparse
+import os
+import random
+import sys
+import timeit
+from collections import defaultdict
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from candy_delivery.db.revalidation import (  # noqa: E402
+    WEIGHT_EPSILON,
+    CourierChange,
+    orders_to_drop,
+)
+from candy_delivery.intervals import (  # noqa: E402
+    IntervalSet,
+    from_hhmm,
+    to_hhmm,
+)
+
+
+def gen_batch(rnd: random.Random, couriers: int, orders_per_courier: int):
+    changes, orders, windows = [], [], []
+    order_id = 0
+    for courier_id in range(1, couriers + 1):
+        shifts = []
+        for _ in range(rnd.randint(1, 3)):
+            start = rnd.randrange(0, 20 * 60)
+            shifts.append((start, start + rnd.randrange(60, 240)))
+        changes.append(
+            CourierChange(
+                courier_id=courier_id,
+                max_weight=rnd.choice((10, 15, 50)),
+                regions=rnd.sample(range(1, 20), 3),
+                shifts=IntervalSet(shifts),
+            )
+        )
+        # most orders still fit the new profile
+        for _ in range(orders_per_courier):
+            order_id += 1
+            region = rnd.choice(changes[-1].regions)
+            if rnd.random() < 0.1:
+                region = rnd.randrange(1, 20)
+            orders.append(
+                (order_id, courier_id, round(rnd.uniform(0.01, 3), 2), region)
+            )
+            for _ in range(rnd.randint(1, 3)):
+                start, end = rnd.choice(shifts)
+                if rnd.random() < 0.2:
+                    start = rnd.randrange(0, 22 * 60)
+                start = rnd.randrange(start, start + 60)
+                end = start + rnd.randrange(15, 60)
+                windows.append((order_id, to_hhmm(start), to_hhmm(end)))
+    return changes, orders, windows
+
+
+# the same rules checked order by order, as update_courier did per courier
+def per_order_loop(changes, orders, windows) -> List[int]:
+    by_courier = {change.courier_id: change for change in changes}
+    order_windows = defaultdict(list)
+    for order_id, from_border, to_border in windows:
+        order_windows[order_id].append(
+            (from_hhmm(from_border), from_hhmm(to_border))
+        )
+
+    kept, dropped = defaultdict(list), []
+    for order_id, courier_id, weight, region in orders:
+        change = by_courier[courier_id]
+        fits = (
+            change.regions is None or region in set(change.regions)
+        ) and (
+            change.shifts is None
+            or change.shifts.contains_any(order_windows[order_id])
+        )
+        if fits:
+            kept[courier_id].append((weight, order_id))
+        else:
+            dropped.append(order_id)
+
+    for courier_id, courier_orders in kept.items():
+        left = sum(weight for weight, _ in courier_orders)
+        max_weight = by_courier[courier_id].max_weight + WEIGHT_EPSILON
+        for weight, order_id in sorted(
+            courier_orders, key=lambda o: (-o[0], o[1])
+        ):
+            if left <= max_weight:
+                break
+            dropped.append(order_id)
+            left -= weight
+    return dropped
+
+
+def main(args):
+    rnd = random.Random(args.seed)
+    for couriers in args.couriers:
+        changes, orders, windows = gen_batch(
+            rnd, couriers, args.orders_per_courier
+        )
+        expected = sorted(per_order_loop(changes, orders, windows))
+        got = sorted(orders_to_drop(changes, orders, windows))
+        assert expected == got, "vectorized result differs"
+
+        cases = [
+            ("loop", lambda: per_order_loop(changes, orders, windows)),
+            ("numpy", lambda: orders_to_drop(changes, orders, windows)),
+        ]
+        for name, func in cases:
+            elapsed = min(timeit.repeat(func, number=1, repeat=args.repeat))
+            print(
+                f"{couriers:>6} couriers {len(orders):>8} orders"
+                f" {name:<6} {elapsed * 1000:>9.2f} ms"
+                f" ({len(expected)} dropped)"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="re-validation of assigned orders on courier updates"
+    )
+    parser.add_argument(
+        "--couriers", type=int, nargs="+", default=[1, 10, 100, 1000]
+    )
+    parser.add_argument("--orders-per-courier", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    main(parser.parse_args())
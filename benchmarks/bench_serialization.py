@@ -0,0 +1,127 @@
+import argparse
+import json
+import os
+import random
+import sys
+import timeit
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from candy_delivery.api import encoding  # noqa: E402
+from candy_delivery.api.schema import (  # noqa: E402
+    AddOrdersResponse,
+    AssignOrdersBatchResponse,
+    AssignOrdersResponse,
+    CompleteOrderResponse,
+    CourierAssignment,
+    GetCourierStatsResponse,
+    IdResponse,
+    UpdateCouriersResponse,
+    UpdatedCourier,
+)
+
+TIME_FORMAT = "%Y-%m-%dT%H:%M:%S.%f%z"
+
+
+def gen_responses(rnd: random.Random, args):
+    assign_time = datetime.now().strftime(TIME_FORMAT)
+    ids = [IdResponse(id=i) for i in range(1, args.ids + 1)]
+    return [
+        ("POST /orders", AddOrdersResponse(orders=ids)),
+        (
+            "POST /orders/assign",
+            AssignOrdersResponse(orders=ids[:20], assign_time=assign_time),
+        ),
+        (
+            "POST /orders/assign/batch",
+            AssignOrdersBatchResponse(
+                couriers=[
+                    CourierAssignment(
+                        courier_id=i,
+                        orders=rnd.sample(ids, 10),
+                        assign_time=assign_time,
+                    )
+                    for i in range(1, args.couriers + 1)
+                ]
+            ),
+        ),
+        ("POST /orders/complete", CompleteOrderResponse(order_id=1)),
+        (
+            "PATCH /couriers",
+            UpdateCouriersResponse(
+                couriers=[
+                    UpdatedCourier(
+                        courier_id=i,
+                        courier_type="bike",
+                        regions=rnd.sample(range(1, 100), 3),
+                        working_hours=["09:00-12:00", "14:00-18:00"],
+                        unassigned_orders=rnd.sample(ids, 2),
+                    )
+                    for i in range(1, args.couriers + 1)
+                ]
+            ),
+        ),
+        (
+            "GET /couriers/{courier_id}",
+            GetCourierStatsResponse(
+                courier_id=1,
+                courier_type="car",
+                regions=[1, 12, 22],
+                working_hours=["09:00-18:00"],
+                rating=4.93,
+                earnings=450000,
+            ),
+        ),
+    ]
+
+
+def main(args):
+    rnd = random.Random(args.seed)
+    cases = [
+        ("dict + json", lambda model: json.dumps(model.dict()).encode()),
+        (
+            "compiled + json",
+            lambda model: encoding.stdlib_dumps(
+                encoding.encoder_for(type(model))(model)
+            ),
+        ),
+    ]
+    if encoding.orjson is not None:
+        cases.append(("compiled + orjson", encoding.encode))
+
+    for route, model in gen_responses(rnd, args):
+        expected = json.loads(json.dumps(model.dict()))
+        for name, func in cases:
+            assert json.loads(func(model)) == expected, f"{route} {name}"
+            elapsed = min(
+                timeit.repeat(
+                    lambda: func(model), number=args.number, repeat=5
+                )
+            )
+            print(
+                f"{route:<28} {name:<18}"
+                f" {elapsed / args.number * 1e6:>10.2f} us/response"
+            )
+
+    now = datetime.now()
+    for name, func in [
+        ("strftime", lambda: now.strftime(TIME_FORMAT)),
+        ("format_datetime", lambda: encoding.format_datetime(now)),
+    ]:
+        elapsed = min(timeit.repeat(func, number=args.number, repeat=5))
+        print(
+            f"{'assign_time':<28} {name:<18}"
+            f" {elapsed / args.number * 1e6:>10.2f} us/value"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="response serialization cost per route"
+    )
+    parser.add_argument("--ids", type=int, default=10000)
+    parser.add_argument("--couriers", type=int, default=100)
+    parser.add_argument("--number", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    main(parser.parse_args())
@@ -0,0 +1,106 @@
+import argparse
+import os
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_APP = (
+    "import time; started = time.perf_counter(); import main;"
+    " print(time.perf_counter() - started)"
+)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def import_time(env) -> float:
+    out = subprocess.run(
+        [sys.executable, "-c", IMPORT_APP],
+        cwd=ROOT,
+        env=env,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return float(out.strip().splitlines()[-1])
+
+
+def time_to_ready(env, timeout: float) -> float:
+    # from starting serve.py to the first 200 from GET /health
+    port = free_port()
+    env = dict(env, WEB_HOST="127.0.0.1", WEB_PORT=str(port))
+    url = f"http://127.0.0.1:{port}/health"
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "serve.py"],
+        cwd=ROOT,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                with urllib.request.urlopen(url, timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - started
+            except OSError:
+                pass
+            if server.poll() is not None:
+                raise RuntimeError("server exited during startup")
+            time.sleep(0.01)
+        raise RuntimeError(f"not ready in {timeout} s")
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait()
+
+
+def main(args):
+    if not os.getenv("DB_URL"):
+        sys.exit("no DB URL!")
+
+    configs = [
+        ("migrate, docs", {}),
+        ("migrate, no docs", {"API_DOCS": "false"}),
+        (
+            "none, no docs",
+            {"DB_SCHEMA_BOOTSTRAP": "none", "API_DOCS": "false"},
+        ),
+    ]
+    over_budget = False
+    print(f"{'config':<18} {'import s':>9} {'ready s':>9}")
+    for name, extra in configs:
+        env = dict(os.environ, WEB_WORKERS=str(args.workers), **extra)
+        imports = [import_time(env) for _ in range(args.repeat)]
+        ready = [time_to_ready(env, args.timeout) for _ in range(args.repeat)]
+        median = statistics.median(ready)
+        print(
+            f"{name:<18} {statistics.median(imports):>9.3f} {median:>9.3f}"
+        )
+        if args.budget is not None and median > args.budget:
+            over_budget = True
+
+    if over_budget:
+        sys.exit(f"startup is over the budget of {args.budget} s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="cold start: app import and serve.py until /health is up"
+    )
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument(
+        "--budget", type=float, help="fail if the median ready time is over"
+    )
+    main(parser.parse_args())
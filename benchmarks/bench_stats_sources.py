@@ -0,0 +1,121 @@
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+from sqlalchemy.sql.expression import text
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_ingest import truncate  # noqa: E402
+from candy_delivery.db.dao import DAO  # noqa: E402
+from candy_delivery.dto.dto import (  # noqa: E402
+    CourierDTO,
+    CourierType,
+    WorkingHoursDTO,
+)
+
+COURIER_ID = 1
+
+# one courier with a long history in a few regions: each order is assigned
+# a few minutes after the previous one in its region was completed
+INSERT_HISTORY = text(
+    """
+    INSERT INTO orders (
+        id, weight, region, courier_id, assigned_at, completed_at,
+        delivery_type
+    )
+    SELECT
+        i,
+        1,
+        i % :regions + 1,
+        :courier_id,
+        TIMESTAMPTZ '2021-03-01' + i * INTERVAL '10 minutes',
+        TIMESTAMPTZ '2021-03-01' + i * INTERVAL '10 minutes'
+            + (CAST(i AS BIGINT) * 7919 % 3600) * INTERVAL '1 second',
+        (ARRAY['foot', 'bike', 'car'])[i % 3 + 1]::courier_type
+    FROM generate_series(1, :orders) AS i
+    """
+)
+
+
+async def prepare(dao: DAO, orders: int, regions: int):
+    await truncate(dao)
+    await dao.add_couriers(
+        [
+            CourierDTO(
+                courier_id=COURIER_ID,
+                courier_type=CourierType.car,
+                regions=list(range(1, regions + 1)),
+                working_hours=[WorkingHoursDTO(from_border=0, to_border=2359)],
+            )
+        ]
+    )
+    async with dao._async_session() as session:
+        async with session.begin():
+            await session.execute(
+                INSERT_HISTORY,
+                {
+                    "orders": orders,
+                    "regions": regions,
+                    "courier_id": COURIER_ID,
+                },
+            )
+            await session.execute(text("ANALYZE orders"))
+
+
+async def measure(name: str, func, orders: int, repeat: int):
+    elapsed = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = await func()
+        elapsed.append(time.perf_counter() - started)
+    print(
+        f"{name:<8} {orders:>8} orders {min(elapsed) * 1000:>10.1f} ms"
+        f"   rating {result.rating} earnings {result.earnings}"
+    )
+    return result
+
+
+async def main(args):
+    db_url = os.getenv("DB_URL")
+    if not db_url:
+        sys.exit("no DB URL!")
+
+    dao = DAO(db_url)
+    await dao.migrate()
+    for orders in args.orders:
+        await prepare(dao, orders, args.regions)
+        python = await measure(
+            "python",
+            lambda: dao.get_courier_with_rating(COURIER_ID),
+            orders,
+            args.repeat,
+        )
+        sql = await measure(
+            "sql",
+            lambda: dao.get_courier_with_rating(COURIER_ID, in_database=True),
+            orders,
+            args.repeat,
+        )
+        assert (python.orders_count, python.rating, python.earnings) == (
+            sql.orders_count,
+            sql.rating,
+            sql.earnings,
+        )
+    await truncate(dao)
+    await dao.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="GET /couriers/{courier_id} rating from the order"
+        " history: Python-side vs SQL-side"
+    )
+    parser.add_argument(
+        "--orders", type=int, nargs="+", default=[1000, 100000, 1000000]
+    )
+    parser.add_argument("--regions", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=3)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,95 @@
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from datetime import datetime
+
+from sqlalchemy import event
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_ingest import gen_couriers, gen_hours, gen_orders, truncate  # noqa
+from candy_delivery.db.dao import DAO  # noqa: E402
+from candy_delivery.dto.dto import CourierDTO  # noqa: E402
+
+
+def gen_reschedule(rnd: random.Random, couriers):
+    return [
+        CourierDTO(
+            courier_id=courier.courier_id,
+            regions=rnd.sample(range(1, 100), 3),
+            working_hours=gen_hours(rnd, 2),
+        )
+        for courier in couriers
+    ]
+
+
+async def prepare(dao: DAO, rnd: random.Random, args):
+    await truncate(dao)
+    couriers = gen_couriers(rnd, args.couriers)
+    await dao.add_couriers(couriers)
+    await dao.add_orders(gen_orders(rnd, args.orders))
+    await dao.assign_orders_batch(
+        [courier.courier_id for courier in couriers],
+        datetime.now(),
+    )
+    return couriers
+
+
+async def measure(dao: DAO, name: str, func, couriers: int):
+    statements = 0
+
+    def count(*args):
+        nonlocal statements
+        statements += 1
+
+    sync_engine = dao._engine.sync_engine
+    event.listen(sync_engine, "before_cursor_execute", count)
+    started = time.perf_counter()
+    try:
+        await func()
+    finally:
+        elapsed = time.perf_counter() - started
+        event.remove(sync_engine, "before_cursor_execute", count)
+    print(
+        f"{name:<12} {couriers:>6} couriers {elapsed:>8.3f} s"
+        f" {statements:>7} statements"
+    )
+
+
+async def main(args):
+    db_url = os.getenv("DB_URL")
+    if not db_url:
+        sys.exit("no DB URL!")
+
+    dao = DAO(db_url)
+    await dao.migrate()
+    rnd = random.Random(args.seed)
+
+    couriers = await prepare(dao, rnd, args)
+    reschedule = gen_reschedule(rnd, couriers)
+
+    async def one_by_one():
+        for update_model in reschedule:
+            await dao.update_courier(update_model)
+
+    await measure(dao, "one by one", one_by_one, len(reschedule))
+
+    couriers = await prepare(dao, rnd, args)
+    reschedule = gen_reschedule(rnd, couriers)
+    await measure(
+        dao, "batch", lambda: dao.update_couriers(reschedule), len(reschedule)
+    )
+    await truncate(dao)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="PATCH /couriers/{id} per courier vs one PATCH /couriers"
+    )
+    parser.add_argument("--couriers", type=int, default=500)
+    parser.add_argument("--orders", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=42)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,104 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from candy_delivery.api.add_orders import AddOrders  # noqa: E402
+from candy_delivery.api.middleware import error_middleware  # noqa: E402
+from candy_delivery.api.streaming import (  # noqa: E402
+    INGEST_SETTINGS_KEY,
+    IngestSettings,
+)
+
+
+# worst case for error reporting: every item of a large import is invalid,
+# so nothing reaches the database and no DB is needed
+def gen_invalid_orders(n: int) -> bytes:
+    return json.dumps(
+        {
+            "data": [
+                {
+                    "order_id": i,
+                    "weight": "heavy",
+                    "region": 1,
+                    "delivery_hours": ["10:00-11:00"],
+                }
+                for i in range(1, n + 1)
+            ]
+        }
+    ).encode()
+
+
+# the previous error_middleware formatting, which decoded the body again
+# for every error detail, kept as the baseline
+def reparse_per_error(body: bytes, errors):
+    ids = []
+    for details in errors:
+        location_part = details["loc"]
+        if len(location_part) > 1:
+            request_body = json.loads(body)
+            request_item = request_body[location_part[0]][location_part[1]]
+            if "order_id" in request_item:
+                ids.append(request_item["order_id"])
+    return ids
+
+
+async def measure_app(body: bytes, stream_threshold: int) -> float:
+    app = web.Application(
+        middlewares=[error_middleware], client_max_size=len(body) + 1
+    )
+    app[INGEST_SETTINGS_KEY] = IngestSettings(
+        stream_threshold=stream_threshold
+    )
+    app.router.add_post("/orders", AddOrders)
+    client = TestClient(TestServer(app))
+    await client.start_server()
+    try:
+        started = time.perf_counter()
+        response = await client.post(
+            "/orders",
+            data=body,
+            headers={"Content-Type": "application/json"},
+        )
+        await response.read()
+        assert response.status == 400, response.status
+        return time.perf_counter() - started
+    finally:
+        await client.close()
+
+
+async def main(args):
+    body = gen_invalid_orders(args.orders)
+    print(f"{args.orders} invalid orders, {len(body) / 1024 ** 2:.1f} MiB")
+
+    elapsed = await measure_app(body, stream_threshold=len(body))
+    print(f"{'buffered':<20} {elapsed:>8.3f} s")
+    elapsed = await measure_app(body, stream_threshold=0)
+    print(f"{'streamed':<20} {elapsed:>8.3f} s")
+
+    errors = [
+        {"loc": ("data", i, "weight")} for i in range(args.baseline_orders)
+    ]
+    started = time.perf_counter()
+    reparse_per_error(body, errors)
+    elapsed = time.perf_counter() - started
+    print(
+        f"{'reparse per error':<20} {elapsed:>8.3f} s"
+        f" (first {args.baseline_orders} errors only)"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="cost of a 400 answer to an import with invalid items"
+    )
+    parser.add_argument("--orders", type=int, default=10000)
+    parser.add_argument("--baseline-orders", type=int, default=1000)
+    asyncio.run(main(parser.parse_args()))
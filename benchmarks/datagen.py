@@ -0,0 +1,114 @@
+import argparse
+import json
+import random
+import sys
+from typing import List, Sequence
+
+COURIER_TYPES = ("foot", "bike", "car")
+
+# typical shift patterns, including ones crossing midnight
+SHIFT_PATTERNS = (
+    ("08:00-12:00", "13:00-17:00"),
+    ("09:00-18:00",),
+    ("07:00-11:00",),
+    ("12:00-16:00", "17:00-21:00"),
+    ("16:00-22:00",),
+    ("18:00-23:00",),
+    ("22:00-02:00",),
+    ("10:00-14:00", "18:00-22:00"),
+)
+
+
+class DataGenerator:
+    # deterministic synthetic couriers and orders as API request items;
+    # regions are skewed, so a few of them get most of the orders
+    def __init__(
+        self,
+        seed: int = 42,
+        regions: int = 20,
+        regions_per_courier: int = 3,
+    ) -> None:
+        self.rnd = random.Random(seed)
+        self.regions = list(range(1, regions + 1))
+        self.region_weights = [1 / region for region in self.regions]
+        self.regions_per_courier = min(regions_per_courier, regions)
+
+    def pick_regions(self, count: int) -> List[int]:
+        picked = set()
+        while len(picked) < count:
+            picked.update(
+                self.rnd.choices(self.regions, self.region_weights, k=count)
+            )
+        return sorted(picked)[:count]
+
+    def shifts(self) -> List[str]:
+        return list(self.rnd.choice(SHIFT_PATTERNS))
+
+    def window(self) -> str:
+        start = self.rnd.randrange(6 * 60, 23 * 60, 15)
+        end = min(start + self.rnd.randrange(30, 181, 15), 24 * 60 - 1)
+        return (
+            f"{start // 60:02d}:{start % 60:02d}"
+            f"-{end // 60:02d}:{end % 60:02d}"
+        )
+
+    def weight(self) -> float:
+        # mostly light parcels with a long tail up to the car capacity
+        weight = self.rnd.lognormvariate(0, 1.2)
+        return round(min(max(weight, 0.01), 50), 2)
+
+    def courier(self, courier_id: int) -> dict:
+        return {
+            "courier_id": courier_id,
+            "courier_type": self.rnd.choice(COURIER_TYPES),
+            "regions": self.pick_regions(
+                self.rnd.randint(1, self.regions_per_courier)
+            ),
+            "working_hours": self.shifts(),
+        }
+
+    def order(self, order_id: int) -> dict:
+        return {
+            "order_id": order_id,
+            "weight": self.weight(),
+            "region": self.rnd.choices(self.regions, self.region_weights)[0],
+            "delivery_hours": [
+                self.window() for _ in range(self.rnd.randint(1, 3))
+            ],
+        }
+
+    def couriers(self, ids: Sequence[int]) -> List[dict]:
+        return [self.courier(courier_id) for courier_id in ids]
+
+    def orders(self, ids: Sequence[int]) -> List[dict]:
+        return [self.order(order_id) for order_id in ids]
+
+    def courier_update(self) -> dict:
+        return {
+            "courier_type": self.rnd.choice(COURIER_TYPES),
+            "regions": self.pick_regions(self.regions_per_courier),
+            "working_hours": self.shifts(),
+        }
+
+
+def main(args):
+    gen = DataGenerator(args.seed, args.regions, args.regions_per_courier)
+    json.dump(
+        {
+            "couriers": gen.couriers(range(1, args.couriers + 1)),
+            "orders": gen.orders(range(1, args.orders + 1)),
+        },
+        sys.stdout,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="dump synthetic couriers and orders as JSON"
+    )
+    parser.add_argument("--couriers", type=int, default=100)
+    parser.add_argument("--orders", type=int, default=1000)
+    parser.add_argument("--regions", type=int, default=20)
+    parser.add_argument("--regions-per-courier", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    main(parser.parse_args())
@@ -1,30 +1,40 @@
-from aiohttp import web
 from aiohttp_pydantic.oas.typing import r201
 from http import HTTPStatus
 
 from candy_delivery.dto.dto import CourierDTO
-from candy_delivery.api.schema import AddCouriersRequest, AddCouriersResponse
-from candy_delivery.api.base_view import BaseView
+from candy_delivery.api.schema import (
+    AddCouriersRequest, AddCouriersResponse, Courier, IdResponse
+)
+from candy_delivery.api.streaming import IngestView
 
 
-class AddCouriers(BaseView):
+class AddCouriers(IngestView):
+    item_model = Courier
+    id_field = "courier_id"
+    response_key = "couriers"
+
     async def post(
         self, request: AddCouriersRequest
     ) -> r201[AddCouriersResponse]:
-        couriers = []
-        for courier in request.data:
-            couriers.append(
-                CourierDTO(
-                    courier_id=courier.courier_id,
-                    courier_type=courier.courier_type,
-                    regions=[r for r in courier.regions],
-                    working_hours=self.parse_time(courier.working_hours),
-                )
-            )
+        couriers = [self.to_dto(courier) for courier in request.data]
 
         await self.dao.add_couriers(couriers)
 
-        resp = AddCouriersResponse(
-            couriers=[{"id": courier.courier_id} for courier in request.data]
+        resp = AddCouriersResponse.construct(
+            couriers=[
+                IdResponse.construct(id=courier.courier_id)
+                for courier in request.data
+            ]
+        )
+        return self.json_response(resp, status=HTTPStatus.CREATED)
+
+    def to_dto(self, courier: Courier) -> CourierDTO:
+        return CourierDTO.construct(
+            courier_id=courier.courier_id,
+            courier_type=courier.courier_type,
+            regions=courier.regions,
+            working_hours=self.parse_shifts(courier.working_hours),
         )
-        return web.json_response(resp.dict(), status=HTTPStatus.CREATED)
+
+    def ingest(self):
+        return self.dao.ingest_couriers()
@@ -1,30 +1,41 @@
 from http import HTTPStatus
-from aiohttp import web
 from aiohttp_pydantic.oas.typing import r201
 
-from candy_delivery.api.schema import AddOrdersRequest, AddOrdersResponse
-from candy_delivery.api.base_view import BaseView
+from candy_delivery.api.schema import (
+    AddOrdersRequest, AddOrdersResponse, IdResponse, Order
+)
+from candy_delivery.api.streaming import IngestView
 
 from candy_delivery.dto.dto import OrderDTO
 
 
-class AddOrders(BaseView):
+class AddOrders(IngestView):
+    item_model = Order
+    id_field = "order_id"
+    response_key = "orders"
+
     async def post(
         self, request: AddOrdersRequest
     ) -> r201[AddOrdersResponse]:
-        orders = [
-            OrderDTO(
-                order_id=order.order_id,
-                weight=order.weight,
-                region=order.region,
-                delivery_hours=self.parse_time(order.delivery_hours),
-            )
-            for order in request.data
-        ]
+        orders = [self.to_dto(order) for order in request.data]
 
         await self.dao.add_orders(orders)
 
-        resp = AddOrdersResponse(
-            orders=[{"id": order.order_id} for order in request.data]
+        resp = AddOrdersResponse.construct(
+            orders=[
+                IdResponse.construct(id=order.order_id)
+                for order in request.data
+            ]
+        )
+        return self.json_response(resp, status=HTTPStatus.CREATED)
+
+    def to_dto(self, order: Order) -> OrderDTO:
+        return OrderDTO.construct(
+            order_id=order.order_id,
+            weight=order.weight,
+            region=order.region,
+            delivery_hours=self.parse_time(order.delivery_hours),
         )
-        return web.json_response(resp.dict(), status=HTTPStatus.CREATED)
+
+    def ingest(self):
+        return self.dao.ingest_orders()
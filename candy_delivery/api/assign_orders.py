@@ -1,14 +1,26 @@
 from datetime import datetime
-from aiohttp import web
+from functools import partial
 from aiohttp_pydantic.oas.typing import r200
 from sqlalchemy.exc import NoResultFound
 
+from candy_delivery.dispatch import DISPATCHER_KEY
 from candy_delivery.dto.dto import CDNoResultFound
 
 from candy_delivery.api.schema import (
     AssignOrdersRequest, AssignOrdersResponse, IdResponse
 )
 from candy_delivery.api.base_view import BaseView
+from candy_delivery.api.encoding import format_datetime
+
+
+ASSIGN_LOCK_MODE_KEY = "assign_lock_mode"
+
+# "wait" locks every candidate order and waits for concurrent assignments,
+# "skip_locked" locks only the picked orders and skips the ones another
+# courier holds, which may assign less under contention but never blocks
+ASSIGN_LOCK_WAIT = "wait"
+ASSIGN_LOCK_SKIP_LOCKED = "skip_locked"
+ASSIGN_LOCK_MODES = (ASSIGN_LOCK_WAIT, ASSIGN_LOCK_SKIP_LOCKED)
 
 
 class AssignOrders(BaseView):
@@ -16,11 +28,24 @@ class AssignOrders(BaseView):
         self, request: AssignOrdersRequest
     ) -> r200[AssignOrdersResponse]:
         assign_time = datetime.now()
+        mode = self.request.app[ASSIGN_LOCK_MODE_KEY]
+        dispatcher = self.request.app.get(DISPATCHER_KEY)
 
+        assign = partial(
+            self.dao.assign_orders,
+            request.courier_id,
+            assign_time,
+            skip_locked=mode == ASSIGN_LOCK_SKIP_LOCKED,
+        )
         try:
-            order_ids = await self.dao.assign_orders(
-                request.courier_id, assign_time
-            )
+            if dispatcher is None:
+                order_ids = await assign()
+            else:
+                # queued behind the other assignments in the courier's
+                # regions; the cached profile only picks the shards, the
+                # assignment reads it again under the courier's row lock
+                courier = await self.dao.get_courier(request.courier_id)
+                order_ids = await dispatcher.run(courier.regions, assign)
         except NoResultFound as ex:
             raise CDNoResultFound(
                 error=ex,
@@ -29,8 +54,8 @@ class AssignOrders(BaseView):
 
         resp = AssignOrdersResponse(
             orders=[IdResponse(id=o_id) for o_id in order_ids],
-            assign_time=assign_time.strftime(self.get_time_format())
+            assign_time=format_datetime(assign_time)
             if len(order_ids) > 0
             else None,
         )
-        return web.json_response(resp.dict())
+        return self.json_response(resp)
@@ -0,0 +1,62 @@
+from datetime import datetime
+from functools import partial
+from aiohttp_pydantic.oas.typing import r200
+from sqlalchemy.exc import NoResultFound
+
+from candy_delivery.dispatch import DISPATCHER_KEY
+from candy_delivery.dto.dto import CDNoResultFound
+
+from candy_delivery.api.schema import (
+    AssignOrdersBatchRequest,
+    AssignOrdersBatchResponse,
+    CourierAssignment,
+    IdResponse,
+)
+from candy_delivery.api.base_view import BaseView
+from candy_delivery.api.encoding import format_datetime
+from candy_delivery.api.assign_orders import (
+    ASSIGN_LOCK_MODE_KEY, ASSIGN_LOCK_SKIP_LOCKED
+)
+
+
+class AssignOrdersBatch(BaseView):
+    async def post(
+        self, request: AssignOrdersBatchRequest
+    ) -> r200[AssignOrdersBatchResponse]:
+        assign_time = datetime.now()
+        courier_ids = list(dict.fromkeys(request.courier_ids))
+        mode = self.request.app[ASSIGN_LOCK_MODE_KEY]
+        dispatcher = self.request.app.get(DISPATCHER_KEY)
+
+        assign = partial(
+            self.dao.assign_orders_batch,
+            courier_ids,
+            assign_time,
+            skip_locked=mode == ASSIGN_LOCK_SKIP_LOCKED,
+        )
+        try:
+            if dispatcher is None:
+                assigned = await assign()
+            else:
+                # the regions of a batch are only known to the query, so
+                # it waits for every shard
+                assigned = await dispatcher.run_everywhere(assign)
+        except NoResultFound as ex:
+            raise CDNoResultFound(error=ex, details=str(ex))
+
+        formatted_time = format_datetime(assign_time)
+        resp = AssignOrdersBatchResponse(
+            couriers=[
+                CourierAssignment(
+                    courier_id=courier_id,
+                    orders=[
+                        IdResponse(id=o_id) for o_id in assigned[courier_id]
+                    ],
+                    assign_time=formatted_time
+                    if len(assigned[courier_id]) > 0
+                    else None,
+                )
+                for courier_id in courier_ids
+            ]
+        )
+        return self.json_response(resp)
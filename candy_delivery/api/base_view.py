@@ -1,50 +1,75 @@
-from typing import List
+from http import HTTPStatus
+from typing import Callable, Iterable, List
+from aiohttp import web
 from aiohttp_pydantic import PydanticView
+from aiohttp_pydantic.injectors import AbstractInjector, BodyGetter
+from pydantic import BaseModel
 
+from candy_delivery.api.encoding import json_response
+from candy_delivery.api.instrumentation import (
+    TimedDAO, TimedInjector, phase_timer
+)
+from candy_delivery.api.validation import ItemsBodyGetter
 from candy_delivery.db.dao import DAO, DAO_KEY
 
 from candy_delivery.dto.dto import WorkingHoursDTO
+from candy_delivery.intervals import (
+    format_windows, from_hhmm, parse_borders, parse_window, to_hhmm
+)
 from candy_delivery.db.schema import CourierWorkingHoursTable
 
 
 class BaseView(PydanticView):
     @property
     def dao(self) -> DAO:
-        return self.request.app[DAO_KEY]
+        return TimedDAO(self.request.app[DAO_KEY], self.request)
+
+    @staticmethod
+    def parse_func_signature(func: Callable) -> Iterable[AbstractInjector]:
+        injectors = []
+        for injector in PydanticView.parse_func_signature(func):
+            if isinstance(injector, BodyGetter):
+                injector = ItemsBodyGetter(
+                    {injector.arg_name: injector.model}, {}
+                )
+            injectors.append(TimedInjector(injector))
+        return injectors
+
+    def json_response(
+        self, model: BaseModel, status: int = HTTPStatus.OK
+    ) -> web.Response:
+        with phase_timer(self.request, "serialization"):
+            return json_response(model, status=status)
 
     def parse_time(self, str_times: List[str]) -> List[WorkingHoursDTO]:
-        parsed = []
-        for str_time in str_times:
-            from_border, to_border = str_time.split("-")
-            from_hours, from_minutes = from_border.split(":")
-            to_hours, to_minutes = to_border.split(":")
-
-            parsed.append(
-                WorkingHoursDTO(
-                    from_border=(int(from_hours) * 100 + int(from_minutes)),
-                    to_border=(int(to_hours) * 100 + int(to_minutes)),
-                ),
+        return [
+            WorkingHoursDTO.construct(
+                from_border=to_hhmm(start), to_border=to_hhmm(end)
             )
+            for str_time in str_times
+            for start, end in parse_window(str_time)
+        ]
 
-        return parsed
+    def parse_shifts(self, str_times: List[str]) -> List[WorkingHoursDTO]:
+        # one row per shift as sent, so that it is echoed back unchanged;
+        # a shift crossing midnight is split only when orders are matched
+        shifts = []
+        for str_time in str_times:
+            start, end = parse_borders(str_time)
+            shifts.append(
+                WorkingHoursDTO.construct(
+                    from_border=to_hhmm(start), to_border=to_hhmm(end)
+                )
+            )
+        return shifts
 
     def format_time(
         self, db_times: List[CourierWorkingHoursTable]
     ) -> List[str]:
-        formatted = []
-        for raw in db_times:
-            from_h, to_h = raw.from_border // 100, raw.to_border // 100
-            from_hours = str(from_h) if from_h >= 10 else "0" + str(from_h)
-            to_hours = str(to_h) if to_h >= 10 else "0" + str(to_h)
-
-            from_m, to_m = raw.from_border % 100, raw.to_border % 100
-            from_minutes = str(from_m) if from_m >= 10 else str(from_m) + "0"
-            to_minutes = str(to_m) if to_m >= 10 else str(to_m) + "0"
-            formatted.append(
-                f"{from_hours}:{from_minutes}-{to_hours}:{to_minutes}"
-            )
-
-        return formatted
+        return format_windows(
+            (from_hhmm(raw.from_border), from_hhmm(raw.to_border))
+            for raw in db_times
+        )
 
     def get_time_format(self) -> str:
         return "%Y-%m-%dT%H:%M:%S.%f%z"
@@ -1,6 +1,5 @@
 from candy_delivery.dto.dto import CDNoResultFound
 from datetime import datetime
-from aiohttp import web
 from aiohttp_pydantic.oas.typing import r200
 from sqlalchemy.exc import NoResultFound
 
@@ -30,6 +29,6 @@ class CompleteOrder(BaseView):
                 f" or order ID {request.order_id}",
             )
 
-        return web.json_response(
-            CompleteOrderResponse(order_id=request.order_id).dict()
+        return self.json_response(
+            CompleteOrderResponse(order_id=request.order_id)
         )
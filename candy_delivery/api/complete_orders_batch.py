@@ -0,0 +1,42 @@
+from datetime import datetime
+from aiohttp_pydantic.oas.typing import r200
+from sqlalchemy.exc import NoResultFound
+
+from candy_delivery.dto.dto import CDNoResultFound, CompletionDTO
+
+from candy_delivery.api.schema import (
+    CompleteOrdersBatchRequest,
+    CompleteOrdersBatchResponse,
+    IdResponse,
+)
+from candy_delivery.api.base_view import BaseView
+
+
+class CompleteOrdersBatch(BaseView):
+    async def post(
+        self, request: CompleteOrdersBatchRequest
+    ) -> r200[CompleteOrdersBatchResponse]:
+        # apps syncing offline completions may send an order twice, the
+        # first completion of it wins as it would with single requests
+        completions = {}
+        for completion in request.data:
+            if completion.order_id in completions:
+                continue
+            completions[completion.order_id] = CompletionDTO.construct(
+                order_id=completion.order_id,
+                courier_id=completion.courier_id,
+                completed_at=datetime.strptime(
+                    completion.complete_time, self.get_time_format()
+                ),
+            )
+
+        try:
+            await self.dao.complete_orders(list(completions.values()))
+        except NoResultFound as ex:
+            raise CDNoResultFound(error=ex, details=str(ex))
+
+        return self.json_response(
+            CompleteOrdersBatchResponse.construct(
+                orders=[IdResponse.construct(id=o_id) for o_id in completions]
+            )
+        )
@@ -0,0 +1,129 @@
+import json
+from datetime import datetime
+from enum import Enum
+from http import HTTPStatus
+from typing import Any, Callable, Dict, Optional, Type
+
+from aiohttp import web
+from pydantic import BaseModel
+from pydantic.fields import SHAPE_LIST, SHAPE_SINGLETON, ModelField
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+Encoder = Callable[[Any], Any]
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, BaseModel):
+        return encoder_for(type(value))(value)
+    if isinstance(value, datetime):
+        return format_datetime(value)
+    if isinstance(value, Enum):
+        return value.value
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+_stdlib_encoder = json.JSONEncoder(
+    separators=(",", ":"), ensure_ascii=False, default=_default
+)
+
+
+def stdlib_dumps(value: Any) -> bytes:
+    return _stdlib_encoder.encode(value).encode()
+
+
+# both encoders write compact JSON, so responses are the same bytes with
+# or without orjson installed
+if orjson is not None:
+
+    def dumps(value: Any) -> bytes:
+        return orjson.dumps(value, default=_default)
+
+else:
+    dumps = stdlib_dumps
+
+
+def format_datetime(value: datetime) -> str:
+    # the API time format "%Y-%m-%dT%H:%M:%S.%f%z"; isoformat gives the
+    # same string for naive datetimes several times faster than strftime
+    if value.tzinfo is None:
+        return value.isoformat(timespec="microseconds")
+    return value.strftime("%Y-%m-%dT%H:%M:%S.%f%z")
+
+
+_encoders: Dict[Type[BaseModel], Encoder] = {}
+
+
+def encoder_for(model: Type[BaseModel]) -> Encoder:
+    # builds, once per response schema, a function that turns a model into
+    # plain dicts and lists the way model.dict() does, without its generic
+    # per-call walk over include/exclude/alias options
+    encoder = _encoders.get(model)
+    if encoder is None:
+        encoder = _encoders[model] = _compile(model)
+    return encoder
+
+
+def encode(model: BaseModel) -> bytes:
+    return dumps(encoder_for(type(model))(model))
+
+
+def json_response(data: Any, status: int = HTTPStatus.OK) -> web.Response:
+    if isinstance(data, BaseModel):
+        body = encode(data)
+    else:
+        body = dumps(data)
+    return web.Response(
+        body=body, status=status, content_type="application/json"
+    )
+
+
+def _compile(model: Type[BaseModel]) -> Encoder:
+    fields = [
+        (name, _field_encoder(field))
+        for name, field in model.__fields__.items()
+    ]
+
+    def encode_model(obj: BaseModel) -> dict:
+        values = obj.__dict__
+        return {
+            name: values[name]
+            if encoder is None or values[name] is None
+            else encoder(values[name])
+            for name, encoder in fields
+        }
+
+    return encode_model
+
+
+def _encode_nested(value: BaseModel) -> dict:
+    # by the type of the value, which may be a subclass of the field type
+    return encoder_for(type(value))(value)
+
+
+def _encode_enum(value: Enum) -> Any:
+    return value.value
+
+
+def _field_encoder(field: ModelField) -> Optional[Encoder]:
+    # None means the value is already JSON-ready and is copied as is
+    item_type = field.type_
+    if not isinstance(item_type, type):
+        return None
+    if issubclass(item_type, BaseModel):
+        item = _encode_nested
+    elif issubclass(item_type, Enum):
+        item = _encode_enum
+    else:
+        return None
+
+    if field.shape == SHAPE_SINGLETON:
+        return item
+    if field.shape == SHAPE_LIST:
+        return lambda values: [item(value) for value in values]
+    # anything else is left to the default hook of dumps
+    return None
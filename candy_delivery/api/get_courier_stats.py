@@ -1,93 +1,75 @@
 from typing import List
-from aiohttp import web
 from aiohttp_pydantic.oas.typing import r200
 from sqlalchemy.exc import NoResultFound
 
 from candy_delivery.api.schema import GetCourierStatsResponse
 from candy_delivery.api.base_view import BaseView
+from candy_delivery.db.rating import rating_by_delivery_time
 
 from candy_delivery.dto.dto import (
     CDNoResultFound,
-    CourierType,
-    CourierWithOrdersDTO,
-    OrderDTO,
+    RegionStatsDTO,
+)
+
+
+STATS_SOURCE_KEY = "stats_source"
+
+# "aggregate" reads running per-region stats kept up to date on completion,
+# "orders" recomputes them from the full completed orders history in Python,
+# "orders_sql" does the same inside Postgres and gets back only the totals
+STATS_SOURCE_AGGREGATE = "aggregate"
+STATS_SOURCE_ORDERS = "orders"
+STATS_SOURCE_ORDERS_SQL = "orders_sql"
+STATS_SOURCES = (
+    STATS_SOURCE_AGGREGATE,
+    STATS_SOURCE_ORDERS,
+    STATS_SOURCE_ORDERS_SQL,
 )
 
 
 class GetCourierStats(BaseView):
     async def get(self, courier_id: int, /) -> r200[GetCourierStatsResponse]:
+        source = self.request.app[STATS_SOURCE_KEY]
         try:
-            courier_orders = await self.dao.get_courier_with_completed_orders(
-                courier_id
-            )
+            if source != STATS_SOURCE_AGGREGATE:
+                courier_rating = await self.dao.get_courier_with_rating(
+                    courier_id,
+                    in_database=source == STATS_SOURCE_ORDERS_SQL,
+                )
+                courier = courier_rating.courier
+            else:
+                courier_stats = await self.dao.get_courier_with_stats(
+                    courier_id
+                )
+                courier = courier_stats.courier
         except NoResultFound as ex:
             raise CDNoResultFound(
                 error=ex, details=f"no courier with courier ID {courier_id}"
             )
 
         resp = GetCourierStatsResponse(
-                courier_id=courier_orders.courier.courier_id,
-                courier_type=courier_orders.courier.courier_type.name,
-                regions=[region for region in courier_orders.courier.regions],
-                working_hours=self.format_time(
-                    courier_orders.courier.working_hours
-                ),
+                courier_id=courier.courier_id,
+                courier_type=courier.courier_type.name,
+                regions=[region for region in courier.regions],
+                working_hours=self.format_time(courier.working_hours),
             )
-        
-        if len(courier_orders.orders) > 0:
-            resp.rating = self._count_rating(courier_orders.orders),
-            resp.earnings = self._count_earnings(courier_orders),
-
-        return web.json_response(resp.dict())
-
-    def _count_earnings(self, dto: CourierWithOrdersDTO) -> int:
-        if len(dto.orders) == 0:
-            return 0
-
-        money = 0
-        for order in dto.orders:
-            C = 0
-            if order.delivery_type == CourierType.foot:
-                C = 2
-            if order.delivery_type == CourierType.bike:
-                C = 5
-            if order.delivery_type == CourierType.car:
-                C = 9
-
-            money += 500 * C
-
-        return money
-
-    def _count_rating(self, orders: List[OrderDTO] = []):
-        if len(orders) == 0:
-            return 0
-
-        orders_by_regions = dict()
-        for order in orders:
-            if order.region not in orders_by_regions:
-                orders_by_regions[order.region] = []
-            orders_by_regions[order.region].append(order)
 
-        delivery_times = []
-        for _, region_orders in orders_by_regions.items():
-            region_orders.sort(key=lambda order: order.completed_at)
-            diffs = []
-            for i in range(len(region_orders)):
-                diff = 0
-                if i == 0:
-                    diff = (
-                        region_orders[i].completed_at
-                        - region_orders[i].assigned_at
-                    ).total_seconds()
-                else:
-                    diff = (
-                        region_orders[i].completed_at
-                        - region_orders[i - 1].completed_at
-                    ).total_seconds()
-                diffs.append(diff)
+        if source != STATS_SOURCE_AGGREGATE:
+            if courier_rating.orders_count > 0:
+                resp.rating = courier_rating.rating
+                resp.earnings = courier_rating.earnings
+        elif len(courier_stats.regions) > 0:
+            regions = courier_stats.regions
+            resp.rating = self._count_rating_from_stats(regions)
+            resp.earnings = sum(r.earnings for r in regions)
 
-            delivery_times.append(sum(diffs) / len(diffs))
+        return self.json_response(resp)
 
-        t = min(delivery_times)
-        raw_rating = (60 * 60 - min(t, 60 * 60)) / (60 * 60) * 5
-        return round(raw_rating, 2)
+    def _count_rating_from_stats(self, regions: List[RegionStatsDTO]):
+        # the per-region sum of delivery times telescopes to this difference
+        delivery_times = [
+            (r.last_completed_at - r.first_assigned_at).total_seconds()
+            / r.orders_count
+            for r in regions
+        ]
+        return rating_by_delivery_time(min(delivery_times))
@@ -0,0 +1,33 @@
+import asyncio
+import os
+from http import HTTPStatus
+from typing import Union
+from aiohttp_pydantic.oas.typing import r200, r503
+from sqlalchemy.exc import SQLAlchemyError
+
+from candy_delivery.api.schema import HealthResponse
+from candy_delivery.api.base_view import BaseView
+
+
+WORKER_KEY = "worker"
+
+# a worker whose DB does not answer within this many seconds is unhealthy
+PING_TIMEOUT = 2
+
+
+class Health(BaseView):
+    async def get(self) -> Union[r200[HealthResponse], r503[HealthResponse]]:
+        resp = HealthResponse(
+            status="ok",
+            pid=os.getpid(),
+            worker=self.request.app.get(WORKER_KEY),
+        )
+        try:
+            await asyncio.wait_for(self.dao.ping(), PING_TIMEOUT)
+        except (asyncio.TimeoutError, OSError, SQLAlchemyError):
+            resp.status = "db unavailable"
+            return self.json_response(
+                resp, status=HTTPStatus.SERVICE_UNAVAILABLE
+            )
+
+        return self.json_response(resp)
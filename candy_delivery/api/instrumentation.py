@@ -0,0 +1,137 @@
+from inspect import iscoroutinefunction
+from time import perf_counter
+
+from aiohttp import web
+from aiohttp.web_middlewares import middleware
+
+from candy_delivery import metrics
+from candy_delivery.db.dao import DAO_KEY
+
+
+PHASES_KEY = "metrics_phases"
+
+REQUESTS = metrics.counter(
+    "http_requests_total",
+    "HTTP requests by route pattern and status code",
+    labelnames=("method", "route", "status"),
+)
+REQUEST_SECONDS = metrics.histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route pattern",
+    labelnames=("method", "route"),
+)
+PHASE_SECONDS = metrics.histogram(
+    "http_request_phase_seconds",
+    "Time spent in validation, DAO calls and serialization per request",
+    labelnames=("method", "route", "phase"),
+)
+
+
+def _route_pattern(request: web.Request) -> str:
+    resource = request.match_info.route.resource
+    return resource.canonical if resource is not None else "unmatched"
+
+
+@middleware
+async def metrics_middleware(request, handler):
+    phases = request[PHASES_KEY] = {}
+    status = 500
+    started = perf_counter()
+    try:
+        response = await handler(request)
+        status = response.status
+        return response
+    except web.HTTPException as ex:
+        status = ex.status
+        raise
+    finally:
+        elapsed = perf_counter() - started
+        method, route = request.method, _route_pattern(request)
+        REQUESTS.labels(method, route, str(status)).inc()
+        REQUEST_SECONDS.labels(method, route).observe(elapsed)
+        for phase, spent in phases.items():
+            PHASE_SECONDS.labels(method, route, phase).observe(spent)
+
+
+class phase_timer:
+    __slots__ = ("_phases", "_name", "_started")
+
+    def __init__(self, request: web.Request, name: str) -> None:
+        self._phases = request.get(PHASES_KEY)
+        self._name = name
+
+    def __enter__(self):
+        self._started = perf_counter()
+
+    def __exit__(self, *exc_info):
+        if self._phases is not None:
+            spent = perf_counter() - self._started
+            self._phases[self._name] = (
+                self._phases.get(self._name, 0) + spent
+            )
+
+
+class TimedInjector:
+    # wraps an aiohttp_pydantic injector to account request parsing and
+    # pydantic validation to the "validation" phase
+    def __init__(self, injector) -> None:
+        self._injector = injector
+        self.context = injector.context
+        if iscoroutinefunction(injector.inject):
+            self.inject = self._inject_async
+        else:
+            self.inject = self._inject
+
+    def _inject(self, request, args_view, kwargs_view):
+        with phase_timer(request, "validation"):
+            self._injector.inject(request, args_view, kwargs_view)
+
+    async def _inject_async(self, request, args_view, kwargs_view):
+        with phase_timer(request, "validation"):
+            await self._injector.inject(request, args_view, kwargs_view)
+
+
+class TimedDAO:
+    # accounts every awaited DAO method to the "dao" phase of the request
+    def __init__(self, dao, request: web.Request) -> None:
+        self._dao = dao
+        self._request = request
+
+    def __getattr__(self, name):
+        attr = getattr(self._dao, name)
+        if not iscoroutinefunction(attr):
+            return attr
+
+        async def timed(*args, **kwargs):
+            with phase_timer(self._request, "dao"):
+                return await attr(*args, **kwargs)
+
+        return timed
+
+
+async def metrics_handler(request: web.Request) -> web.Response:
+    return web.Response(
+        text=metrics.REGISTRY.render(), content_type="text/plain"
+    )
+
+
+def _collect_courier_cache(app: web.Application):
+    def collect():
+        dao = app.get(DAO_KEY)
+        if dao is None:
+            return []
+        return [
+            ((event,), value)
+            for event, value in dao.courier_cache.stats().items()
+        ]
+    return collect
+
+
+def setup_metrics(app: web.Application):
+    metrics.gauge(
+        "courier_cache",
+        "Courier profile cache hits, misses, evictions and size",
+        labelnames=("stat",),
+        collect=_collect_courier_cache(app),
+    )
+    app.router.add_get("/metrics", metrics_handler)
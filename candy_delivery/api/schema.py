@@ -1,7 +1,8 @@
+from collections import Counter
 from enum import Enum
 from typing import List, Optional
 
-from pydantic import BaseModel, Extra
+from pydantic import BaseModel, Extra, validator
 
 
 class CourierType(Enum):
@@ -27,6 +28,24 @@ class UpdateCourierRequest(BaseModel, extra=Extra.forbid):
     working_hours: List[str] = []
 
 
+class CourierUpdate(UpdateCourierRequest):
+    courier_id: int
+
+
+class UpdateCouriersRequest(BaseModel, extra=Extra.forbid):
+    data: List[CourierUpdate]
+
+    @validator("data")
+    def courier_ids_are_unique(cls, data: List[CourierUpdate]):
+        ids = [update.courier_id for update in data]
+        duplicates = sorted(
+            i for i, count in Counter(ids).items() if count > 1
+        )
+        if duplicates:
+            raise ValueError(f"duplicate courier IDs {duplicates}")
+        return data
+
+
 class Order(BaseModel, extra=Extra.forbid):
     order_id: int
     weight: float
@@ -44,10 +63,18 @@ class CompleteOrderRequest(BaseModel, extra=Extra.forbid):
     complete_time: str
 
 
+class CompleteOrdersBatchRequest(BaseModel, extra=Extra.forbid):
+    data: List[CompleteOrderRequest]
+
+
 class AssignOrdersRequest(BaseModel, extra=Extra.forbid):
     courier_id: int
 
 
+class AssignOrdersBatchRequest(BaseModel, extra=Extra.forbid):
+    courier_ids: List[int]
+
+
 class IdResponse(BaseModel):
     id: int
 
@@ -67,15 +94,37 @@ class UpdateCourierResponse(BaseModel):
     working_hours: List[str] = []
 
 
+class UpdatedCourier(UpdateCourierResponse):
+    unassigned_orders: List[IdResponse] = []
+
+
+class UpdateCouriersResponse(BaseModel):
+    couriers: List[UpdatedCourier] = []
+
+
 class AssignOrdersResponse(BaseModel):
     orders: List[IdResponse] = []
     assign_time: Optional[str]
 
 
+class CourierAssignment(BaseModel):
+    courier_id: int
+    orders: List[IdResponse] = []
+    assign_time: Optional[str]
+
+
+class AssignOrdersBatchResponse(BaseModel):
+    couriers: List[CourierAssignment] = []
+
+
 class CompleteOrderResponse(BaseModel):
     order_id: int
 
 
+class CompleteOrdersBatchResponse(BaseModel):
+    orders: List[IdResponse] = []
+
+
 class GetCourierStatsResponse(BaseModel):
     courier_id: int
     courier_type: str
@@ -83,3 +132,9 @@ class GetCourierStatsResponse(BaseModel):
     working_hours: List[str] = []
     rating: Optional[float]
     earnings: Optional[int]
+
+
+class HealthResponse(BaseModel):
+    status: str
+    pid: int
+    worker: Optional[int]
@@ -0,0 +1,282 @@
+import codecs
+import json
+from abc import abstractmethod
+from contextlib import AsyncExitStack
+from http import HTTPStatus
+from typing import Any, AsyncIterator, List, Optional, Tuple, Type
+
+from aiohttp import hdrs, web
+from aiohttp.streams import StreamReader
+from pydantic import BaseModel, ValidationError
+
+from candy_delivery.api.base_view import BaseView
+from candy_delivery.api.instrumentation import phase_timer
+from candy_delivery.api.validation import invalid_items
+from candy_delivery.dto.dto import CDValidationError
+from candy_delivery.settings import settings_from_env
+
+
+INGEST_SETTINGS_KEY = "ingest_settings"
+
+_WHITESPACE = " \t\n\r"
+
+
+class IngestSettings(BaseModel):
+    # bodies larger than this, or sent without Content-Length, are streamed
+    stream_threshold: int = 1024 ** 2
+    chunk_size: int = 1000
+    read_size: int = 64 * 1024
+    max_item_size: int = 1024 ** 2
+
+    @classmethod
+    def from_env(cls) -> "IngestSettings":
+        env_names = {
+            "stream_threshold": "INGEST_STREAM_THRESHOLD",
+            "chunk_size": "INGEST_CHUNK_SIZE",
+        }
+        return settings_from_env(cls, env_names)
+
+
+class MalformedBody(Exception):
+    pass
+
+
+class _JSONItemsReader:
+    # decodes the items of the array under `key` of a top level JSON object
+    # one by one, keeping at most one read plus one item in memory
+    def __init__(
+        self,
+        stream: StreamReader,
+        key: str,
+        read_size: int,
+        max_item_size: int,
+    ) -> None:
+        self._stream = stream
+        self._key = key
+        self._read_size = read_size
+        self._max_item_size = max_item_size
+        self._decoder = json.JSONDecoder()
+        self._utf8 = codecs.getincrementaldecoder("utf-8")()
+        self._buf = ""
+        self._pos = 0
+        self._eof = False
+
+    async def _fill(self) -> bool:
+        if self._eof:
+            return False
+        raw = await self._stream.read(self._read_size)
+        if not raw:
+            self._eof = True
+        try:
+            text = self._utf8.decode(raw, final=self._eof)
+        except UnicodeDecodeError:
+            raise MalformedBody() from None
+        self._buf = self._buf[self._pos:] + text
+        self._pos = 0
+        return bool(raw)
+
+    async def _next_char(self) -> str:
+        while True:
+            while self._pos < len(self._buf):
+                char = self._buf[self._pos]
+                if char not in _WHITESPACE:
+                    return char
+                self._pos += 1
+            if not await self._fill():
+                return ""
+
+    async def _expect(self, char: str):
+        if await self._next_char() != char:
+            raise MalformedBody()
+        self._pos += 1
+
+    async def _decode_value(self) -> Any:
+        await self._next_char()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buf, self._pos)
+            except json.JSONDecodeError:
+                value, end = None, None
+            # a value is complete only if something follows it
+            if end is not None and (end < len(self._buf) or self._eof):
+                self._pos = end
+                return value
+            if len(self._buf) - self._pos > self._max_item_size:
+                raise MalformedBody()
+            if not await self._fill():
+                raise MalformedBody()
+
+    async def _read_key(self) -> str:
+        key = await self._decode_value()
+        if not isinstance(key, str):
+            raise MalformedBody()
+        await self._expect(":")
+        return key
+
+    async def items(self) -> AsyncIterator[Any]:
+        await self._expect("{")
+        if await self._next_char() == "}":
+            raise _structure_error(
+                self._key, "field required", "value_error.missing"
+            )
+
+        key = await self._read_key()
+        if key != self._key:
+            raise _structure_error(
+                key, "extra fields not permitted", "value_error.extra"
+            )
+        char = await self._next_char()
+        if not char:
+            raise MalformedBody()
+        if char != "[":
+            raise _structure_error(
+                self._key, "value is not a valid list", "type_error.list"
+            )
+        self._pos += 1
+
+        if await self._next_char() == "]":
+            self._pos += 1
+        else:
+            while True:
+                yield await self._decode_value()
+                char = await self._next_char()
+                self._pos += 1
+                if char == "]":
+                    break
+                if char != ",":
+                    raise MalformedBody()
+
+        if await self._next_char() == ",":
+            self._pos += 1
+            key = await self._read_key()
+            raise _structure_error(
+                key, "extra fields not permitted", "value_error.extra"
+            )
+        await self._expect("}")
+        if await self._next_char():
+            raise MalformedBody()
+
+
+def _structure_error(
+    loc: str, msg: str, error_type: str
+) -> CDValidationError:
+    return CDValidationError(
+        error=None,
+        details=[{"loc": [loc], "msg": msg, "type": error_type, "in": "body"}],
+    )
+
+
+class IngestView(BaseView):
+    # POST handler of a bulk import which, for large bodies, validates items
+    # one at a time and writes them to the DAO in chunks of a single
+    # transaction instead of materializing the whole payload
+    item_model: Type[BaseModel]
+    id_field: str
+    response_key: str
+
+    async def _iter(self) -> web.StreamResponse:
+        if self.request.method == hdrs.METH_POST and self._is_streamed():
+            return await self.post_streamed()
+        return await super()._iter()
+
+    def _is_streamed(self) -> bool:
+        settings = self.request.app[INGEST_SETTINGS_KEY]
+        length = self.request.content_length
+        return length is None or length > settings.stream_threshold
+
+    # BaseView is already an ABC through aiohttp's AbstractView
+    @abstractmethod
+    def to_dto(self, item: BaseModel):
+        pass
+
+    @abstractmethod
+    def ingest(self):
+        pass
+
+    async def post_streamed(self) -> web.Response:
+        settings = self.request.app[INGEST_SETTINGS_KEY]
+        reader = _JSONItemsReader(
+            self.request.content,
+            "data",
+            settings.read_size,
+            settings.max_item_size,
+        )
+        ids, errors, invalid_ids = [], [], []
+        chunk = []
+        try:
+            async with AsyncExitStack() as transaction:
+                ingest = None
+
+                async def flush():
+                    nonlocal ingest
+                    with phase_timer(self.request, "dao"):
+                        # opened with the first chunk, so that an invalid
+                        # body never takes a connection from the pool
+                        if ingest is None:
+                            ingest = await transaction.enter_async_context(
+                                self.ingest()
+                            )
+                        await ingest(self._to_dtos(chunk))
+                    chunk.clear()
+
+                index = 0
+                async for raw in reader.items():
+                    with phase_timer(self.request, "validation"):
+                        item, item_errors = self._validate(raw, index)
+                    index += 1
+                    if item_errors:
+                        errors.extend(item_errors)
+                        if isinstance(raw, dict) and self.id_field in raw:
+                            invalid_ids.append(raw[self.id_field])
+                    # after the first error nothing will be written, the
+                    # rest of the body is only checked for more errors
+                    if errors:
+                        chunk.clear()
+                        continue
+
+                    chunk.append(item)
+                    ids.append(getattr(item, self.id_field))
+                    if len(chunk) >= settings.chunk_size:
+                        await flush()
+
+                if errors:
+                    raise CDValidationError(
+                        error=None,
+                        details=(
+                            invalid_items(self.response_key, invalid_ids)
+                            if invalid_ids
+                            else errors
+                        ),
+                    )
+                if chunk:
+                    await flush()
+        except MalformedBody:
+            raise web.HTTPBadRequest(
+                text='{"error": "Malformed JSON"}',
+                content_type="application/json",
+            ) from None
+
+        # written as text: response models for every ID would cost more
+        # memory than the whole import
+        with phase_timer(self.request, "serialization"):
+            items = ",".join(f'{{"id":{item_id}}}' for item_id in ids)
+            return web.Response(
+                text=f'{{"{self.response_key}":[{items}]}}',
+                status=HTTPStatus.CREATED,
+                content_type="application/json",
+            )
+
+    def _validate(
+        self, raw: Any, index: int
+    ) -> Tuple[Optional[BaseModel], List[dict]]:
+        try:
+            return self.item_model.parse_obj(raw), []
+        except ValidationError as ex:
+            errors = json.loads(ex.json())
+            for error in errors:
+                error["loc"] = ["data", index] + error["loc"]
+                error["in"] = "body"
+            return None, errors
+
+    def _to_dtos(self, chunk: List[BaseModel]) -> list:
+        return [self.to_dto(item) for item in chunk]
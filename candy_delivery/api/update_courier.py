@@ -16,25 +16,39 @@ class UpdateCourier(BaseView):
         self, courier_id: int, /, request: UpdateCourierRequest
     ) -> r200[UpdateCourierResponse]:
 
-        courier = CourierDTO(
+        courier = CourierDTO.construct(
             courier_id=courier_id,
             courier_type=request.courier_type,
             regions=request.regions,
-            working_hours=self.parse_time(request.working_hours),
+            working_hours=self.parse_shifts(request.working_hours),
         )
 
         try:
-            updated_model = await self.dao.update_courier(courier)
+            if self._is_empty_update(request):
+                return self._profile_response(
+                    await self.dao.get_courier(courier_id)
+                )
+            updated = await self.dao.update_courier(courier)
         except NoResultFound as ex:
             raise CDNoResultFound(
                 error=ex, details=f"no result for courier ID {courier_id}"
             )
 
-        return web.json_response(
+        return self._profile_response(updated.courier)
+
+    def _is_empty_update(self, request: UpdateCourierRequest) -> bool:
+        return (
+            request.courier_type is None
+            and not request.regions
+            and not request.working_hours
+        )
+
+    def _profile_response(self, courier: CourierDTO) -> web.Response:
+        return self.json_response(
             UpdateCourierResponse(
-                courier_id=updated_model.id,
-                courier_type=updated_model.courier_type.name,
-                regions=[r.region for r in updated_model.regions],
-                working_hours=self.format_time(updated_model.working_hours),
-            ).dict()
+                courier_id=courier.courier_id,
+                courier_type=courier.courier_type.name,
+                regions=courier.regions,
+                working_hours=self.format_time(courier.working_hours),
+            )
         )
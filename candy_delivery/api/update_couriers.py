@@ -0,0 +1,48 @@
+from aiohttp_pydantic.oas.typing import r200
+from sqlalchemy.exc import NoResultFound
+
+from candy_delivery.dto.dto import CDNoResultFound, CourierDTO
+
+from candy_delivery.api.base_view import BaseView
+from candy_delivery.api.schema import (
+    IdResponse,
+    UpdateCouriersRequest,
+    UpdateCouriersResponse,
+    UpdatedCourier,
+)
+
+
+class UpdateCouriers(BaseView):
+    async def patch(
+        self, request: UpdateCouriersRequest
+    ) -> r200[UpdateCouriersResponse]:
+        couriers = [
+            CourierDTO.construct(
+                courier_id=update.courier_id,
+                courier_type=update.courier_type,
+                regions=update.regions,
+                working_hours=self.parse_shifts(update.working_hours),
+            )
+            for update in request.data
+        ]
+
+        try:
+            updated = await self.dao.update_couriers(couriers)
+        except NoResultFound as ex:
+            raise CDNoResultFound(error=ex, details=str(ex))
+
+        resp = UpdateCouriersResponse(
+            couriers=[
+                UpdatedCourier(
+                    courier_id=u.courier.courier_id,
+                    courier_type=u.courier.courier_type.name,
+                    regions=u.courier.regions,
+                    working_hours=self.format_time(u.courier.working_hours),
+                    unassigned_orders=[
+                        IdResponse(id=o_id) for o_id in u.unassigned_orders
+                    ],
+                )
+                for u in updated
+            ]
+        )
+        return self.json_response(resp)
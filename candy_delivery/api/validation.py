@@ -0,0 +1,86 @@
+import json
+from json.decoder import JSONDecodeError
+from typing import Any, Dict, List, Union
+
+from aiohttp.web_exceptions import HTTPBadRequest
+from aiohttp.web_request import BaseRequest
+from aiohttp_pydantic.injectors import BodyGetter
+from pydantic import ValidationError
+
+from candy_delivery.dto.dto import CDValidationError
+
+
+# only POST /couriers and POST /orders has custom response by task: the IDs
+# of the invalid items instead of the pydantic errors
+ITEM_ID_FIELDS = {"courier_id": "couriers", "order_id": "orders"}
+
+
+def invalid_items(key: str, item_ids: List[Any]) -> Dict[str, List[dict]]:
+    return {key: [{"id": item_id} for item_id in item_ids]}
+
+
+def format_validation_error(
+    body: Any, errors: List[dict]
+) -> Union[dict, List[dict]]:
+    key, ids, seen = "details", [], set()
+    for error in errors:
+        location_part = error["loc"]
+        if len(location_part) < 2 or location_part[:2] in seen:
+            continue
+        seen.add(location_part[:2])
+
+        try:
+            request_item = body[location_part[0]][location_part[1]]
+        except (KeyError, IndexError, TypeError):
+            continue
+        if not isinstance(request_item, dict):
+            continue
+        for id_field, item_key in ITEM_ID_FIELDS.items():
+            if id_field in request_item:
+                key = item_key
+                ids.append(request_item[id_field])
+
+    if len(ids) > 0:
+        return invalid_items(key, ids)
+
+    return errors
+
+
+class ItemsBodyGetter(BodyGetter):
+    # decodes the body once and, if it is invalid, reports the invalid items
+    # from that decoded body
+    async def inject(
+        self, request: BaseRequest, args_view: list, kwargs_view: dict
+    ):
+        try:
+            body = await request.json()
+        except JSONDecodeError:
+            raise HTTPBadRequest(
+                text='{"error": "Malformed JSON"}',
+                content_type="application/json",
+            ) from None
+
+        if self._expect_object and not isinstance(body, dict):
+            raise CDValidationError(
+                error=None,
+                details=[
+                    {
+                        "loc": ["__root__"],
+                        "msg": "value is not a valid dict",
+                        "type": "type_error.dict",
+                        "in": self.context,
+                    }
+                ],
+            )
+
+        try:
+            kwargs_view[self.arg_name] = self.model.parse_obj(body)
+        except ValidationError as ex:
+            # pydantic's own encoder copes with enums in the error context
+            errors = [
+                dict(error, loc=tuple(error["loc"]), **{"in": self.context})
+                for error in json.loads(ex.json())
+            ]
+            raise CDValidationError(
+                error=ex, details=format_validation_error(body, errors)
+            ) from None
@@ -0,0 +1,129 @@
+import argparse
+import asyncio
+import logging
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from pydantic import BaseModel
+
+from candy_delivery import metrics
+from candy_delivery.db.dao import DAO
+from candy_delivery.settings import settings_from_env
+
+
+log = logging.getLogger(__name__)
+
+ARCHIVE_SETTINGS_KEY = "archive_settings"
+MAINTENANCE_KEY = "maintenance"
+
+ORDERS_ARCHIVED = metrics.counter(
+    "orders_archived_total",
+    "Completed orders moved from orders to orders_archive",
+)
+
+
+class ArchiveSettings(BaseModel):
+    # orders completed more than this many days ago are archived; unset
+    # turns the background archiver off
+    after_days: Optional[float] = None
+    batch_size: int = 1000
+    # between batches, so that archiving doesn't hold locks back to back
+    batch_pause: float = 0.1
+    # between runs of the background task
+    interval: float = 600
+    # monthly partitions of orders kept created ahead, once it is
+    # partitioned
+    partition_months_ahead: int = 3
+
+    @classmethod
+    def from_env(cls) -> "ArchiveSettings":
+        env_names = {
+            "after_days": "ARCHIVE_AFTER_DAYS",
+            "batch_size": "ARCHIVE_BATCH_SIZE",
+            "batch_pause": "ARCHIVE_BATCH_PAUSE",
+            "interval": "ARCHIVE_INTERVAL",
+            "partition_months_ahead": "PARTITION_MONTHS_AHEAD",
+        }
+        return settings_from_env(cls, env_names)
+
+
+async def archive_completed(
+    dao: DAO, after_days: float, batch_size: int, batch_pause: float
+) -> int:
+    # the stats endpoints read courier_region_stats and the history of both
+    # tables, so they don't change when orders move to the archive
+    before = datetime.now(timezone.utc) - timedelta(days=after_days)
+    archived = 0
+    while True:
+        moved = await dao.archive_orders(before, batch_size)
+        archived += moved
+        ORDERS_ARCHIVED.inc(moved)
+        if moved < batch_size:
+            return archived
+        await asyncio.sleep(batch_pause)
+
+
+async def run_maintenance(dao: DAO, settings: ArchiveSettings):
+    # creates the monthly partitions of orders ahead of time, starting right
+    # at startup, and archives old completed orders when that is enabled
+    while True:
+        try:
+            await dao.ensure_partitions(settings.partition_months_ahead)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            log.exception("creating partitions failed")
+
+        if settings.after_days is not None:
+            try:
+                archived = await archive_completed(
+                    dao,
+                    settings.after_days,
+                    settings.batch_size,
+                    settings.batch_pause,
+                )
+                if archived:
+                    log.info("archived %d orders", archived)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.exception("archiving failed")
+        await asyncio.sleep(settings.interval)
+
+
+# archives once, e.g. from cron instead of the background archiver:
+#   python3 -m candy_delivery.db.archive --after-days 90
+async def main(args):
+    db_url = os.getenv('DB_URL')
+    if not db_url:
+        sys.exit('no DB URL!')
+
+    dao = DAO(db_url)
+    try:
+        archived = await archive_completed(
+            dao, args.after_days, args.batch_size, args.batch_pause
+        )
+    finally:
+        await dao.close()
+    log.info("archived %d orders", archived)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    settings = ArchiveSettings.from_env()
+    parser = argparse.ArgumentParser(
+        description="move old completed orders to orders_archive"
+    )
+    parser.add_argument(
+        "--after-days",
+        type=float,
+        default=settings.after_days,
+        required=settings.after_days is None,
+    )
+    parser.add_argument("--batch-size", type=int, default=settings.batch_size)
+    parser.add_argument(
+        "--batch-pause", type=float, default=settings.batch_pause
+    )
+    asyncio.run(main(parser.parse_args()))
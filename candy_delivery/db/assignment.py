@@ -0,0 +1,34 @@
+from typing import Dict, Iterable, List, Tuple
+
+
+def solve_assignment(
+    capacities: Dict[int, float],
+    candidates: Iterable[Tuple[int, int, float]],
+) -> Dict[int, List[int]]:
+    # candidates are (courier_id, order_id, weight) pairs. Orders go lightest
+    # first, each to the eligible courier with the most room left, which is
+    # the single-courier greedy generalized to a batch: an order is taken at
+    # most once and no courier is loaded over its capacity.
+    eligible: Dict[int, List[int]] = {}
+    weights: Dict[int, float] = {}
+    for courier_id, order_id, weight in candidates:
+        eligible.setdefault(order_id, []).append(courier_id)
+        weights[order_id] = weight
+
+    remained = dict(capacities)
+    assigned: Dict[int, List[int]] = {c_id: [] for c_id in remained}
+    for order_id in sorted(weights, key=lambda o_id: (weights[o_id], o_id)):
+        weight = weights[order_id]
+        best = None
+        for courier_id in eligible[order_id]:
+            room = remained.get(courier_id, 0)
+            if room - weight < 0:
+                continue
+            if best is None or room > remained[best]:
+                best = courier_id
+
+        if best is not None:
+            remained[best] -= weight
+            assigned[best].append(order_id)
+
+    return assigned
@@ -0,0 +1,195 @@
+import os
+import sys
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+
+from candy_delivery.dto.dto import CourierDTO
+
+
+# courier profiles (type, regions, working hours) by courier ID. A read that
+# missed puts the profile it loaded with set, which never replaces what is
+# there; invalidate leaves a tombstone for the TTL instead of an empty slot,
+# so a read that started before an update can't put the old profile back
+class CourierCache(ABC):
+    def __init__(self) -> None:
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @abstractmethod
+    async def get(self, courier_id: int) -> Optional[CourierDTO]:
+        pass
+
+    @abstractmethod
+    async def set(self, courier: CourierDTO):
+        pass
+
+    @abstractmethod
+    async def invalidate(self, courier_ids: Iterable[int]):
+        pass
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class NullCourierCache(CourierCache):
+    async def get(self, courier_id: int) -> Optional[CourierDTO]:
+        self.misses += 1
+        return None
+
+    async def set(self, courier: CourierDTO):
+        pass
+
+    async def invalidate(self, courier_ids: Iterable[int]):
+        pass
+
+
+class LRUCourierCache(CourierCache):
+    def __init__(self, max_size: int = 10000, ttl: float = 60) -> None:
+        super().__init__()
+        self._max_size = max_size
+        self._ttl = ttl
+        self._items: "OrderedDict[int, Tuple[float, CourierDTO]]" = (
+            OrderedDict()
+        )
+        # kept apart from the items so that the LRU never evicts them
+        self._tombstones: Dict[int, float] = {}
+
+    async def get(self, courier_id: int) -> Optional[CourierDTO]:
+        item = self._items.get(courier_id)
+        if item is None:
+            self.misses += 1
+            return None
+
+        expires_at, courier = item
+        if expires_at < time.monotonic():
+            del self._items[courier_id]
+            self.evictions += 1
+            self.misses += 1
+            return None
+
+        self._items.move_to_end(courier_id)
+        self.hits += 1
+        return courier
+
+    async def set(self, courier: CourierDTO):
+        now = time.monotonic()
+        tombstone = self._tombstones.get(courier.courier_id)
+        if tombstone is not None:
+            if tombstone >= now:
+                return
+            del self._tombstones[courier.courier_id]
+        if courier.courier_id in self._items:
+            return
+
+        self._items[courier.courier_id] = (now + self._ttl, courier)
+        while len(self._items) > self._max_size:
+            self._items.popitem(last=False)
+            self.evictions += 1
+
+    async def invalidate(self, courier_ids: Iterable[int]):
+        now = time.monotonic()
+        for courier_id, expires_at in list(self._tombstones.items()):
+            if expires_at < now:
+                del self._tombstones[courier_id]
+        for courier_id in courier_ids:
+            self._items.pop(courier_id, None)
+            self._tombstones[courier_id] = now + self._ttl
+
+    def stats(self) -> Dict[str, int]:
+        stats = super().stats()
+        stats["size"] = len(self._items)
+        return stats
+
+
+# an empty value under the courier's key
+_TOMBSTONE = ""
+
+
+class SharedCourierCache(CourierCache):
+    # client is anything with redis-like async get/set(ex=, nx=), so that
+    # all worker processes see the same profiles and invalidations. Filling
+    # only absent keys makes set atomic against a concurrent invalidate
+    def __init__(self, client, ttl: float = 60, prefix: str = "courier:"):
+        super().__init__()
+        self._client = client
+        self._ttl = ttl
+        self._prefix = prefix
+
+    async def get(self, courier_id: int) -> Optional[CourierDTO]:
+        raw = await self._client.get(self._prefix + str(courier_id))
+        # None or the tombstone, as str or bytes
+        if not raw:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return CourierDTO.parse_raw(raw)
+
+    async def set(self, courier: CourierDTO):
+        await self._client.set(
+            self._prefix + str(courier.courier_id),
+            courier.json(),
+            ex=max(int(self._ttl), 1),
+            nx=True,
+        )
+
+    async def invalidate(self, courier_ids: Iterable[int]):
+        for courier_id in courier_ids:
+            await self._client.set(
+                self._prefix + str(courier_id),
+                _TOMBSTONE,
+                ex=max(int(self._ttl), 1),
+            )
+
+
+class FakeSharedClient:
+    # in-memory stand-in for the shared backend for local runs and tests
+    def __init__(self) -> None:
+        self._data: Dict[str, Tuple[float, str]] = {}
+
+    async def get(self, key: str) -> Optional[str]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return None
+        return value
+
+    async def set(self, key: str, value: str, ex: int, nx: bool = False):
+        if nx and await self.get(key) is not None:
+            return
+        self._data[key] = (time.monotonic() + ex, value)
+
+
+# COURIER_CACHE_BACKEND: local (default), shared, fake or none
+def courier_cache_from_env() -> CourierCache:
+    backend = os.getenv("COURIER_CACHE_BACKEND", "local")
+    ttl = float(os.getenv("COURIER_CACHE_TTL", "60"))
+
+    if backend == "none":
+        return NullCourierCache()
+    if backend == "local":
+        max_size = int(os.getenv("COURIER_CACHE_SIZE", "10000"))
+        return LRUCourierCache(max_size=max_size, ttl=ttl)
+    if backend == "fake":
+        return SharedCourierCache(FakeSharedClient(), ttl=ttl)
+    if backend == "shared":
+        url = os.getenv("COURIER_CACHE_URL")
+        if not url:
+            sys.exit("no COURIER_CACHE_URL for shared courier cache!")
+        try:
+            import aioredis
+        except ImportError:
+            sys.exit("shared courier cache requires aioredis")
+        return SharedCourierCache(aioredis.from_url(url), ttl=ttl)
+
+    sys.exit(f"unknown COURIER_CACHE_BACKEND {backend}")
@@ -1,356 +1,695 @@
+from collections import defaultdict
+from contextlib import asynccontextmanager
 from datetime import datetime
-from typing import List, Set, Tuple
+from typing import (
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Optional,
+)
 
+from sqlalchemy.exc import NoResultFound
 from sqlalchemy.orm import selectinload
 from sqlalchemy.orm.session import sessionmaker
 
-from sqlalchemy.sql.expression import select
-from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.sql.expression import delete, select, text, union_all
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from candy_delivery.dto.dto import (
+    CompletionDTO,
     CourierDTO,
-    CourierWithOrdersDTO,
+    CourierWithRatingDTO,
+    CourierWithStatsDTO,
+    UpdatedCourierDTO,
     OrderDTO,
+    RegionStatsDTO,
     CourierType as CourierTypeDTO,
     WorkingHoursDTO,
 )
 from candy_delivery.db.schema import (
+    COURIER_MAX_WEIGHT,
     CourierType,
+    CourierRegionStatsTable,
     CouriersTable,
-    CourierRegionsTable,
     CourierWorkingHoursTable,
-    OrderDeliveryHoursTable,
+    OrdersArchiveTable,
     OrdersTable,
 )
+from candy_delivery.db.assignment import solve_assignment
+from candy_delivery.db.cache import CourierCache, NullCourierCache
+from candy_delivery.db.migrations import Migration, upgrade
+from candy_delivery.db.partitioning import maintain_partitions
+from candy_delivery.db.pool import PoolSettings, create_engine
+from candy_delivery.db.rating import (
+    CourierRating,
+    RatingAccumulator,
+    rating_by_delivery_time,
+)
+from candy_delivery.db.revalidation import CourierChange, orders_to_drop
+from candy_delivery.intervals import IntervalSet
+from candy_delivery.db.queries import (
+    ARCHIVE_ORDERS,
+    ASSIGN_ORDERS,
+    ASSIGN_ORDERS_SKIP_LOCKED,
+    ASSIGN_ORDERS_TO_COURIERS,
+    BATCH_ASSIGN_CANDIDATES,
+    BATCH_ASSIGN_CANDIDATES_SKIP_LOCKED,
+    COMPLETE_ORDER,
+    COMPLETE_ORDERS,
+    COURIERS_CAPACITY,
+    COURIER_RATING,
+    DELETE_COURIER_REGIONS,
+    DELETE_COURIER_WORKING_HOURS,
+    INSERT_COURIERS,
+    INSERT_COURIER_REGIONS,
+    INSERT_COURIER_WORKING_HOURS,
+    INSERT_ORDERS,
+    INSERT_ORDER_DELIVERY_HOURS,
+    LOCK_COURIERS,
+    LOCK_COURIER_PROFILE,
+    LOCK_COURIER_STATS,
+    LOCK_OPEN_ORDERS,
+    ORDERS_DELIVERY_HOURS,
+    REBUILD_COURIER_STATS,
+    UNASSIGN_ORDERS,
+    UPDATE_COURIER_TYPES,
+)
 
 
 DAO_KEY = "storage"
 
+# rows of the order history reduced per batch when a rating is recomputed
+# from it
+RATING_ROWS_PER_FETCH = 1000
+
 
 class DAO:
-    def __init__(self, dsn: str) -> None:
-        self._engine = create_async_engine(dsn, echo=False)
+    def __init__(
+        self,
+        dsn: str,
+        courier_cache: Optional[CourierCache] = None,
+        pool_settings: Optional[PoolSettings] = None,
+    ) -> None:
+        self._engine = create_engine(dsn, pool_settings or PoolSettings())
         self._async_session = sessionmaker(
             self._engine, expire_on_commit=False, class_=AsyncSession
         )
+        self._courier_cache = courier_cache or NullCourierCache()
+
+    @property
+    def courier_cache(self) -> CourierCache:
+        return self._courier_cache
+
+    async def ping(self):
+        async with self._engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+
+    async def close(self):
+        await self._engine.dispose()
+
+    async def migrate(self) -> List[Migration]:
+        async with self._engine.connect() as conn:
+            return await conn.run_sync(upgrade)
 
     async def add_couriers(self, courier_list: List[CourierDTO]):
-        couriers = []
+        async with self.ingest_couriers() as ingest:
+            await ingest(courier_list)
+
+    # one transaction fed in chunks, so that a large import never holds all
+    # of its rows in memory at once; rolled back if the block raises
+    @asynccontextmanager
+    async def ingest_couriers(
+        self,
+    ) -> AsyncIterator[Callable[[List[CourierDTO]], Awaitable[None]]]:
+        # nothing to invalidate: the IDs are new, and a read of a missing
+        # courier puts nothing in cache
+        async with self._async_session() as session:
+            async with session.begin():
+                async def ingest(courier_list: List[CourierDTO]):
+                    await self._insert_couriers(session, courier_list)
+
+                yield ingest
+
+    async def _insert_couriers(
+        self, session: AsyncSession, courier_list: List[CourierDTO]
+    ):
+        ids, courier_types = [], []
+        region_courier_ids, regions = [], []
+        hours_courier_ids, from_borders, to_borders = [], [], []
         for courier in courier_list:
-            courier_model = CouriersTable(
-                id=courier.courier_id,
-                courier_type=CourierType(courier.courier_type.value),
-            )
-            c_regions, c_hours = [], []
+            ids.append(courier.courier_id)
+            courier_types.append(courier.courier_type.value)
 
             for r in courier.regions:
-                c_regions.append(
-                    CourierRegionsTable(
-                        courier_id=courier.courier_id,
-                        region=r,
-                    )
-                )
+                region_courier_ids.append(courier.courier_id)
+                regions.append(r)
 
             for parsed_time in courier.working_hours:
-                c_hours.append(
-                    CourierWorkingHoursTable(
-                        courier_id=courier.courier_id,
-                        from_border=parsed_time.from_border,
-                        to_border=parsed_time.to_border,
-                    )
-                )
-
-            courier_model.regions = c_regions
-            courier_model.working_hours = c_hours
-            couriers.append(courier_model)
+                hours_courier_ids.append(courier.courier_id)
+                from_borders.append(parsed_time.from_border)
+                to_borders.append(parsed_time.to_border)
 
-        async with self._async_session() as session:
-            session.add_all(couriers)
-            await session.commit()
+        await session.execute(
+            INSERT_COURIERS, {"ids": ids, "courier_types": courier_types}
+        )
+        if regions:
+            await session.execute(
+                INSERT_COURIER_REGIONS,
+                {"courier_ids": region_courier_ids, "regions": regions},
+            )
+        if from_borders:
+            await session.execute(
+                INSERT_COURIER_WORKING_HOURS,
+                {
+                    "courier_ids": hours_courier_ids,
+                    "from_borders": from_borders,
+                    "to_borders": to_borders,
+                },
+            )
 
-    async def update_courier(self, update_model: CourierDTO) -> CouriersTable:
+    async def update_courier(
+        self, update_model: CourierDTO
+    ) -> UpdatedCourierDTO:
+        updated = await self.update_couriers([update_model])
+        return updated[0]
+
+    # all couriers are changed with set-based statements in one transaction;
+    # empty regions or working hours leave them as they are
+    async def update_couriers(
+        self, update_models: List[CourierDTO]
+    ) -> List[UpdatedCourierDTO]:
+        ids = [update_model.courier_id for update_model in update_models]
         async with self._async_session() as session:
             async with session.begin():
-                query = (
-                    select(CouriersTable)
-                    .filter(CouriersTable.id == update_model.courier_id)
-                    .with_for_update(of=CouriersTable)
-                    .options(
-                        selectinload(CouriersTable.regions),
-                        selectinload(CouriersTable.working_hours),
-                    )
-                )
-                result = await session.execute(query)
-                courier = result.scalars().one()
-
-                query = (
-                    select(OrdersTable)
-                    .filter(OrdersTable.courier_id == update_model.courier_id)
-                    .filter(OrdersTable.completed_at == None)
-                    .with_for_update(of=OrdersTable)
-                    .options(selectinload(OrdersTable.order_hours))
+                result = await session.execute(LOCK_COURIERS, {"ids": ids})
+                couriers = {row.id: row for row in result}
+                missing = [c_id for c_id in ids if c_id not in couriers]
+                if missing:
+                    raise NoResultFound(f"no couriers with ids {missing}")
+
+                dropped = await self._unassign_invalid_orders(
+                    session,
+                    [
+                        self._get_courier_change(
+                            couriers[update_model.courier_id], update_model
+                        )
+                        for update_model in update_models
+                    ],
                 )
+                await self._replace_courier_profiles(session, update_models)
+                updated = await self._load_couriers(session, ids)
+
+        # dropped after commit: dropping it earlier would let a concurrent
+        # read put the profile as it was before the update back in cache,
+        # and the tombstone stops reads that started before the commit
+        await self._courier_cache.invalidate(ids)
+        return [
+            UpdatedCourierDTO.construct(
+                courier=updated[courier_id],
+                unassigned_orders=dropped.get(courier_id, []),
+            )
+            for courier_id in ids
+        ]
 
-                result = await session.execute(query)
-                courier_orders = result.scalars().all()
-
-                ids_to_drop = self._get_order_ids_to_drop(
-                    courier_orders, courier, update_model
-                )
-                if len(ids_to_drop) > 0:
-                    for i in range(len(courier_orders)):
-                        if courier_orders[i].id in ids_to_drop:
-                            courier_orders[i].courier_id = None
-                            courier_orders[i].assigned_at = None
-
-                if update_model.regions:
-                    courier.regions = [
-                        CourierRegionsTable(
-                            courier_id=update_model.courier_id,
-                            region=r,
-                        )
-                        for r in update_model.regions
-                    ]
-                if update_model.courier_type:
-                    courier.courier_type = CourierType(update_model.courier_type.value)
-                if update_model.working_hours:
-                    courier.working_hours = [
-                        CourierWorkingHoursTable(
-                            courier_id=update_model.courier_id,
-                            from_border=hours.from_border,
-                            to_border=hours.to_border,
-                        )
-                        for hours in update_model.working_hours
-                    ]
+    async def _replace_courier_profiles(
+        self, session: AsyncSession, update_models: List[CourierDTO]
+    ):
+        typed = [m for m in update_models if m.courier_type]
+        if typed:
+            await session.execute(
+                UPDATE_COURIER_TYPES,
+                {
+                    "ids": [m.courier_id for m in typed],
+                    "courier_types": [m.courier_type.value for m in typed],
+                },
+            )
 
-                return courier
+        with_regions = [m for m in update_models if m.regions]
+        if with_regions:
+            await session.execute(
+                DELETE_COURIER_REGIONS,
+                {"courier_ids": [m.courier_id for m in with_regions]},
+            )
+            await session.execute(
+                INSERT_COURIER_REGIONS,
+                {
+                    "courier_ids": [
+                        m.courier_id for m in with_regions for _ in m.regions
+                    ],
+                    "regions": [r for m in with_regions for r in m.regions],
+                },
+            )
 
-    def _get_order_ids_to_drop(
-        self,
-        orders: List[OrdersTable],
-        courier: CouriersTable,
-        update_model: CourierDTO,
-    ) -> Set[int]:
-        ids_to_drop = set()
-        if len(orders) == 0:
-            return ids_to_drop
+        with_hours = [m for m in update_models if m.working_hours]
+        if with_hours:
+            hours = [
+                (m.courier_id, h) for m in with_hours for h in m.working_hours
+            ]
+            await session.execute(
+                DELETE_COURIER_WORKING_HOURS,
+                {"courier_ids": [m.courier_id for m in with_hours]},
+            )
+            await session.execute(
+                INSERT_COURIER_WORKING_HOURS,
+                {
+                    "courier_ids": [courier_id for courier_id, _ in hours],
+                    "from_borders": [h.from_border for _, h in hours],
+                    "to_borders": [h.to_border for _, h in hours],
+                },
+            )
 
+    def _get_courier_change(
+        self, courier, update_model: CourierDTO
+    ) -> Optional[CourierChange]:
+        # courier is a LOCK_COURIERS row
+        old_max_weight = COURIER_MAX_WEIGHT[CourierType(courier.courier_type)]
+        max_weight = old_max_weight
         if update_model.courier_type:
-            old_max_weight = self._get_courier_max_orders_weight(
-                courier.courier_type
-            )
-            new_max_weight = self._get_courier_max_orders_weight(
+            max_weight = self._get_courier_max_orders_weight(
                 update_model.courier_type
             )
-            if new_max_weight < old_max_weight:
-                delta = old_max_weight - new_max_weight
-                orders.sort(key=lambda order: order.weight, reverse=True)
-                for order in orders:
-                    ids_to_drop.add(order.id)
-                    delta -= order.weight
-                    if delta < 0:
-                        break
-
-        if update_model.regions:
-            new_regions = set(update_model.regions)
-            ids_to_drop.update(
-                {o.id for o in orders if o.region not in new_regions}
-            )
-
+        regions = update_model.regions or None
+        shifts = None
         if update_model.working_hours:
-            for order in orders:
-                if not self._is_order_fits(update_model.working_hours, order):
-                    ids_to_drop.add(order.id)
+            shifts = self._get_shifts(update_model.working_hours)
+
+        # nothing assigned can stop fitting
+        if (
+            regions is None
+            and shifts is None
+            and max_weight >= old_max_weight
+        ):
+            return None
+        return CourierChange(courier.id, max_weight, regions, shifts)
+
+    async def _unassign_invalid_orders(
+        self,
+        session: AsyncSession,
+        changes: List[Optional[CourierChange]],
+    ) -> Dict[int, List[int]]:
+        changes = [change for change in changes if change is not None]
+        if not changes:
+            return {}
+
+        result = await session.execute(
+            LOCK_OPEN_ORDERS,
+            {"courier_ids": [change.courier_id for change in changes]},
+        )
+        orders = result.all()
+        if not orders:
+            return {}
+
+        result = await session.execute(
+            ORDERS_DELIVERY_HOURS, {"order_ids": [row.id for row in orders]}
+        )
+        ids_to_drop = orders_to_drop(changes, orders, result.all())
+        if not ids_to_drop:
+            return {}
+
+        await session.execute(UNASSIGN_ORDERS, {"order_ids": ids_to_drop})
+        dropped = defaultdict(list)
+        ids_to_drop = set(ids_to_drop)
+        for row in orders:
+            if row.id in ids_to_drop:
+                dropped[row.courier_id].append(row.id)
+        return dropped
+
+    def _get_shifts(self, working_hours) -> IntervalSet:
+        return IntervalSet.from_hhmm(
+            (hours.from_border, hours.to_border) for hours in working_hours
+        )
 
-        return ids_to_drop
+    async def add_orders(self, orders_list: List[OrderDTO]):
+        async with self.ingest_orders() as ingest:
+            await ingest(orders_list)
 
-    def _is_order_fits(
+    @asynccontextmanager
+    async def ingest_orders(
         self,
-        new_delivery_hours: List[Tuple[int, int]],
-        order_hours: List[OrderDeliveryHoursTable],
-    ) -> bool:
-        for order_delivery_hours in order_hours:
-            for courier_delivery_hours in new_delivery_hours:
-                from_border, to_border = (
-                    courier_delivery_hours[0],
-                    courier_delivery_hours[1],
-                )
-                if (
-                    order_delivery_hours.from_border >= from_border
-                    and order_delivery_hours.to_border <= to_border
-                ):
-                    return True
+    ) -> AsyncIterator[Callable[[List[OrderDTO]], Awaitable[None]]]:
+        async with self._async_session() as session:
+            async with session.begin():
+                async def ingest(orders_list: List[OrderDTO]):
+                    await self._insert_orders(session, orders_list)
 
-        return False
+                yield ingest
 
-    async def add_orders(self, orders_list: List[OrderDTO]):
-        orders = []
+    async def _insert_orders(
+        self, session: AsyncSession, orders_list: List[OrderDTO]
+    ):
+        ids, weights, regions = [], [], []
+        hours_order_ids, hours_regions = [], []
+        from_borders, to_borders = [], []
         for order in orders_list:
-            o = OrdersTable(
-                id=order.order_id,
-                weight=order.weight,
-                region=order.region
+            ids.append(order.order_id)
+            weights.append(order.weight)
+            regions.append(order.region)
+
+            for hours in order.delivery_hours:
+                hours_order_ids.append(order.order_id)
+                hours_regions.append(order.region)
+                from_borders.append(hours.from_border)
+                to_borders.append(hours.to_border)
+
+        await session.execute(
+            INSERT_ORDERS, {"ids": ids, "weights": weights, "regions": regions}
+        )
+        if from_borders:
+            await session.execute(
+                INSERT_ORDER_DELIVERY_HOURS,
+                {
+                    "order_ids": hours_order_ids,
+                    "regions": hours_regions,
+                    "from_borders": from_borders,
+                    "to_borders": to_borders,
+                },
             )
-            o.order_hours = [
-                OrderDeliveryHoursTable(
-                    order_id=order.order_id,
-                    from_border=hours.from_border,
-                    to_border=hours.to_border,
-                )
-                for hours in order.delivery_hours
-            ]
-            orders.append(o)
-
-        async with self._async_session() as session:
-            session.add_all(orders)
-            await session.commit()
 
     async def complete_order(
         self, courier_id: int, order_id: int, complete_time: datetime
     ):
         async with self._async_session() as session:
-            query = (
-                select(OrdersTable)
-                .filter(OrdersTable.id == order_id)
-                .filter(OrdersTable.courier_id == courier_id)
-            )
-
-            result = await session.execute(query)
-            order = result.scalars().one()
+            async with session.begin():
+                result = await session.execute(
+                    COMPLETE_ORDER,
+                    {
+                        "order_id": order_id,
+                        "courier_id": courier_id,
+                        "complete_time": complete_time,
+                    },
+                )
+                result.one()
 
-            order.completed_at = complete_time
-            await session.commit()
+    async def complete_orders(self, completions: List[CompletionDTO]):
+        # all or nothing: one unknown order rolls the whole batch back
+        async with self._async_session() as session:
+            async with session.begin():
+                result = await session.execute(
+                    COMPLETE_ORDERS,
+                    {
+                        "order_ids": [c.order_id for c in completions],
+                        "courier_ids": [c.courier_id for c in completions],
+                        "complete_times": [
+                            c.completed_at for c in completions
+                        ],
+                    },
+                )
+                found = set(result.scalars())
+                missing = [
+                    c.order_id for c in completions if c.order_id not in found
+                ]
+                if missing:
+                    raise NoResultFound(
+                        f"no orders with ids {missing} for their couriers"
+                    )
 
     async def assign_orders(
-        self, courier_id: int, assign_time: datetime
+        self,
+        courier_id: int,
+        assign_time: datetime,
+        skip_locked: bool = False,
     ) -> List[int]:
         async with self._async_session() as session:
             async with session.begin():
-                query = (
-                    select(CouriersTable)
-                    .filter(CouriersTable.id == courier_id)
-                    .options(
-                        selectinload(CouriersTable.regions),
-                        selectinload(CouriersTable.working_hours),
-                    )
+                # never from cache, see LOCK_COURIER_PROFILE
+                result = await session.execute(
+                    LOCK_COURIER_PROFILE, {"courier_id": courier_id}
                 )
-                result = await session.execute(query)
-                courier = result.scalars().one()
-
-                query = (
-                    select(OrdersTable)
-                    .filter(OrdersTable.courier_id == None)
-                    .filter(
-                        OrdersTable.region.in_(
-                            [reg.region for reg in courier.regions]
-                        )
-                    )
-                    .filter(
-                        OrdersTable.order_hours.any(
-                            OrderDeliveryHoursTable.from_border
-                            >= CourierWorkingHoursTable.from_border
-                        )
-                    )
-                    .filter(
-                        OrdersTable.order_hours.any(
-                            OrderDeliveryHoursTable.to_border
-                            <= CourierWorkingHoursTable.to_border
-                        )
-                    )
-                    .order_by(OrdersTable.id)
-                    .with_for_update(of=OrdersTable)
-                    .options(selectinload(OrdersTable.order_hours))
-                )
-
-                result = await session.execute(query)
-                orders = result.scalars().all()
-                if len(orders) == 0:
+                courier = result.first()
+                if courier is None:
+                    raise NoResultFound(f"no courier with id {courier_id}")
+                if not courier.regions or not courier.from_borders:
                     return []
 
-                query = select(OrdersTable).filter(
-                    OrdersTable.courier_id == courier_id
+                courier_type = CourierType(courier.courier_type)
+                from_borders, to_borders = IntervalSet.from_hhmm(
+                    zip(courier.from_borders, courier.to_borders)
+                ).to_hhmm()
+                result = await session.execute(
+                    ASSIGN_ORDERS_SKIP_LOCKED
+                    if skip_locked
+                    else ASSIGN_ORDERS,
+                    {
+                        "courier_id": courier_id,
+                        "courier_type": courier_type.value,
+                        "max_weight": self._get_courier_max_orders_weight(
+                            courier_type
+                        ),
+                        "regions": courier.regions,
+                        "from_borders": from_borders,
+                        "to_borders": to_borders,
+                        "assign_time": assign_time,
+                    },
                 )
-                result = await session.execute(query)
-                assigned_orders = result.scalars().all()
+                assigned = sorted(result, key=lambda row: (row.weight, row.id))
+                return [row.id for row in assigned]
 
-                max_weight = self._get_courier_max_orders_weight(
-                    courier.courier_type
+    async def assign_orders_batch(
+        self,
+        courier_ids: List[int],
+        assign_time: datetime,
+        skip_locked: bool = False,
+    ) -> Dict[int, List[int]]:
+        async with self._async_session() as session:
+            async with session.begin():
+                # as in assign_orders, profiles are read under the row locks
+                await session.execute(LOCK_COURIERS, {"ids": courier_ids})
+                result = await session.execute(
+                    COURIERS_CAPACITY, {"courier_ids": courier_ids}
                 )
-                assigned_weight = max(
-                    sum([o.weight for o in assigned_orders]),
-                    0,
+                capacities = {
+                    row.courier_id: row.remained for row in result
+                }
+                missing = [
+                    c_id for c_id in courier_ids if c_id not in capacities
+                ]
+                if missing:
+                    raise NoResultFound(f"no couriers with ids {missing}")
+
+                result = await session.execute(
+                    select(CourierWorkingHoursTable).filter(
+                        CourierWorkingHoursTable.courier_id.in_(courier_ids)
+                    )
+                )
+                working_hours = defaultdict(list)
+                for hours in result.scalars():
+                    working_hours[hours.courier_id].append(hours)
+
+                shift_courier_ids, from_borders, to_borders = [], [], []
+                for courier_id, hours in working_hours.items():
+                    courier_from, courier_to = self._get_shifts(
+                        hours
+                    ).to_hhmm()
+                    shift_courier_ids.extend([courier_id] * len(courier_from))
+                    from_borders.extend(courier_from)
+                    to_borders.extend(courier_to)
+
+                result = await session.execute(
+                    BATCH_ASSIGN_CANDIDATES_SKIP_LOCKED
+                    if skip_locked
+                    else BATCH_ASSIGN_CANDIDATES,
+                    {
+                        "shift_courier_ids": shift_courier_ids,
+                        "from_borders": from_borders,
+                        "to_borders": to_borders,
+                    },
+                )
+                assigned = solve_assignment(
+                    capacities,
+                    (
+                        (row.courier_id, row.order_id, row.weight)
+                        for row in result
+                    ),
                 )
-                remained_weight = max_weight - assigned_weight
-                if remained_weight <= 0:
-                    return []
 
-                # only number of orders matters by task
-                orders.sort(key=lambda order: order.weight)
-                ids_to_assign = []
-                for order in orders:
-                    if remained_weight - order.weight < 0:
-                        break
+                order_ids, order_courier_ids = [], []
+                for courier_id, ids in assigned.items():
+                    order_ids.extend(ids)
+                    order_courier_ids.extend([courier_id] * len(ids))
+
+                if order_ids:
+                    await session.execute(
+                        ASSIGN_ORDERS_TO_COURIERS,
+                        {
+                            "order_ids": order_ids,
+                            "courier_ids": order_courier_ids,
+                            "assign_time": assign_time,
+                        },
+                    )
 
-                    ids_to_assign.append(order.id)
-                    remained_weight -= order.weight
-                    order.courier_id = courier_id
-                    order.assigned_at = assign_time
-                    order.delivery_type = courier.courier_type
+                return assigned
 
-                return ids_to_assign
+    async def get_courier_with_rating(
+        self, courier_id: int, in_database: bool = False
+    ) -> CourierWithRatingDTO:
+        async with self._async_session() as session:
+            courier = await self._load_courier(session, courier_id)
+            if in_database:
+                rating = await self._query_rating(session, courier_id)
+            else:
+                rating = await self._stream_rating(session, courier_id)
+
+            return CourierWithRatingDTO.construct(
+                courier=courier,
+                orders_count=rating.orders_count,
+                rating=rating.rating,
+                earnings=rating.earnings,
+            )
+
+    async def _query_rating(
+        self, session: AsyncSession, courier_id: int
+    ) -> CourierRating:
+        result = await session.execute(
+            COURIER_RATING, {"courier_id": courier_id}
+        )
+        orders_count, delivery_time, earnings = result.one()
+        rating = 0.0
+        if delivery_time is not None:
+            rating = rating_by_delivery_time(delivery_time)
+        return CourierRating(orders_count, rating, earnings)
+
+    async def _stream_rating(
+        self, session: AsyncSession, courier_id: int
+    ) -> CourierRating:
+        # only the columns the rating needs, sorted the way
+        # RatingAccumulator reduces them and streamed from a server-side
+        # cursor, so a long history is never held in memory at once
+        history = union_all(
+            select(
+                OrdersTable.id,
+                OrdersTable.region,
+                OrdersTable.assigned_at,
+                OrdersTable.completed_at,
+                OrdersTable.delivery_type,
+            )
+            .filter(OrdersTable.courier_id == courier_id)
+            .filter(OrdersTable.completed_at != None),
+            select(
+                OrdersArchiveTable.id,
+                OrdersArchiveTable.region,
+                OrdersArchiveTable.assigned_at,
+                OrdersArchiveTable.completed_at,
+                OrdersArchiveTable.delivery_type,
+            ).filter(OrdersArchiveTable.courier_id == courier_id),
+        ).subquery()
+        orders_query = select(
+            history.c.region,
+            history.c.assigned_at,
+            history.c.completed_at,
+            history.c.delivery_type,
+        ).order_by(
+            history.c.region,
+            history.c.completed_at,
+            history.c.id,
+        )
+        accumulator = RatingAccumulator()
+        result = await session.stream(orders_query)
+        async for rows in result.partitions(RATING_ROWS_PER_FETCH):
+            accumulator.extend(rows)
+        return accumulator.result()
 
-    async def get_courier_with_completed_orders(
+    async def get_courier_with_stats(
         self, courier_id: int
-    ) -> CourierWithOrdersDTO:
+    ) -> CourierWithStatsDTO:
         async with self._async_session() as session:
-            courier_query = (
-                select(CouriersTable)
-                .filter(CouriersTable.id == courier_id)
-                .options(
-                    selectinload(CouriersTable.regions),
-                    selectinload(CouriersTable.working_hours),
-                )
-            )
-            result = await session.execute(courier_query)
-            courier = result.scalars().one()
+            courier = await self._load_courier(session, courier_id)
 
-            orders_query = (
-                select(OrdersTable)
-                .filter(OrdersTable.courier_id == courier_id)
-                .filter(OrdersTable.completed_at != None)
+            stats_query = select(CourierRegionStatsTable).filter(
+                CourierRegionStatsTable.courier_id == courier_id
             )
-            result = await session.execute(orders_query)
-            orders = result.scalars().all()
-
-            return CourierWithOrdersDTO(
-                courier=CourierDTO(
-                    courier_id=courier.id,
-                    courier_type=CourierTypeDTO(courier.courier_type.value),
-                    regions=[r.region for r in courier.regions],
-                    working_hours=[
-                        WorkingHoursDTO(
-                            from_border=h.from_border, to_border=h.to_border
-                        )
-                        for h in courier.working_hours
-                    ],
-                ),
-                orders=[
-                    OrderDTO(
-                        id=o.id,
-                        region=o.region,
-                        assigned_at=o.assigned_at,
-                        completed_at=o.completed_at,
-                        delivery_type=CourierTypeDTO(o.delivery_type.value),
+            result = await session.execute(stats_query)
+            stats = result.scalars().all()
+
+            return CourierWithStatsDTO.construct(
+                courier=courier,
+                regions=[
+                    RegionStatsDTO.construct(
+                        region=s.region,
+                        orders_count=s.orders_count,
+                        first_assigned_at=s.first_assigned_at,
+                        last_completed_at=s.last_completed_at,
+                        earnings=s.earnings,
                     )
-                    for o in orders
+                    for s in stats
                 ],
             )
 
+    async def rebuild_courier_stats(self):
+        async with self._async_session() as session:
+            async with session.begin():
+                await session.execute(LOCK_COURIER_STATS)
+                await session.execute(delete(CourierRegionStatsTable))
+                await session.execute(REBUILD_COURIER_STATS)
+
+    async def ensure_partitions(self, months_ahead: int) -> List[str]:
+        async with self._engine.connect() as conn:
+            return await conn.run_sync(maintain_partitions, months_ahead)
+
+    async def archive_orders(self, before: datetime, batch_size: int) -> int:
+        async with self._async_session() as session:
+            async with session.begin():
+                result = await session.execute(
+                    ARCHIVE_ORDERS,
+                    {"before": before, "batch_size": batch_size},
+                )
+                return result.scalar()
+
+    async def get_courier(self, courier_id: int) -> CourierDTO:
+        async with self._async_session() as session:
+            return await self._load_courier(session, courier_id)
+
+    async def _load_courier(
+        self, session: AsyncSession, courier_id: int
+    ) -> CourierDTO:
+        cached = await self._courier_cache.get(courier_id)
+        if cached is not None:
+            return cached
+
+        courier_query = (
+            select(CouriersTable)
+            .filter(CouriersTable.id == courier_id)
+            .options(
+                selectinload(CouriersTable.regions),
+                selectinload(CouriersTable.working_hours),
+            )
+        )
+        result = await session.execute(courier_query)
+        courier_dto = self._to_courier_dto(result.scalars().one())
+        await self._courier_cache.set(courier_dto)
+        return courier_dto
+
+    async def _load_couriers(
+        self, session: AsyncSession, courier_ids: List[int]
+    ) -> Dict[int, CourierDTO]:
+        courier_query = (
+            select(CouriersTable)
+            .filter(CouriersTable.id.in_(courier_ids))
+            .options(
+                selectinload(CouriersTable.regions),
+                selectinload(CouriersTable.working_hours),
+            )
+            .execution_options(populate_existing=True)
+        )
+        result = await session.execute(courier_query)
+        return {
+            courier.id: self._to_courier_dto(courier)
+            for courier in result.scalars()
+        }
+
+    def _to_courier_dto(self, courier: CouriersTable) -> CourierDTO:
+        return CourierDTO.construct(
+            courier_id=courier.id,
+            courier_type=CourierTypeDTO(courier.courier_type.value),
+            regions=[r.region for r in courier.regions],
+            working_hours=[
+                WorkingHoursDTO.construct(
+                    from_border=h.from_border, to_border=h.to_border
+                )
+                for h in courier.working_hours
+            ],
+        )
+
     def _get_courier_max_orders_weight(self, courier_type: CourierType) -> int:
-        if courier_type == CourierType.foot or courier_type == CourierTypeDTO.foot:
-            return 10
-        if courier_type == CourierType.bike or courier_type == CourierTypeDTO.bike:
-            return 15
-        if courier_type == CourierType.car or courier_type == CourierTypeDTO.car:
-            return 50
+        return COURIER_MAX_WEIGHT[CourierType(courier_type.value)]
@@ -0,0 +1,65 @@
+import argparse
+import logging
+import os
+import sys
+
+from sqlalchemy.engine import create_engine
+
+from candy_delivery.db import migrations, partitioning
+
+
+log = logging.getLogger(__name__)
+
+
+# brings the schema of DB_SYNC_URL up to date:
+#   python3 -m candy_delivery.db.migrate
+#   python3 -m candy_delivery.db.migrate status
+# and, optionally, partitions orders by completion month and keeps
+# partitions created ahead:
+#   python3 -m candy_delivery.db.migrate partition-orders
+#   python3 -m candy_delivery.db.migrate add-partitions --months-ahead 3
+def main(args):
+    db_url = os.getenv('DB_SYNC_URL')
+    if not db_url:
+        sys.exit('no sync DB URL!')
+    engine = create_engine(db_url)
+
+    if args.command == "status":
+        with engine.connect() as conn:
+            pending = migrations.pending(conn)
+        for migration in migrations.MIGRATIONS:
+            state = "pending" if migration in pending else "applied"
+            print(f"{migration.version:>4} {state:<8} {migration.name}")
+        with engine.connect() as conn:
+            partitioned = partitioning.is_partitioned(conn)
+        print(f"orders partitioned: {'yes' if partitioned else 'no'}")
+        return
+
+    with engine.connect() as conn:
+        migrations.upgrade(conn, args.target)
+    if args.command == "partition-orders":
+        log.info("partitioning orders...")
+        with engine.begin() as conn:
+            partitioning.partition_orders(conn)
+            partitioning.ensure_partitions(conn, args.months_ahead)
+    elif args.command == "add-partitions":
+        with engine.begin() as conn:
+            if not partitioning.is_partitioned(conn):
+                sys.exit("orders is not partitioned")
+            partitioning.ensure_partitions(conn, args.months_ahead)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="database schema migrations")
+    parser.add_argument(
+        "command",
+        nargs="?",
+        default="upgrade",
+        choices=["upgrade", "status", "partition-orders", "add-partitions"],
+    )
+    parser.add_argument(
+        "--target", type=int, help="stop after this migration version"
+    )
+    parser.add_argument("--months-ahead", type=int, default=3)
+    main(parser.parse_args())
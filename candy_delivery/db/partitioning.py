@@ -0,0 +1,231 @@
+import logging
+from datetime import date, datetime, timezone
+from typing import List
+
+from sqlalchemy.engine import Connection
+from sqlalchemy.sql.expression import text
+
+
+log = logging.getLogger(__name__)
+
+# open orders and completed ones without a monthly partition yet live in the
+# default partition; completing an order moves it to the partition of its
+# month, so the working set of assignment stays small however long the
+# history grows
+LIVE_PARTITION = "orders_live"
+
+# servers creating partitions at the same time do it one after another
+PARTITIONS_LOCK_ID = 20210302
+
+# the indexes of the orders table before partitioning; they become indexes
+# of the live partition and get the same definitions on the partitioned
+# table, from where every monthly partition inherits them
+_ORDERS_INDEXES = [
+    ("ix_orders_courier_completed_at", "(courier_id, completed_at)"),
+    (
+        "ix_orders_open_region_weight",
+        "(region, weight) WHERE courier_id IS NULL",
+    ),
+    ("ix_orders_courier_open", "(courier_id) WHERE completed_at IS NULL"),
+    (
+        "ix_orders_completed_at",
+        "(completed_at) WHERE completed_at IS NOT NULL",
+    ),
+    (
+        "ix_orders_courier_completed",
+        "(courier_id, region, completed_at) WHERE completed_at IS NOT NULL",
+    ),
+]
+
+# a partitioned table can't have a unique key without the partition column,
+# so every partition keeps its own primary key on id, and a new order is
+# also checked against the completed orders of the monthly partitions
+_CREATE_ID_CHECK = [
+    """
+    CREATE OR REPLACE FUNCTION orders_check_id() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        IF EXISTS (
+            SELECT 1 FROM orders
+            WHERE id = NEW.id AND completed_at IS NOT NULL
+        ) THEN
+            RAISE unique_violation
+                USING MESSAGE = format('duplicate order id %s', NEW.id);
+        END IF;
+        RETURN NEW;
+    END
+    $$
+    """,
+    f"""
+    CREATE TRIGGER orders_check_id BEFORE INSERT ON {LIVE_PARTITION}
+    FOR EACH ROW EXECUTE FUNCTION orders_check_id()
+    """,
+]
+
+
+def is_partitioned(conn: Connection) -> bool:
+    # compared in SQL: drivers don't agree on how to return a "char"
+    result = conn.execute(
+        text(
+            "SELECT relkind = 'p' FROM pg_class"
+            " WHERE oid = to_regclass('orders')"
+        )
+    )
+    return bool(result.scalar())
+
+
+def partition_orders(conn: Connection):
+    # turns orders into a table partitioned by completed_at in place: the
+    # existing table is attached as the default partition without copying
+    # it, then the completed orders are moved out month by month
+    if is_partitioned(conn):
+        return
+
+    conn.execute(text("LOCK TABLE orders IN ACCESS EXCLUSIVE MODE"))
+    # a foreign key needs a unique key on orders.id alone, which a
+    # partitioned table can't have
+    conn.execute(
+        text(
+            "ALTER TABLE order_delivery_hours"
+            " DROP CONSTRAINT IF EXISTS order_delivery_hours_order_id_fkey"
+        )
+    )
+    conn.execute(text(f"ALTER TABLE orders RENAME TO {LIVE_PARTITION}"))
+    conn.execute(
+        text(f"ALTER INDEX orders_pkey RENAME TO {LIVE_PARTITION}_pkey")
+    )
+    conn.execute(
+        text(
+            "ALTER TABLE {0} RENAME CONSTRAINT orders_courier_id_fkey"
+            " TO {0}_courier_id_fkey".format(LIVE_PARTITION)
+        )
+    )
+    for name, _ in _ORDERS_INDEXES:
+        conn.execute(
+            text(
+                f"ALTER INDEX IF EXISTS {name}"
+                f" RENAME TO {LIVE_PARTITION}_{name[len('ix_orders_'):]}"
+            )
+        )
+
+    conn.execute(
+        text(
+            f"CREATE TABLE orders (LIKE {LIVE_PARTITION} INCLUDING DEFAULTS)"
+            " PARTITION BY RANGE (completed_at)"
+        )
+    )
+    conn.execute(
+        text(f"ALTER TABLE orders ATTACH PARTITION {LIVE_PARTITION} DEFAULT")
+    )
+    # equivalent indexes and constraints of the partition are attached to
+    # these instead of being built again
+    conn.execute(
+        text(
+            "ALTER TABLE orders ADD CONSTRAINT orders_courier_id_fkey"
+            " FOREIGN KEY (courier_id) REFERENCES couriers (id)"
+            " ON DELETE CASCADE"
+        )
+    )
+    for name, definition in _ORDERS_INDEXES:
+        conn.execute(text(f"CREATE INDEX {name} ON orders {definition}"))
+    for statement in _CREATE_ID_CHECK:
+        conn.execute(text(statement))
+
+    ensure_partitions(conn, months_ahead=0)
+
+
+def month_partition_name(month: date) -> str:
+    return f"orders_{month.year:04d}_{month.month:02d}"
+
+
+def _next_month(month: date) -> date:
+    if month.month == 12:
+        return date(month.year + 1, 1, 1)
+    return date(month.year, month.month + 1, 1)
+
+
+def _month_bound(month: date) -> str:
+    return f"{month.isoformat()} 00:00:00+00"
+
+
+def create_month_partition(conn: Connection, month: date) -> bool:
+    name = month_partition_name(month)
+    exists = conn.execute(
+        text("SELECT to_regclass(:name) IS NOT NULL"), {"name": name}
+    ).scalar()
+    if exists:
+        return False
+
+    start = datetime(month.year, month.month, 1, tzinfo=timezone.utc)
+    end_month = _next_month(month)
+    end = datetime(end_month.year, end_month.month, 1, tzinfo=timezone.utc)
+    # built as a plain table and attached, since the default partition may
+    # already hold orders of this month, which are moved over first
+    conn.execute(
+        text(f"CREATE TABLE {name} (LIKE orders INCLUDING DEFAULTS)")
+    )
+    conn.execute(
+        text(
+            f"""
+            WITH moved AS (
+                DELETE FROM {LIVE_PARTITION}
+                WHERE completed_at >= :start AND completed_at < :end
+                RETURNING *
+            )
+            INSERT INTO {name} SELECT * FROM moved
+            """
+        ),
+        {"start": start, "end": end},
+    )
+    conn.execute(
+        text(
+            f"ALTER TABLE {name}"
+            f" ADD CONSTRAINT {name}_pkey PRIMARY KEY (id)"
+        )
+    )
+    conn.execute(
+        text(
+            f"ALTER TABLE orders ATTACH PARTITION {name} FOR VALUES"
+            f" FROM ('{_month_bound(month)}') TO ('{_month_bound(end_month)}')"
+        )
+    )
+    return True
+
+
+def maintain_partitions(conn: Connection, months_ahead: int) -> List[str]:
+    # run from the background task of every server, a no-op until orders
+    # is partitioned. A month is created once, so the lock on the default
+    # partition that attaching takes is rare and short
+    with conn.begin():
+        conn.execute(
+            text("SELECT pg_advisory_xact_lock(:id)"),
+            {"id": PARTITIONS_LOCK_ID},
+        )
+        if not is_partitioned(conn):
+            return []
+        return ensure_partitions(conn, months_ahead)
+
+
+def ensure_partitions(conn: Connection, months_ahead: int) -> List[str]:
+    # partitions for every month of the completed orders still in the
+    # default partition and for months_ahead months after the current one,
+    # so completions land in their partition
+    first = conn.execute(
+        text(f"SELECT MIN(completed_at) FROM {LIVE_PARTITION}")
+    ).scalar()
+    now = datetime.now(timezone.utc)
+    month = date(now.year, now.month, 1)
+    last = month
+    for _ in range(months_ahead):
+        last = _next_month(last)
+    if first is not None:
+        first = first.astimezone(timezone.utc)
+        month = min(month, date(first.year, first.month, 1))
+
+    created = []
+    while month <= last:
+        if create_month_partition(conn, month):
+            log.info("created partition %s", month_partition_name(month))
+            created.append(month_partition_name(month))
+        month = _next_month(month)
+    return created
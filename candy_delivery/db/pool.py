@@ -0,0 +1,141 @@
+import time
+import weakref
+from typing import Optional
+
+from pydantic import BaseModel
+from sqlalchemy import event
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from candy_delivery import metrics
+from candy_delivery.settings import settings_from_env
+
+
+POOL_CHECKOUT_SECONDS = metrics.histogram(
+    "db_pool_checkout_seconds",
+    "Time spent waiting for a connection from the pool",
+)
+QUERY_SECONDS = metrics.histogram(
+    "db_query_seconds",
+    "Time spent executing statements, by statement kind",
+    labelnames=("statement",),
+)
+
+POOL_SETTINGS_KEY = "pool_settings"
+
+_engines = weakref.WeakSet()
+
+
+def _collect_pool_state(state):
+    def collect():
+        return [((), sum(state(engine.pool) for engine in list(_engines)))]
+    return collect
+
+
+metrics.gauge(
+    "db_pool_connections_in_use",
+    "Connections checked out of the pool",
+    collect=_collect_pool_state(lambda pool: pool.checkedout()),
+)
+metrics.gauge(
+    "db_pool_connections_idle",
+    "Connections idle in the pool",
+    collect=_collect_pool_state(lambda pool: pool.checkedin()),
+)
+metrics.gauge(
+    "db_pool_overflow",
+    "Connections opened over pool_size",
+    collect=_collect_pool_state(lambda pool: max(pool.overflow(), 0)),
+)
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            POOL_CHECKOUT_SECONDS.observe(time.perf_counter() - started)
+
+
+class PoolSettings(BaseModel):
+    pool_size: int = 5
+    max_overflow: int = 10
+    pool_timeout: float = 30
+    pool_recycle: int = -1
+    pool_pre_ping: bool = False
+    statement_cache_size: int = 100
+
+    @classmethod
+    def from_env(cls) -> "PoolSettings":
+        env_names = {
+            "pool_size": "DB_POOL_SIZE",
+            "max_overflow": "DB_MAX_OVERFLOW",
+            "pool_timeout": "DB_POOL_TIMEOUT",
+            "pool_recycle": "DB_POOL_RECYCLE",
+            "pool_pre_ping": "DB_POOL_PRE_PING",
+            "statement_cache_size": "DB_STATEMENT_CACHE_SIZE",
+        }
+        return settings_from_env(cls, env_names)
+
+    def per_worker(
+        self, workers: int, max_connections: Optional[int]
+    ) -> "PoolSettings":
+        # every worker process has its own pool; with a budget for the
+        # whole server each one gets an equal share of it
+        if not max_connections:
+            return self
+        share = max(max_connections // workers, 1)
+        pool_size = min(self.pool_size, share)
+        return self.copy(
+            update={
+                "pool_size": pool_size,
+                "max_overflow": min(self.max_overflow, share - pool_size),
+            }
+        )
+
+
+def create_engine(dsn: str, settings: PoolSettings) -> AsyncEngine:
+    # asyncpg prepared statements are cached per connection by the dialect
+    url = make_url(dsn).update_query_dict(
+        {"prepared_statement_cache_size": str(settings.statement_cache_size)}
+    )
+    engine = create_async_engine(
+        url,
+        echo=False,
+        poolclass=InstrumentedPool,
+        pool_size=settings.pool_size,
+        max_overflow=settings.max_overflow,
+        pool_timeout=settings.pool_timeout,
+        pool_recycle=settings.pool_recycle,
+        pool_pre_ping=settings.pool_pre_ping,
+    )
+    sync_engine = engine.sync_engine
+    _engines.add(sync_engine)
+    event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(sync_engine, "handle_error", _handle_error)
+    return engine
+
+
+def _before_cursor_execute(
+    conn, cursor, statement, parameters, context, executemany
+):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(
+    conn, cursor, statement, parameters, context, executemany
+):
+    started = conn.info["query_started"].pop()
+    kind = statement.lstrip().split(None, 1)[0].upper()
+    QUERY_SECONDS.labels(kind).observe(time.perf_counter() - started)
+
+
+def _handle_error(context):
+    if context.connection is None:
+        return
+    started = context.connection.info.get("query_started")
+    if started:
+        started.pop()
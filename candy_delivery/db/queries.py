@@ -0,0 +1,626 @@
+from sqlalchemy.sql.expression import text
+
+from candy_delivery.db.schema import (
+    COURIER_EARNINGS_FACTOR,
+    COURIER_MAX_WEIGHT,
+    ORDER_BASE_EARNINGS,
+)
+
+
+# rows are passed as parallel arrays and expanded with unnest, so every batch
+# is a single INSERT with a constant number of bind parameters
+INSERT_COURIERS = text(
+    """
+    INSERT INTO couriers (id, courier_type)
+    SELECT * FROM unnest(
+        CAST(:ids AS INTEGER[]), CAST(:courier_types AS courier_type[])
+    )
+    """
+)
+
+INSERT_COURIER_REGIONS = text(
+    """
+    INSERT INTO courier_regions (courier_id, region)
+    SELECT * FROM unnest(
+        CAST(:courier_ids AS INTEGER[]), CAST(:regions AS INTEGER[])
+    )
+    """
+)
+
+INSERT_COURIER_WORKING_HOURS = text(
+    """
+    INSERT INTO courier_working_hours (courier_id, from_border, to_border)
+    SELECT * FROM unnest(
+        CAST(:courier_ids AS INTEGER[]),
+        CAST(:from_borders AS INTEGER[]),
+        CAST(:to_borders AS INTEGER[])
+    )
+    """
+)
+
+INSERT_ORDERS = text(
+    """
+    INSERT INTO orders (id, weight, region)
+    SELECT * FROM unnest(
+        CAST(:ids AS INTEGER[]),
+        CAST(:weights AS DOUBLE PRECISION[]),
+        CAST(:regions AS INTEGER[])
+    )
+    """
+)
+
+INSERT_ORDER_DELIVERY_HOURS = text(
+    """
+    INSERT INTO order_delivery_hours
+        (order_id, region, from_border, to_border)
+    SELECT * FROM unnest(
+        CAST(:order_ids AS INTEGER[]),
+        CAST(:regions AS INTEGER[]),
+        CAST(:from_borders AS INTEGER[]),
+        CAST(:to_borders AS INTEGER[])
+    )
+    """
+)
+
+
+def _max_weight_case(column: str) -> str:
+    whens = " ".join(
+        f"WHEN '{courier_type.value}' THEN {weight}"
+        for courier_type, weight in COURIER_MAX_WEIGHT.items()
+    )
+    return f"CASE {column} {whens} END"
+
+
+# a delivery window or a shift in a region as one range: borders are HHMM,
+# so region * 10000 puts every region in a block of its own, and a lookup in
+# the GiST index over the windows only walks the region asked for
+def _region_window(region: str, from_border: str, to_border: str) -> str:
+    key = f"CAST({region} AS BIGINT) * 10000"
+    return (
+        f"int8range({key} + {from_border}, {key} + {to_border}, '[]')"
+    )
+
+
+_HOURS_WINDOW = _region_window(
+    "order_delivery_hours.region",
+    "order_delivery_hours.from_border",
+    "order_delivery_hours.to_border",
+)
+
+
+# greedy lightest-first assignment in one round trip: the running sum over
+# candidates sorted by weight is the same cut the python loop used to make.
+# The courier profile comes in as parameters, read by LOCK_COURIER_PROFILE.
+# Every (region, shift) pair of the courier is one probe of the index.
+_ASSIGN_CANDIDATES = f"""
+    WITH capacity AS (
+        SELECT :max_weight - COALESCE(SUM(orders.weight), 0) AS remained
+        FROM orders
+        WHERE orders.courier_id = :courier_id
+            AND orders.completed_at IS NULL
+    ),
+    shifts AS (
+        SELECT *
+        FROM unnest(
+            CAST(:from_borders AS INTEGER[]), CAST(:to_borders AS INTEGER[])
+        ) AS shift(from_border, to_border)
+    ),
+    regions AS (
+        SELECT unnest(CAST(:regions AS INTEGER[])) AS region
+    ),
+    candidates AS (
+        SELECT orders.id, orders.weight
+        FROM orders
+        WHERE orders.courier_id IS NULL
+            AND orders.region = ANY(CAST(:regions AS INTEGER[]))
+            AND orders.id IN (
+                SELECT order_delivery_hours.order_id
+                FROM regions
+                CROSS JOIN shifts
+                JOIN order_delivery_hours
+                    ON {_HOURS_WINDOW}
+                    <@ {_region_window(
+                        "regions.region",
+                        "shifts.from_border",
+                        "shifts.to_border",
+                    )}
+            )
+        {{lock}}
+    )"""
+
+_LIGHTEST_FIRST = """
+        SELECT ranked.id
+        FROM (
+            SELECT
+                id,
+                SUM(weight) OVER (ORDER BY weight, id) AS running_weight
+            FROM {source}
+        ) AS ranked, capacity
+        WHERE ranked.running_weight <= capacity.remained"""
+
+_ASSIGN_PICKED = """
+    UPDATE orders
+    SET
+        courier_id = :courier_id,
+        assigned_at = :assign_time,
+        delivery_type = CAST(:courier_type AS courier_type)
+    FROM picked
+    WHERE orders.id = picked.id
+    RETURNING orders.id, orders.weight
+"""
+
+# every candidate is locked in ID order, so concurrent couriers with
+# overlapping regions wait for each other instead of deadlocking
+ASSIGN_ORDERS = text(
+    _ASSIGN_CANDIDATES.format(
+        lock="ORDER BY orders.id\n        FOR UPDATE OF orders"
+    )
+    + f""",
+    picked AS ({_LIGHTEST_FIRST.format(source="candidates")}
+    )"""
+    + _ASSIGN_PICKED
+)
+
+# no courier waits: each one locks as many of the lightest free orders as
+# would fit, skipping the ones other couriers hold, so parallel couriers get
+# disjoint orders. Under contention the locked orders are heavier than the
+# ones skipped and a courier may get less than fits, never more.
+ASSIGN_ORDERS_SKIP_LOCKED = text(
+    _ASSIGN_CANDIDATES.format(lock="")
+    + f""",
+    locked AS (
+        SELECT orders.id, orders.weight
+        FROM orders
+        WHERE orders.id IN (SELECT id FROM candidates)
+            AND orders.courier_id IS NULL
+        ORDER BY orders.weight, orders.id
+        LIMIT (
+            SELECT COUNT(*) FROM ({_LIGHTEST_FIRST.format(source="candidates")}
+            ) AS fitting
+        )
+        FOR UPDATE OF orders SKIP LOCKED
+    ),
+    picked AS ({_LIGHTEST_FIRST.format(source="locked")}
+    )"""
+    + _ASSIGN_PICKED
+)
+
+COURIERS_CAPACITY = text(
+    f"""
+    SELECT
+        couriers.id AS courier_id,
+        {_max_weight_case("couriers.courier_type")}
+            - COALESCE(SUM(orders.weight), 0) AS remained
+    FROM couriers
+    LEFT JOIN orders
+        ON orders.courier_id = couriers.id
+        AND orders.completed_at IS NULL
+    WHERE couriers.id = ANY(CAST(:courier_ids AS INTEGER[]))
+    GROUP BY couriers.id
+    """
+)
+
+# every (courier, open order) pair that fits by region and hours; each order
+# is locked once no matter how many couriers of the batch compete for it.
+# Shifts come in merged, as for ASSIGN_ORDERS.
+_BATCH_ASSIGN_CANDIDATES = f"""
+    WITH shifts AS (
+        SELECT *
+        FROM unnest(
+            CAST(:shift_courier_ids AS INTEGER[]),
+            CAST(:from_borders AS INTEGER[]),
+            CAST(:to_borders AS INTEGER[])
+        ) AS shift(courier_id, from_border, to_border)
+    ),
+    eligible AS (
+        SELECT DISTINCT
+            shifts.courier_id,
+            orders.id AS order_id
+        FROM shifts
+        JOIN courier_regions
+            ON courier_regions.courier_id = shifts.courier_id
+        JOIN order_delivery_hours
+            ON {_HOURS_WINDOW}
+            <@ {_region_window(
+                "courier_regions.region",
+                "shifts.from_border",
+                "shifts.to_border",
+            )}
+        JOIN orders
+            ON orders.id = order_delivery_hours.order_id
+            AND orders.courier_id IS NULL
+    ),
+    locked AS (
+        SELECT orders.id, orders.weight
+        FROM orders
+        WHERE orders.courier_id IS NULL
+            AND orders.id IN (SELECT order_id FROM eligible)
+        ORDER BY orders.id
+        FOR UPDATE OF orders{{skip}}
+    )
+    SELECT eligible.courier_id, locked.id AS order_id, locked.weight
+    FROM locked
+    JOIN eligible ON eligible.order_id = locked.id
+"""
+
+BATCH_ASSIGN_CANDIDATES = text(_BATCH_ASSIGN_CANDIDATES.format(skip=""))
+
+# orders locked by a concurrent assignment are left out of the batch
+BATCH_ASSIGN_CANDIDATES_SKIP_LOCKED = text(
+    _BATCH_ASSIGN_CANDIDATES.format(skip=" SKIP LOCKED")
+)
+
+ASSIGN_ORDERS_TO_COURIERS = text(
+    """
+    UPDATE orders
+    SET
+        courier_id = assignment.courier_id,
+        assigned_at = :assign_time,
+        delivery_type = couriers.courier_type
+    FROM unnest(
+        CAST(:order_ids AS INTEGER[]), CAST(:courier_ids AS INTEGER[])
+    ) AS assignment(order_id, courier_id)
+    JOIN couriers ON couriers.id = assignment.courier_id
+    WHERE orders.id = assignment.order_id
+    """
+)
+
+
+# couriers are locked in ID order, so that overlapping batches queue up
+# instead of deadlocking. The key of a courier never changes, so the lock
+# doesn't block the FOR KEY SHARE locks of foreign key checks on orders and
+# stats rows referencing it
+LOCK_COURIERS = text(
+    """
+    SELECT couriers.id, couriers.courier_type
+    FROM couriers
+    WHERE couriers.id = ANY(CAST(:ids AS INTEGER[]))
+    ORDER BY couriers.id
+    FOR NO KEY UPDATE
+    """
+)
+
+# the profile assignment works from, in one statement under the courier's
+# row lock, so that an update can't change it mid-assignment
+LOCK_COURIER_PROFILE = text(
+    """
+    SELECT
+        couriers.courier_type,
+        ARRAY(
+            SELECT courier_regions.region
+            FROM courier_regions
+            WHERE courier_regions.courier_id = couriers.id
+        ) AS regions,
+        ARRAY(
+            SELECT courier_working_hours.from_border
+            FROM courier_working_hours
+            WHERE courier_working_hours.courier_id = couriers.id
+            ORDER BY courier_working_hours.id
+        ) AS from_borders,
+        ARRAY(
+            SELECT courier_working_hours.to_border
+            FROM courier_working_hours
+            WHERE courier_working_hours.courier_id = couriers.id
+            ORDER BY courier_working_hours.id
+        ) AS to_borders
+    FROM couriers
+    WHERE couriers.id = :courier_id
+    FOR NO KEY UPDATE OF couriers
+    """
+)
+
+UPDATE_COURIER_TYPES = text(
+    """
+    UPDATE couriers
+    SET courier_type = changed.courier_type
+    FROM unnest(
+        CAST(:ids AS INTEGER[]), CAST(:courier_types AS courier_type[])
+    ) AS changed(id, courier_type)
+    WHERE couriers.id = changed.id
+    """
+)
+
+DELETE_COURIER_REGIONS = text(
+    """
+    DELETE FROM courier_regions
+    WHERE courier_id = ANY(CAST(:courier_ids AS INTEGER[]))
+    """
+)
+
+DELETE_COURIER_WORKING_HOURS = text(
+    """
+    DELETE FROM courier_working_hours
+    WHERE courier_id = ANY(CAST(:courier_ids AS INTEGER[]))
+    """
+)
+
+# open orders of couriers whose profile changes, locked until the changed
+# profile is committed, and the delivery hours to check them against
+LOCK_OPEN_ORDERS = text(
+    """
+    SELECT orders.id, orders.courier_id, orders.weight, orders.region
+    FROM orders
+    WHERE orders.courier_id = ANY(CAST(:courier_ids AS INTEGER[]))
+        AND orders.completed_at IS NULL
+    ORDER BY orders.id
+    FOR UPDATE OF orders
+    """
+)
+
+ORDERS_DELIVERY_HOURS = text(
+    """
+    SELECT order_id, from_border, to_border
+    FROM order_delivery_hours
+    WHERE order_id = ANY(CAST(:order_ids AS INTEGER[]))
+    """
+)
+
+UNASSIGN_ORDERS = text(
+    """
+    UPDATE orders
+    SET courier_id = NULL, assigned_at = NULL
+    WHERE orders.id = ANY(CAST(:order_ids AS INTEGER[]))
+    """
+)
+
+
+def _earnings_case(column: str) -> str:
+    whens = " ".join(
+        f"WHEN '{courier_type.value}' THEN {factor * ORDER_BASE_EARNINGS}"
+        for courier_type, factor in COURIER_EARNINGS_FACTOR.items()
+    )
+    return f"CASE {column} {whens} ELSE 0 END"
+
+
+# adds the orders of the "completed" CTE to the running stats, grouped so
+# that a batch touches every stats row once
+_RECORD_COMPLETED = f"""
+    INSERT INTO courier_region_stats (
+        courier_id,
+        region,
+        orders_count,
+        first_assigned_at,
+        first_completed_at,
+        last_completed_at,
+        earnings
+    )
+    SELECT
+        courier_id,
+        region,
+        COUNT(*),
+        (ARRAY_AGG(assigned_at ORDER BY completed_at))[1],
+        MIN(completed_at),
+        MAX(completed_at),
+        SUM({_earnings_case("delivery_type")})
+    FROM completed
+    GROUP BY courier_id, region
+    ON CONFLICT (courier_id, region) DO UPDATE SET
+        orders_count =
+            courier_region_stats.orders_count + EXCLUDED.orders_count,
+        first_assigned_at = CASE
+            WHEN EXCLUDED.first_completed_at
+                < courier_region_stats.first_completed_at
+            THEN EXCLUDED.first_assigned_at
+            ELSE courier_region_stats.first_assigned_at
+        END,
+        first_completed_at = LEAST(
+            courier_region_stats.first_completed_at,
+            EXCLUDED.first_completed_at
+        ),
+        last_completed_at = GREATEST(
+            courier_region_stats.last_completed_at,
+            EXCLUDED.last_completed_at
+        ),
+        earnings = courier_region_stats.earnings + EXCLUDED.earnings
+"""
+
+_COMPLETED_COLUMNS = """
+    orders.id,
+    orders.courier_id,
+    orders.region,
+    orders.assigned_at,
+    orders.completed_at,
+    orders.delivery_type
+"""
+
+# a delivered order is never matched against shifts again, so its delivery
+# hours go, and the range index only covers the orders still to deliver
+_DELETE_COMPLETED_HOURS = """
+        DELETE FROM order_delivery_hours
+        USING completed
+        WHERE order_delivery_hours.order_id = completed.id"""
+
+# completes an open order and records it in the stats in one statement. A
+# replayed completion matches no open order and changes nothing, and the
+# order still comes back from the final SELECT, which sees the tables as
+# they were before the statement, archived or not; no row means no such
+# order for the courier
+COMPLETE_ORDER = text(
+    f"""
+    WITH completed AS (
+        UPDATE orders SET completed_at = :complete_time
+        WHERE orders.id = :order_id
+            AND orders.courier_id = :courier_id
+            AND orders.completed_at IS NULL
+        RETURNING {_COMPLETED_COLUMNS}
+    ), recorded AS (
+        {_RECORD_COMPLETED}
+    ), hours AS (
+        {_DELETE_COMPLETED_HOURS}
+    )
+    SELECT orders.id
+    FROM orders
+    WHERE orders.id = :order_id AND orders.courier_id = :courier_id
+    UNION ALL
+    SELECT orders_archive.id
+    FROM orders_archive
+    WHERE orders_archive.id = :order_id
+        AND orders_archive.courier_id = :courier_id
+    """
+)
+
+# the same for a batch of (order, courier, time) given as parallel arrays;
+# the orders left out of the result are missing or not the courier's
+COMPLETE_ORDERS = text(
+    f"""
+    WITH requested AS (
+        SELECT * FROM unnest(
+            CAST(:order_ids AS INTEGER[]),
+            CAST(:courier_ids AS INTEGER[]),
+            CAST(:complete_times AS TIMESTAMPTZ[])
+        ) AS requested (order_id, courier_id, complete_time)
+    ), completed AS (
+        UPDATE orders SET completed_at = requested.complete_time
+        FROM requested
+        WHERE orders.id = requested.order_id
+            AND orders.courier_id = requested.courier_id
+            AND orders.completed_at IS NULL
+        RETURNING {_COMPLETED_COLUMNS}
+    ), recorded AS (
+        {_RECORD_COMPLETED}
+    ), hours AS (
+        {_DELETE_COMPLETED_HOURS}
+    )
+    SELECT orders.id
+    FROM orders
+    JOIN requested
+        ON orders.id = requested.order_id
+        AND orders.courier_id = requested.courier_id
+    UNION ALL
+    SELECT orders_archive.id
+    FROM orders_archive
+    JOIN requested
+        ON orders_archive.id = requested.order_id
+        AND orders_archive.courier_id = requested.courier_id
+    """
+)
+
+# completed orders stay in orders until the archiver moves them to
+# orders_archive, the history is read from both
+_COMPLETED_HISTORY = """(
+        SELECT
+            id, courier_id, region, assigned_at, completed_at, delivery_type
+        FROM orders
+        WHERE completed_at IS NOT NULL
+        UNION ALL
+        SELECT
+            id, courier_id, region, assigned_at, completed_at, delivery_type
+        FROM orders_archive
+    )"""
+
+# completions upsert the stats under ROW EXCLUSIVE, which this conflicts
+# with: while a rebuild runs they wait, so none is lost or counted twice
+LOCK_COURIER_STATS = text(
+    "LOCK TABLE courier_region_stats IN SHARE ROW EXCLUSIVE MODE"
+)
+
+REBUILD_COURIER_STATS = text(
+    f"""
+    INSERT INTO courier_region_stats (
+        courier_id,
+        region,
+        orders_count,
+        first_assigned_at,
+        first_completed_at,
+        last_completed_at,
+        earnings
+    )
+    SELECT
+        courier_id,
+        region,
+        COUNT(*),
+        first_assigned_at,
+        MIN(completed_at),
+        MAX(completed_at),
+        SUM(earnings)
+    FROM (
+        SELECT
+            courier_id,
+            region,
+            completed_at,
+            FIRST_VALUE(assigned_at) OVER (
+                PARTITION BY courier_id, region ORDER BY completed_at
+            ) AS first_assigned_at,
+            {_earnings_case("delivery_type")} AS earnings
+        FROM {_COMPLETED_HISTORY} AS history
+    ) AS completed
+    GROUP BY courier_id, region, first_assigned_at
+    """
+)
+
+# the rating of a courier computed from the order history inside Postgres:
+# the same per-region average of delivery times as RatingAccumulator, with
+# only the minimum over regions and the totals sent back
+COURIER_RATING = text(
+    f"""
+    SELECT
+        CAST(COALESCE(SUM(orders_count), 0) AS INTEGER) AS orders_count,
+        CAST(MIN(delivery_time) AS DOUBLE PRECISION) AS delivery_time,
+        CAST(COALESCE(SUM(earnings), 0) AS BIGINT) AS earnings
+    FROM (
+        SELECT
+            COUNT(*) AS orders_count,
+            AVG(delivery_time) AS delivery_time,
+            SUM(earnings) AS earnings
+        FROM (
+            SELECT
+                region,
+                EXTRACT(EPOCH FROM completed_at - COALESCE(
+                    LAG(completed_at) OVER (
+                        PARTITION BY region ORDER BY completed_at, id
+                    ),
+                    assigned_at
+                )) AS delivery_time,
+                {_earnings_case("delivery_type")} AS earnings
+            FROM {_COMPLETED_HISTORY} AS history
+            WHERE courier_id = :courier_id
+        ) AS deliveries
+        GROUP BY region
+    ) AS regions
+    """
+)
+
+# moves up to batch_size orders completed before the horizon to the archive
+# in one short transaction; orders locked by a concurrent statement are
+# left for the next batch instead of being waited for
+ARCHIVE_ORDERS = text(
+    """
+    WITH batch AS (
+        SELECT orders.id
+        FROM orders
+        WHERE orders.completed_at < :before
+        ORDER BY orders.completed_at
+        LIMIT :batch_size
+        FOR UPDATE OF orders SKIP LOCKED
+    ), hours AS (
+        DELETE FROM order_delivery_hours
+        USING batch
+        WHERE order_delivery_hours.order_id = batch.id
+    ), moved AS (
+        DELETE FROM orders
+        USING batch
+        WHERE orders.id = batch.id
+        RETURNING
+            orders.assigned_at,
+            orders.completed_at,
+            orders.weight,
+            orders.id,
+            orders.courier_id,
+            orders.region,
+            orders.delivery_type
+    ), archived AS (
+        INSERT INTO orders_archive (
+            assigned_at,
+            completed_at,
+            weight,
+            id,
+            courier_id,
+            region,
+            delivery_type
+        )
+        SELECT * FROM moved
+        RETURNING 1
+    )
+    SELECT COUNT(*) FROM archived
+    """
+)
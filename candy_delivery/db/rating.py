@@ -0,0 +1,90 @@
+from datetime import datetime
+from typing import Iterable, NamedTuple, Optional, Tuple
+
+from candy_delivery.db.schema import (
+    COURIER_EARNINGS_FACTOR,
+    ORDER_BASE_EARNINGS,
+    CourierType,
+)
+
+
+SECONDS_PER_HOUR = 60 * 60
+
+# a completed order of a courier: (region, assigned_at, completed_at,
+# delivery_type), in the order the query returns them
+CompletedOrderRow = Tuple[int, datetime, datetime, Optional[CourierType]]
+
+
+class CourierRating(NamedTuple):
+    orders_count: int
+    rating: float
+    earnings: int
+
+
+def rating_by_delivery_time(t: float) -> float:
+    raw_rating = (
+        (SECONDS_PER_HOUR - min(t, SECONDS_PER_HOUR)) / SECONDS_PER_HOUR * 5
+    )
+    return round(raw_rating, 2)
+
+
+class RatingAccumulator:
+    # reduces the completed orders of a courier, sorted by region and
+    # completed_at, in one pass. Only the running sums of the current region
+    # are kept, so memory does not grow with the history. Delivery times are
+    # added up one by one as floats, the way the per-region lists were
+    # summed before, so the rating is the same to the last bit.
+    def __init__(self):
+        self.orders_count = 0
+        self.earnings = 0
+        self._min_delivery_time: Optional[float] = None
+        self._region: Optional[int] = None
+        self._previous: Optional[datetime] = None
+        self._region_total = 0.0
+        self._region_count = 0
+
+    def add(
+        self,
+        region: int,
+        assigned_at: datetime,
+        completed_at: datetime,
+        delivery_type: Optional[CourierType],
+    ):
+        if region != self._region:
+            self._close_region()
+            self._region = region
+            # the first order of a region is timed from its assignment
+            self._previous = assigned_at
+
+        self._region_total += (completed_at - self._previous).total_seconds()
+        self._region_count += 1
+        self._previous = completed_at
+
+        self.orders_count += 1
+        self.earnings += ORDER_BASE_EARNINGS * COURIER_EARNINGS_FACTOR.get(
+            delivery_type, 0
+        )
+
+    def extend(self, rows: Iterable[CompletedOrderRow]):
+        for row in rows:
+            self.add(*row)
+
+    def result(self) -> CourierRating:
+        self._close_region()
+        rating = 0.0
+        if self._min_delivery_time is not None:
+            rating = rating_by_delivery_time(self._min_delivery_time)
+        return CourierRating(self.orders_count, rating, self.earnings)
+
+    def _close_region(self):
+        if self._region_count == 0:
+            return
+        delivery_time = self._region_total / self._region_count
+        if (
+            self._min_delivery_time is None
+            or delivery_time < self._min_delivery_time
+        ):
+            self._min_delivery_time = delivery_time
+        self._region = None
+        self._region_total = 0.0
+        self._region_count = 0
@@ -0,0 +1,26 @@
+import asyncio
+import logging
+import os
+import sys
+
+from candy_delivery.db.dao import DAO
+
+
+log = logging.getLogger(__name__)
+
+
+# recomputes courier_region_stats from the order history, e.g. after fixing
+# the stats by hand; completions wait for it instead of being lost:
+#   python3 -m candy_delivery.db.rebuild_stats
+async def main():
+    db_url = os.getenv('DB_URL')
+    if not db_url:
+        sys.exit('no DB URL!')
+
+    log.info("rebuild courier stats...")
+    await DAO(db_url).rebuild_courier_stats()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
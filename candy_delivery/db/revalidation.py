@@ -0,0 +1,166 @@
+from itertools import chain
+from typing import Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from candy_delivery.intervals import MINUTES_PER_DAY, IntervalSet
+
+
+# float sums of weights like 0.01 must not push a courier over capacity
+WEIGHT_EPSILON = 1e-6
+
+_REGION_SHIFT = 32
+_SHIFT_KEY = MINUTES_PER_DAY + 1
+
+
+class CourierChange(NamedTuple):
+    # the profile a courier gets; None keeps regions or shifts as they are
+    courier_id: int
+    max_weight: float
+    regions: Optional[Sequence[int]] = None
+    shifts: Optional[IntervalSet] = None
+
+
+# rows of the locked open orders: (id, courier_id, weight, region), and of
+# their delivery hours: (order_id, from_border, to_border) in HHMM
+OrderRow = Tuple[int, int, float, int]
+WindowRow = Tuple[int, int, int]
+
+
+def orders_to_drop(
+    changes: Sequence[CourierChange],
+    orders: Sequence[OrderRow],
+    windows: Iterable[WindowRow],
+) -> List[int]:
+    # all couriers of a batch are evaluated at once: region membership and
+    # window fit are array lookups, then the heaviest orders left over the
+    # new capacity are cut per courier
+    if not orders:
+        return []
+
+    change_ids = np.array([c.courier_id for c in changes], dtype=np.int64)
+    by_id = np.argsort(change_ids)
+    change_ids = change_ids[by_id]
+    changes = [changes[i] for i in by_id]
+
+    columns = _to_array(orders, np.float64, 4)
+    ids = columns[:, 0].astype(np.int64)
+    courier = np.searchsorted(change_ids, columns[:, 1].astype(np.int64))
+    weights = columns[:, 2]
+    regions = columns[:, 3].astype(np.int64)
+
+    keep = _fits_regions(changes, courier, regions)
+    keep &= _fits_shifts(changes, ids, courier, windows)
+    keep &= ~_over_capacity(changes, ids, courier, weights, keep)
+    return ids[~keep].tolist()
+
+
+def _to_array(rows: Iterable[tuple], dtype, width: int) -> np.ndarray:
+    # much cheaper than np.array() over a list of row tuples
+    return np.fromiter(chain.from_iterable(rows), dtype=dtype).reshape(
+        -1, width
+    )
+
+
+def _fits_regions(
+    changes: Sequence[CourierChange], courier: np.ndarray, regions: np.ndarray
+) -> np.ndarray:
+    changed = np.array([c.regions is not None for c in changes])
+    if not changed.any():
+        return np.ones(len(courier), dtype=bool)
+
+    allowed = np.sort(
+        np.array(
+            [
+                (i << _REGION_SHIFT) + region
+                for i, change in enumerate(changes)
+                if change.regions is not None
+                for region in change.regions
+            ],
+            dtype=np.int64,
+        )
+    )
+    keys = (courier << _REGION_SHIFT) + regions
+    found = np.searchsorted(allowed, keys)
+    allowed = np.append(allowed, -1)
+    return ~changed[courier] | (allowed[found] == keys)
+
+
+def _fits_shifts(
+    changes: Sequence[CourierChange],
+    ids: np.ndarray,
+    courier: np.ndarray,
+    windows: Iterable[WindowRow],
+) -> np.ndarray:
+    changed = np.array([c.shifts is not None for c in changes])
+    if not changed.any():
+        return np.ones(len(ids), dtype=bool)
+
+    # merged shifts of all couriers, sorted by (courier, start)
+    shift_courier, shift_start, shift_end = [], [], []
+    for i, change in enumerate(changes):
+        if change.shifts is None:
+            continue
+        for start, end in change.shifts:
+            shift_courier.append(i)
+            shift_start.append(start)
+            shift_end.append(end)
+    shift_courier = np.array(shift_courier, dtype=np.int64)
+    shift_keys = shift_courier * _SHIFT_KEY + np.array(
+        shift_start, dtype=np.int64
+    )
+    shift_end = np.array(shift_end, dtype=np.int64)
+
+    window_columns = _to_array(windows, np.int64, 3)
+    by_id = np.argsort(ids)
+    order = by_id[np.searchsorted(ids, window_columns[:, 0], sorter=by_id)]
+    hhmm = window_columns[:, 1:]
+    minutes = hhmm // 100 * 60 + hhmm % 100
+    window_courier = courier[order]
+
+    # shifts are disjoint, so only the last one starting before a window
+    # may contain it
+    candidate = np.searchsorted(
+        shift_keys, window_courier * _SHIFT_KEY + minutes[:, 0], side="right"
+    ) - 1
+    found = candidate >= 0
+    candidate = np.where(found, candidate, 0)
+    if len(shift_keys):
+        fits = (
+            found
+            & (shift_courier[candidate] == window_courier)
+            & (shift_end[candidate] >= minutes[:, 1])
+        )
+    else:
+        fits = np.zeros(len(order), dtype=bool)
+
+    order_fits = np.bincount(order, weights=fits, minlength=len(ids)) > 0
+    return ~changed[courier] | order_fits
+
+
+def _over_capacity(
+    changes: Sequence[CourierChange],
+    ids: np.ndarray,
+    courier: np.ndarray,
+    weights: np.ndarray,
+    keep: np.ndarray,
+) -> np.ndarray:
+    max_weight = np.array([c.max_weight for c in changes], dtype=np.float64)
+    kept_weights = np.where(keep, weights, 0.0)
+    total = np.bincount(courier, weights=kept_weights, minlength=len(changes))
+
+    # heaviest first within each courier; what is left before an order is
+    # the courier total minus the heavier orders already cut
+    order = np.lexsort((ids, -weights, courier))
+    sorted_courier = courier[order]
+    sorted_weights = kept_weights[order]
+    heavier = np.cumsum(sorted_weights) - sorted_weights
+    first = np.searchsorted(sorted_courier, sorted_courier)
+    heavier -= heavier[first]
+    left = total[sorted_courier] - heavier
+
+    over = np.zeros(len(ids), dtype=bool)
+    over[order] = keep[order] & (
+        left > max_weight[sorted_courier] + WEIGHT_EPSILON
+    )
+    return over
@@ -1,10 +1,14 @@
 from enum import Enum, unique
-import os
-import sys
-from sqlalchemy.engine import create_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.sql.schema import Column, ForeignKey
-from sqlalchemy.sql.sqltypes import Enum as dbEnum, Float, Integer, TIMESTAMP
+from sqlalchemy.sql.expression import cast, func, literal_column, text
+from sqlalchemy.sql.schema import Column, ForeignKey, Index
+from sqlalchemy.sql.sqltypes import (
+    BigInteger,
+    Enum as dbEnum,
+    Float,
+    Integer,
+    TIMESTAMP,
+)
 from sqlalchemy.orm import relationship
 
 
@@ -15,6 +19,20 @@ class CourierType(Enum):
     car = "car"
 
 
+COURIER_MAX_WEIGHT = {
+    CourierType.foot: 10,
+    CourierType.bike: 15,
+    CourierType.car: 50,
+}
+
+COURIER_EARNINGS_FACTOR = {
+    CourierType.foot: 2,
+    CourierType.bike: 5,
+    CourierType.car: 9,
+}
+ORDER_BASE_EARNINGS = 500
+
+
 Base = declarative_base()
 
 
@@ -41,7 +59,10 @@ class CourierRegionsTable(Base):
     __tablename__ = "courier_regions"
     id = Column(Integer, primary_key=True)
     courier_id = Column(
-        Integer, ForeignKey("couriers.id", ondelete="CASCADE"), nullable=False
+        Integer,
+        ForeignKey("couriers.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True,
     )
     region = Column(Integer, nullable=False)
 
@@ -50,7 +71,10 @@ class CourierWorkingHoursTable(Base):
     __tablename__ = "courier_working_hours"
     id = Column(Integer, primary_key=True)
     courier_id = Column(
-        Integer, ForeignKey("couriers.id", ondelete="CASCADE"), nullable=False
+        Integer,
+        ForeignKey("couriers.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True,
     )
     from_border = Column(Integer, nullable=False, index=True)
     to_border = Column(Integer, nullable=False, index=True)
@@ -76,19 +100,121 @@ class OrdersTable(Base):
         passive_deletes=True,
     )
 
+    __table_args__ = (
+        # the foreign key index, also used for the courier's open orders and
+        # for its history sorted by completion
+        Index("ix_orders_courier_completed_at", "courier_id", "completed_at"),
+        # assignment only ever looks at open orders of the courier's regions
+        Index(
+            "ix_orders_open_region_weight",
+            "region",
+            "weight",
+            postgresql_where=text("courier_id IS NULL"),
+        ),
+        # remaining capacity sums the courier's undelivered orders
+        Index(
+            "ix_orders_courier_open",
+            "courier_id",
+            postgresql_where=text("completed_at IS NULL"),
+        ),
+        # completed orders by age, for the archiver
+        Index(
+            "ix_orders_completed_at",
+            "completed_at",
+            postgresql_where=text("completed_at IS NOT NULL"),
+        ),
+        # the rating reads the courier's history already sorted from here
+        Index(
+            "ix_orders_courier_completed",
+            "courier_id",
+            "region",
+            "completed_at",
+            postgresql_where=text("completed_at IS NOT NULL"),
+        ),
+    )
+
+
+# completed orders moved out of orders once they are older than the archive
+# horizon. Only what the history stats read is kept, without delivery
+# hours, and the 8-byte columns go first so rows carry no alignment padding
+class OrdersArchiveTable(Base):
+    __tablename__ = "orders_archive"
+    assigned_at = Column(TIMESTAMP(timezone=True), nullable=False)
+    completed_at = Column(TIMESTAMP(timezone=True), nullable=False)
+    weight = Column(Float, nullable=False)
+    # the ID of the order, never generated here
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    courier_id = Column(
+        Integer, ForeignKey("couriers.id", ondelete="CASCADE"), nullable=False
+    )
+    region = Column(Integer, nullable=False)
+    delivery_type = Column(
+        dbEnum(CourierType, name="courier_type"),
+        nullable=True,
+    )
+
+    __table_args__ = (
+        Index(
+            "ix_orders_archive_courier_completed",
+            "courier_id",
+            "region",
+            "completed_at",
+        ),
+    )
+
 
 class OrderDeliveryHoursTable(Base):
     __tablename__ = "order_delivery_hours"
     id = Column(Integer, primary_key=True)
     order_id = Column(
-        Integer, ForeignKey("orders.id", ondelete="CASCADE"), nullable=False
+        Integer,
+        ForeignKey("orders.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True,
     )
+    # the order's, so that the range index can be searched by region
+    region = Column(Integer, nullable=False)
     from_border = Column(Integer, nullable=False, index=True)
     to_border = Column(Integer, nullable=False, index=True)
 
-db_url = os.getenv('DB_SYNC_URL')
-if not db_url:
-    sys.exit('no sync DB URL!')
 
-engine = create_engine(db_url)
-Base.metadata.create_all(engine)
+# running aggregates of completed orders per courier and region. Rating needs
+# the sum of delivery times, which telescopes over orders sorted by completion
+# to (last completed_at - assigned_at of the first completed order), so three
+# timestamps and a counter are enough to keep it exact.
+class CourierRegionStatsTable(Base):
+    __tablename__ = "courier_region_stats"
+    courier_id = Column(
+        Integer,
+        ForeignKey("couriers.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    region = Column(Integer, primary_key=True)
+    orders_count = Column(Integer, nullable=False)
+    first_assigned_at = Column(TIMESTAMP(timezone=True), nullable=False)
+    first_completed_at = Column(TIMESTAMP(timezone=True), nullable=False)
+    last_completed_at = Column(TIMESTAMP(timezone=True), nullable=False)
+    earnings = Column(Integer, nullable=False)
+
+
+# HHMM borders offset by region * 10000, so that every region has a block
+# of its own and a lookup only walks the windows of the region asked for
+def delivery_range(region, from_border, to_border):
+    key = cast(region, BigInteger) * 10000
+    return func.int8range(
+        key + from_border, key + to_border, literal_column("'[]'")
+    )
+
+
+# containment of a delivery window in a working shift is answered by GiST.
+# Only orders not yet delivered have delivery hours: completing an order
+# deletes them, so the index stays the size of the open backlog
+Index(
+    "ix_order_delivery_hours_region_range",
+    delivery_range(
+        OrderDeliveryHoursTable.region,
+        OrderDeliveryHoursTable.from_border,
+        OrderDeliveryHoursTable.to_border,
+    ),
+    postgresql_using="gist",
+)
@@ -0,0 +1,112 @@
+import asyncio
+import weakref
+from typing import Awaitable, Callable, Iterable, List, TypeVar
+
+from candy_delivery import metrics
+
+
+DISPATCHER_KEY = "dispatcher"
+
+T = TypeVar("T")
+
+_dispatchers = weakref.WeakSet()
+
+
+def _collect_queued():
+    queued = {}
+    for dispatcher in list(_dispatchers):
+        for shard, size in enumerate(dispatcher.queued()):
+            queued[shard] = queued.get(shard, 0) + size
+    return [((str(shard),), size) for shard, size in queued.items()]
+
+
+metrics.gauge(
+    "assign_dispatch_queued",
+    "Assignments waiting in the queue of a region shard",
+    labelnames=("shard",),
+    collect=_collect_queued,
+)
+
+
+class _Job:
+    def __init__(self, func: Callable[[], Awaitable], shards: int) -> None:
+        self.func = func
+        # shard workers yet to reach the job; the last one runs it
+        self.waiting = shards
+        self.result = asyncio.get_event_loop().create_future()
+        self.finished = asyncio.Event()
+
+
+class Dispatcher:
+    # regions are split into shards, each with a queue and a worker task
+    # that runs its assignments one at a time, so assignments of one worker
+    # process wait in memory instead of holding pool connections while they
+    # wait for each other's row locks. A job spanning several shards is put
+    # into all their queues at once and runs when every one of their
+    # workers has reached it; since jobs are enqueued without awaiting in
+    # between, every queue holds them in the same order and shards can't
+    # wait for each other in a cycle
+    def __init__(self, shards: int) -> None:
+        self._queues: List[asyncio.Queue] = [
+            asyncio.Queue() for _ in range(shards)
+        ]
+        self._workers = [
+            asyncio.ensure_future(self._work(queue)) for queue in self._queues
+        ]
+        _dispatchers.add(self)
+
+    @property
+    def shards(self) -> int:
+        return len(self._queues)
+
+    def shard(self, region: int) -> int:
+        return region % len(self._queues)
+
+    def queued(self) -> List[int]:
+        return [queue.qsize() for queue in self._queues]
+
+    async def run(
+        self, regions: Iterable[int], func: Callable[[], Awaitable[T]]
+    ) -> T:
+        shards = sorted({self.shard(region) for region in regions})
+        if not shards:
+            return await func()
+        job = _Job(func, len(shards))
+        for shard in shards:
+            self._queues[shard].put_nowait(job)
+        return await job.result
+
+    async def run_everywhere(self, func: Callable[[], Awaitable[T]]) -> T:
+        return await self.run(range(len(self._queues)), func)
+
+    async def _work(self, queue: asyncio.Queue):
+        while True:
+            job = await queue.get()
+            job.waiting -= 1
+            if job.waiting > 0:
+                # holds the shard until the job ran on the last one
+                await job.finished.wait()
+                continue
+            try:
+                # a caller that went away doesn't need its assignment
+                if not job.result.done():
+                    result = await job.func()
+                    if not job.result.done():
+                        job.result.set_result(result)
+            except asyncio.CancelledError:
+                # closing: the caller would otherwise wait forever
+                job.result.cancel()
+                raise
+            except Exception as ex:
+                if not job.result.done():
+                    job.result.set_exception(ex)
+            finally:
+                job.finished.set()
+
+    async def close(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        for queue in self._queues:
+            while not queue.empty():
+                queue.get_nowait().result.cancel()
@@ -5,6 +5,10 @@ from pydantic.main import BaseModel
 from candy_delivery.api.schema import CourierType
 
 
+# DTOs carry data that is already validated, by the request models or by
+# the DB schema, so the handlers and the DAO build them with construct();
+# validation is left for untrusted input such as the shared courier cache
+
 class WorkingHoursDTO(BaseModel):
     from_border: int
     to_border: int
@@ -35,9 +39,35 @@ class OrdersDTO(BaseModel):
     data: List[OrderDTO] = []
 
 
-class CourierWithOrdersDTO(BaseModel):
+class CompletionDTO(BaseModel):
+    order_id: int
+    courier_id: int
+    completed_at: datetime
+
+
+class CourierWithRatingDTO(BaseModel):
+    courier: CourierDTO
+    orders_count: int = 0
+    rating: float = 0
+    earnings: int = 0
+
+
+class RegionStatsDTO(BaseModel):
+    region: int
+    orders_count: int
+    first_assigned_at: datetime
+    last_completed_at: datetime
+    earnings: int
+
+
+class CourierWithStatsDTO(BaseModel):
     courier: CourierDTO
-    orders: List[OrderDTO] = []
+    regions: List[RegionStatsDTO] = []
+
+
+class UpdatedCourierDTO(BaseModel):
+    courier: CourierDTO
+    unassigned_orders: List[int] = []
 
 
 class CDNoResultFound(Exception):
@@ -48,3 +78,13 @@ class CDNoResultFound(Exception):
     
     def __repr__(self) -> str:
         return f'details: {self.details}, ex: {self.error}'
+
+
+class CDValidationError(Exception):
+    def __init__(self, *args: object, error: object, details: object) -> None:
+        super().__init__(*args)
+        self.error = error
+        self.details = details
+
+    def __repr__(self) -> str:
+        return f'details: {self.details}, ex: {self.error}'
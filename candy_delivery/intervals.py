@@ -0,0 +1,131 @@
+from array import array
+from bisect import bisect_right
+from typing import Iterable, Iterator, List, Tuple
+
+
+# time of day in minutes since midnight, 0..1440; windows are closed
+# intervals. The tables keep the borders as HHMM integers (10:30 -> 1030),
+# which sort the same way, so they are converted only at the DB boundary.
+
+MINUTES_PER_DAY = 24 * 60
+
+Interval = Tuple[int, int]
+
+
+def from_hhmm(value: int) -> int:
+    return value // 100 * 60 + value % 100
+
+
+def to_hhmm(minutes: int) -> int:
+    return minutes // 60 * 100 + minutes % 60
+
+
+def parse_minutes(value: str) -> int:
+    # "HH:MM" from 00:00 to 24:00
+    hours, minutes = value.split(":")
+    minutes = int(minutes)
+    total = int(hours) * 60 + minutes
+    if not 0 <= minutes < 60 or not 0 <= total <= MINUTES_PER_DAY:
+        raise ValueError(f"time {value} is out of range")
+    return total
+
+
+def parse_borders(window: str) -> Interval:
+    # "HH:MM-HH:MM" as given: start > end for a window crossing midnight
+    from_border, to_border = window.split("-")
+    return parse_minutes(from_border), parse_minutes(to_border)
+
+
+def split_midnight(start: int, end: int) -> List[Interval]:
+    if start > end:
+        return [(start, MINUTES_PER_DAY), (0, end)]
+    return [(start, end)]
+
+
+def parse_window(window: str) -> List[Interval]:
+    # a window crossing midnight is split in two
+    return split_midnight(*parse_borders(window))
+
+
+def format_minutes(minutes: int) -> str:
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def format_windows(intervals: Iterable[Interval]) -> List[str]:
+    # shifts are stored the way they were sent, so a window crossing
+    # midnight comes back as one reversed interval and isn't joined here
+    return [
+        f"{format_minutes(start)}-{format_minutes(end)}"
+        for start, end in intervals
+    ]
+
+
+class IntervalSet:
+    # sorted, merged, non-overlapping intervals as two parallel arrays, so
+    # containment and overlap are a binary search over the starts
+    __slots__ = ("_starts", "_ends")
+
+    def __init__(self, intervals: Iterable[Interval] = ()) -> None:
+        self._starts = array("H")
+        self._ends = array("H")
+        for start, end in sorted(intervals):
+            if start > end:
+                raise ValueError(f"interval {start}-{end} is reversed")
+            # touching intervals are merged too: 10:00-11:00 and 11:00-12:00
+            # mean being available from 10:00 to 12:00
+            if self._ends and start <= self._ends[-1]:
+                self._ends[-1] = max(self._ends[-1], end)
+            else:
+                self._starts.append(start)
+                self._ends.append(end)
+
+    @classmethod
+    def from_hhmm(cls, borders: Iterable[Tuple[int, int]]) -> "IntervalSet":
+        # stored shifts crossing midnight are split here
+        return cls(
+            interval
+            for from_border, to_border in borders
+            for interval in split_midnight(
+                from_hhmm(from_border), from_hhmm(to_border)
+            )
+        )
+
+    @classmethod
+    def parse(cls, windows: Iterable[str]) -> "IntervalSet":
+        return cls(
+            interval for window in windows for interval in parse_window(window)
+        )
+
+    def __len__(self) -> int:
+        return len(self._starts)
+
+    def __iter__(self) -> Iterator[Interval]:
+        return zip(self._starts, self._ends)
+
+    def __bool__(self) -> bool:
+        return len(self._starts) > 0
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, IntervalSet):
+            return NotImplemented
+        return self._starts == other._starts and self._ends == other._ends
+
+    def __repr__(self) -> str:
+        return f"IntervalSet({list(self)})"
+
+    def contains(self, start: int, end: int) -> bool:
+        i = bisect_right(self._starts, start) - 1
+        return i >= 0 and end <= self._ends[i]
+
+    def overlaps(self, start: int, end: int) -> bool:
+        i = bisect_right(self._starts, end) - 1
+        return i >= 0 and self._ends[i] >= start
+
+    def contains_any(self, intervals: Iterable[Interval]) -> bool:
+        return any(self.contains(start, end) for start, end in intervals)
+
+    def to_hhmm(self) -> Tuple[List[int], List[int]]:
+        return (
+            [to_hhmm(start) for start in self._starts],
+            [to_hhmm(end) for end in self._ends],
+        )
@@ -0,0 +1,211 @@
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+
+# a minimal Prometheus-style registry: label children are cached by their
+# values, so recording on the hot path is a dict lookup plus an addition
+
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+)
+
+LabelValues = Tuple[str, ...]
+Collector = Callable[[], Iterable[Tuple[LabelValues, float]]]
+
+
+class _Metric(ABC):
+    kind = ""
+
+    # a collector is called at render time and returns (labels, value) pairs,
+    # for values that are cheaper to read on scrape than to keep up to date
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        labelnames=(),
+        collect: Optional[Collector] = None,
+    ) -> None:
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[LabelValues, object] = {}
+        self._collect = collect
+        # label pairs added to every sample, set through the registry
+        self.const_labels = ""
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = self._new_child()
+        return child
+
+    @abstractmethod
+    def _new_child(self):
+        pass
+
+    def _format_labels(self, values: LabelValues, extra: str = "") -> str:
+        pairs = [
+            f'{name}="{value}"' for name, value in zip(self.labelnames, values)
+        ]
+        if self.const_labels:
+            pairs.append(self.const_labels)
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    @abstractmethod
+    def samples(self) -> List[str]:
+        pass
+
+    def render(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {self.description}",
+            f"# TYPE {self.name} {self.kind}",
+        ] + self.samples()
+
+
+class _Value:
+    __slots__ = ("value",)
+
+    def __init__(self) -> None:
+        self.value = 0.0
+
+    def inc(self, amount: float = 1) -> None:
+        self.value += amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class _ValueMetric(_Metric):
+    def _new_child(self):
+        return _Value()
+
+    def samples(self) -> List[str]:
+        values = [
+            (labels, child.value) for labels, child in self._children.items()
+        ]
+        if self._collect is not None:
+            values.extend(self._collect())
+        return [
+            f"{self.name}{self._format_labels(labels)} {value}"
+            for labels, value in values
+        ]
+
+
+class Counter(_ValueMetric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1) -> None:
+        self.labels().inc(amount)
+
+
+class Gauge(_ValueMetric):
+    kind = "gauge"
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds: Tuple[float, ...]) -> None:
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        labelnames=(),
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, description, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def samples(self) -> List[str]:
+        lines = []
+        for values, child in self._children.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), child.counts):
+                cumulative += count
+                labels = self._format_labels(values, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = self._format_labels(values)
+            lines.append(f"{self.name}_sum{labels} {child.sum}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+        self._const_labels = ""
+
+    def register(self, metric: _Metric) -> _Metric:
+        metric.const_labels = self._const_labels
+        self._metrics[metric.name] = metric
+        return metric
+
+    # labels of the whole process, e.g. the worker, so that the workers
+    # behind one port report separate series instead of overwriting each
+    # other's on every scrape
+    def set_const_labels(self, **labels: str):
+        self._const_labels = ",".join(
+            f'{name}="{value}"' for name, value in labels.items()
+        )
+        for metric in self._metrics.values():
+            metric.const_labels = self._const_labels
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(
+    name: str,
+    description: str,
+    labelnames=(),
+    collect: Optional[Collector] = None,
+) -> Counter:
+    return REGISTRY.register(Counter(name, description, labelnames, collect))
+
+
+def gauge(
+    name: str,
+    description: str,
+    labelnames=(),
+    collect: Optional[Collector] = None,
+) -> Gauge:
+    return REGISTRY.register(Gauge(name, description, labelnames, collect))
+
+
+def histogram(
+    name: str,
+    description: str,
+    labelnames=(),
+    buckets: Tuple[float, ...] = DEFAULT_BUCKETS,
+) -> Histogram:
+    return REGISTRY.register(Histogram(name, description, labelnames, buckets))
@@ -0,0 +1,21 @@
+import os
+from typing import Dict, Type, TypeVar
+
+from pydantic import BaseModel
+
+
+SettingsModel = TypeVar("SettingsModel", bound=BaseModel)
+
+
+# builds the settings from the environment variables named for its fields;
+# unset ones keep the defaults and pydantic converts and checks the values
+def settings_from_env(
+    cls: Type[SettingsModel], env_names: Dict[str, str]
+) -> SettingsModel:
+    return cls(
+        **{
+            field: os.environ[env_name]
+            for field, env_name in env_names.items()
+            if env_name in os.environ
+        }
+    )
@@ -1,51 +1,139 @@
+import asyncio
 import logging
 import os
 import sys
+import time
 from aiohttp import web
 from aiohttp_pydantic import oas
 
+from candy_delivery.db.archive import (
+    ARCHIVE_SETTINGS_KEY, MAINTENANCE_KEY, ArchiveSettings, run_maintenance
+)
+from candy_delivery.db.cache import courier_cache_from_env
+from candy_delivery.dispatch import DISPATCHER_KEY, Dispatcher
 from candy_delivery.db.dao import DAO, DAO_KEY
+from candy_delivery.db.migrations import (
+    SCHEMA_BOOTSTRAP_KEY, SCHEMA_BOOTSTRAP_MIGRATE, SCHEMA_BOOTSTRAP_MODES
+)
+from candy_delivery.db.pool import POOL_SETTINGS_KEY, PoolSettings
+from candy_delivery.api.instrumentation import (
+    metrics_middleware, setup_metrics
+)
 from candy_delivery.api.middleware import error_middleware
+from candy_delivery.api.streaming import INGEST_SETTINGS_KEY, IngestSettings
 
-from candy_delivery.api.get_courier_stats import GetCourierStats
+from candy_delivery.api.get_courier_stats import (
+    GetCourierStats, STATS_SOURCE_KEY, STATS_SOURCES
+)
+from candy_delivery.api.health import Health, WORKER_KEY
 from candy_delivery.api.complete_order import CompleteOrder
-from candy_delivery.api.assign_orders import AssignOrders
+from candy_delivery.api.complete_orders_batch import CompleteOrdersBatch
+from candy_delivery.api.assign_orders import (
+    AssignOrders, ASSIGN_LOCK_MODE_KEY, ASSIGN_LOCK_MODES
+)
+from candy_delivery.api.assign_orders_batch import AssignOrdersBatch
 from candy_delivery.api.add_orders import AddOrders
 from candy_delivery.api.update_courier import UpdateCourier
+from candy_delivery.api.update_couriers import UpdateCouriers
 from candy_delivery.api.add_couriers import AddCouriers
 
 
 log = logging.getLogger(__name__)
 
-app = web.Application(middlewares=[error_middleware])
+app = web.Application(middlewares=[metrics_middleware, error_middleware])
 
 log.info("register handlers...")
 app.add_routes(
     [
         web.post("/couriers", AddCouriers),
+        web.patch("/couriers", UpdateCouriers),
         web.patch("/couriers/{courier_id}", UpdateCourier),
         web.post("/orders", AddOrders),
         web.post("/orders/assign", AssignOrders),
+        web.post("/orders/assign/batch", AssignOrdersBatch),
         web.post("/orders/complete", CompleteOrder),
+        web.post("/orders/complete/batch", CompleteOrdersBatch),
         web.get("/couriers/{courier_id}", GetCourierStats),
+        web.get("/health", Health),
     ]
 )
 
+setup_metrics(app)
+
 log.info('try to get DB URL...')
 db_url = os.getenv('DB_URL')
 if not db_url:
     sys.exit('no DB URL!')
 
-log.info("setup docs...")
-oas.setup(app, url_prefix="/docs")
+stats_source = os.getenv('COURIER_STATS_SOURCE', STATS_SOURCES[0])
+if stats_source not in STATS_SOURCES:
+    sys.exit(f'COURIER_STATS_SOURCE must be one of {STATS_SOURCES}')
+app[STATS_SOURCE_KEY] = stats_source
+
+assign_lock_mode = os.getenv('ASSIGN_LOCK_MODE', ASSIGN_LOCK_MODES[0])
+if assign_lock_mode not in ASSIGN_LOCK_MODES:
+    sys.exit(f'ASSIGN_LOCK_MODE must be one of {ASSIGN_LOCK_MODES}')
+app[ASSIGN_LOCK_MODE_KEY] = assign_lock_mode
+
+# 0 sends assignments straight to the DB, N > 0 queues them per shard of
+# regions inside each worker process
+assign_shards = os.getenv('ASSIGN_SHARDS', '0')
+if not assign_shards.isdigit():
+    sys.exit('ASSIGN_SHARDS must be a non-negative integer')
+assign_shards = int(assign_shards)
+
+app[INGEST_SETTINGS_KEY] = IngestSettings.from_env()
+app[ARCHIVE_SETTINGS_KEY] = ArchiveSettings.from_env()
+
+schema_bootstrap = os.getenv(
+    'DB_SCHEMA_BOOTSTRAP', SCHEMA_BOOTSTRAP_MODES[0]
+)
+if schema_bootstrap not in SCHEMA_BOOTSTRAP_MODES:
+    sys.exit(f'DB_SCHEMA_BOOTSTRAP must be one of {SCHEMA_BOOTSTRAP_MODES}')
+app[SCHEMA_BOOTSTRAP_KEY] = schema_bootstrap
+
+if os.getenv('API_DOCS', 'true').lower() in ('1', 'true', 'yes'):
+    log.info("setup docs...")
+    oas.setup(app, url_prefix="/docs")
 
 
 async def on_startup(app):
+    started = time.perf_counter()
     log.info("connect to DB...")
-    app[DAO_KEY] = DAO(db_url)
+    app[DAO_KEY] = DAO(
+        db_url,
+        courier_cache=courier_cache_from_env(),
+        pool_settings=app.get(POOL_SETTINGS_KEY) or PoolSettings.from_env(),
+    )
+    # the schema is checked here rather than on import, so importing the
+    # application does not need a database
+    if app[SCHEMA_BOOTSTRAP_KEY] == SCHEMA_BOOTSTRAP_MIGRATE:
+        await app[DAO_KEY].migrate()
+    if assign_shards:
+        app[DISPATCHER_KEY] = Dispatcher(assign_shards)
+    # one maintenance task per server: under serve.py only the first worker
+    # runs it
+    if not app.get(WORKER_KEY):
+        app[MAINTENANCE_KEY] = asyncio.ensure_future(
+            run_maintenance(app[DAO_KEY], app[ARCHIVE_SETTINGS_KEY])
+        )
+    log.info("started in %.3f s", time.perf_counter() - started)
+
+
+async def on_cleanup(app):
+    maintenance = app.get(MAINTENANCE_KEY)
+    if maintenance is not None:
+        maintenance.cancel()
+        await asyncio.gather(maintenance, return_exceptions=True)
+    dispatcher = app.get(DISPATCHER_KEY)
+    if dispatcher is not None:
+        await dispatcher.close()
+    log.info("disconnect from DB...")
+    await app[DAO_KEY].close()
 
 
 app.on_startup.append(on_startup)
+app.on_cleanup.append(on_cleanup)
 
 
 if __name__ == "__main__":
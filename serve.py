@@ -0,0 +1,282 @@
+import asyncio
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+from typing import Dict, Optional, Set
+
+from pydantic import BaseModel, ValidationError
+
+from candy_delivery.settings import settings_from_env
+
+
+log = logging.getLogger(__name__)
+
+# a worker that dies sooner than this after start is restarted with a delay,
+# so a broken config does not turn into a fork loop
+MIN_WORKER_UPTIME = 1.0
+
+
+class ServeSettings(BaseModel):
+    workers: int = os.cpu_count() or 1
+    host: str = "0.0.0.0"
+    port: int = 8080
+    backlog: int = 1024
+    # seconds a stopping worker gets to finish the requests in flight
+    drain_timeout: float = 30
+    # DB connections for the whole server, split between the workers
+    max_connections: Optional[int] = None
+
+    @classmethod
+    def from_env(cls) -> "ServeSettings":
+        env_names = {
+            "workers": "WEB_WORKERS",
+            "host": "WEB_HOST",
+            "port": "WEB_PORT",
+            "backlog": "WEB_BACKLOG",
+            "drain_timeout": "WEB_DRAIN_TIMEOUT",
+            "max_connections": "DB_MAX_CONNECTIONS",
+        }
+        return settings_from_env(cls, env_names)
+
+
+def bind(settings: ServeSettings) -> socket.socket:
+    # bound once here and inherited by every worker, so the port stays open
+    # while workers are replaced
+    sock = socket.create_server(
+        (settings.host, settings.port), backlog=settings.backlog
+    )
+    sock.set_inheritable(True)
+    return sock
+
+
+async def serve(app, sock: socket.socket, drain_timeout: float):
+    from aiohttp import web
+
+    runner = web.AppRunner(app, handle_signals=False)
+    await runner.setup()
+    site = web.SockSite(runner, sock, shutdown_timeout=drain_timeout)
+    await site.start()
+
+    stopping = asyncio.Event()
+    asyncio.get_running_loop().add_signal_handler(
+        signal.SIGTERM, stopping.set
+    )
+    await stopping.wait()
+    # stops accepting, waits for the requests in flight up to
+    # drain_timeout, then runs on_cleanup, which closes the pool
+    await runner.cleanup()
+
+
+def run_worker(index: int, sock: socket.socket, settings: ServeSettings):
+    from candy_delivery import metrics
+    from candy_delivery.api.health import WORKER_KEY
+    from candy_delivery.db.pool import POOL_SETTINGS_KEY, PoolSettings
+    from main import app
+
+    # by pid rather than index: while reloading, the old and the new worker
+    # with the same index serve side by side
+    metrics.REGISTRY.set_const_labels(worker=str(os.getpid()))
+    app[WORKER_KEY] = index
+    app[POOL_SETTINGS_KEY] = PoolSettings.from_env().per_worker(
+        settings.workers, settings.max_connections
+    )
+    asyncio.run(serve(app, sock, settings.drain_timeout))
+
+
+async def migrate(db_url: str):
+    from candy_delivery.db.dao import DAO
+
+    dao = DAO(db_url)
+    try:
+        await dao.migrate()
+    finally:
+        await dao.close()
+
+
+def exit_code(status: int) -> int:
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+class Master:
+    def __init__(self, settings: ServeSettings, sock: socket.socket):
+        self.settings = settings
+        self.sock = sock
+        self.workers: Dict[int, int] = {}
+        self.started: Dict[int, float] = {}
+        self.retiring: Set[int] = set()
+        self.respawn_at: Dict[int, float] = {}
+        self.stopping = False
+        self.reloading = False
+
+    def spawn(self, index: int):
+        pid = os.fork()
+        if pid == 0:
+            # Ctrl-C and SIGHUP are for the master, which then stops or
+            # replaces the workers with SIGTERM
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            signal.signal(signal.SIGHUP, signal.SIG_IGN)
+            code = 0
+            try:
+                run_worker(index, self.sock, self.settings)
+            except BaseException:
+                log.exception("worker %d failed", index)
+                code = 1
+            finally:
+                logging.shutdown()
+                os._exit(code)
+
+        log.info("worker %d started, pid %d", index, pid)
+        self.workers[pid] = index
+        self.started[pid] = time.monotonic()
+
+    def on_stop(self, signum, frame):
+        self.stopping = True
+
+    def on_reload(self, signum, frame):
+        self.reloading = True
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.on_stop)
+        signal.signal(signal.SIGINT, self.on_stop)
+        signal.signal(signal.SIGHUP, self.on_reload)
+
+        for index in range(self.settings.workers):
+            self.spawn(index)
+
+        while not self.stopping:
+            if self.reloading:
+                self.reloading = False
+                self.reload()
+            self.reap()
+            self.respawn()
+            time.sleep(0.2)
+        self.stop()
+
+    def reload(self):
+        # a new generation starts serving before the old one drains, so the
+        # socket is never left without a worker accepting. The workers are
+        # forked from the master, so they run the code and the config it
+        # loaded at start; picking up new ones takes a restart of serve.py
+        old = dict(self.workers)
+        log.info("restarting %d workers", len(old))
+        for index in sorted(old.values()):
+            self.spawn(index)
+        for pid in old:
+            self.retire(pid)
+
+    def retire(self, pid: int):
+        index = self.workers.pop(pid)
+        self.retiring.add(pid)
+        log.info("draining worker %d, pid %d", index, pid)
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+    def reap(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+
+            started = self.started.pop(pid, None)
+            if pid in self.retiring:
+                self.retiring.discard(pid)
+                continue
+            index = self.workers.pop(pid, None)
+            if index is None:
+                continue
+
+            log.error(
+                "worker %d, pid %d exited with status %d",
+                index,
+                pid,
+                exit_code(status),
+            )
+            respawn_at = time.monotonic()
+            if started is not None:
+                respawn_at = max(respawn_at, started + MIN_WORKER_UPTIME)
+            self.respawn_at[index] = respawn_at
+
+    def respawn(self):
+        now = time.monotonic()
+        for index, at in list(self.respawn_at.items()):
+            if at <= now:
+                del self.respawn_at[index]
+                self.spawn(index)
+
+    def stop(self):
+        for pid in list(self.workers):
+            self.retire(pid)
+
+        deadline = time.monotonic() + self.settings.drain_timeout + 5
+        while self.retiring and time.monotonic() < deadline:
+            self.reap()
+            time.sleep(0.1)
+
+        for pid in self.retiring:
+            log.warning("killing worker pid %d", pid)
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        self.sock.close()
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    try:
+        settings = ServeSettings.from_env()
+    except ValidationError as ex:
+        sys.exit(f"bad server settings: {ex}")
+    if settings.workers < 1:
+        sys.exit("WEB_WORKERS must be at least 1")
+
+    # the local courier cache is per worker: a profile updated through one
+    # worker would stay stale in the others
+    cache_backend = os.getenv("COURIER_CACHE_BACKEND")
+    if settings.workers > 1:
+        if cache_backend == "local":
+            sys.exit(
+                "the local courier cache can't be shared by workers: set"
+                " COURIER_CACHE_BACKEND to shared or none"
+            )
+        if cache_backend is None:
+            os.environ["COURIER_CACHE_BACKEND"] = "none"
+
+    # the app is imported once before forking: config errors stop the
+    # server right away and the workers share the loaded code
+    import main as app_module
+    from candy_delivery.db.migrations import (
+        SCHEMA_BOOTSTRAP_KEY,
+        SCHEMA_BOOTSTRAP_MIGRATE,
+        SCHEMA_BOOTSTRAP_NONE,
+    )
+
+    # the schema is brought up to date once here, not by every worker
+    app = app_module.app
+    if app[SCHEMA_BOOTSTRAP_KEY] == SCHEMA_BOOTSTRAP_MIGRATE:
+        asyncio.run(migrate(app_module.db_url))
+        app[SCHEMA_BOOTSTRAP_KEY] = SCHEMA_BOOTSTRAP_NONE
+
+    sock = bind(settings)
+    log.info(
+        "serving on %s:%d with %d workers",
+        settings.host,
+        settings.port,
+        settings.workers,
+    )
+    Master(settings, sock).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import random
+
+import pytest
+
+from candy_delivery.db.assignment import solve_assignment
+
+
+def test_lightest_first():
+    # the lightest orders fill the courier, the heaviest one is left over
+    assigned = solve_assignment(
+        {1: 10}, [(1, 1, 6), (1, 2, 3), (1, 3, 4), (1, 4, 2)]
+    )
+    assert assigned == {1: [4, 2, 3]}
+
+
+def test_ties_by_order_id():
+    assigned = solve_assignment({1: 2}, [(1, 3, 1), (1, 1, 1), (1, 2, 1)])
+    assert assigned == {1: [1, 2]}
+
+
+def test_most_room_left():
+    assigned = solve_assignment(
+        {1: 10, 2: 15}, [(1, 1, 2), (2, 1, 2), (1, 2, 3), (2, 2, 3)]
+    )
+    # 1 goes to the courier with 15, which then has 13 left
+    assert assigned == {1: [], 2: [1, 2]}
+
+    assigned = solve_assignment(
+        {1: 10, 2: 5}, [(1, 1, 4), (2, 1, 4), (1, 2, 5), (2, 2, 5)]
+    )
+    # 10 -> 6 left after order 1, still more than 5
+    assert assigned == {1: [1, 2], 2: []}
+
+
+def test_only_eligible_couriers():
+    assigned = solve_assignment({1: 50, 2: 10}, [(2, 1, 1)])
+    assert assigned == {1: [], 2: [1]}
+
+
+def test_order_taken_once():
+    assigned = solve_assignment(
+        {1: 10, 2: 10}, [(1, 1, 1), (2, 1, 1), (1, 2, 1), (2, 2, 1)]
+    )
+    taken = assigned[1] + assigned[2]
+    assert sorted(taken) == [1, 2]
+
+
+def test_unknown_courier_gets_nothing():
+    assert solve_assignment({1: 10}, [(2, 1, 1)]) == {1: []}
+
+
+@pytest.mark.parametrize("seed", range(30))
+def test_capacity_never_exceeded(seed):
+    rnd = random.Random(seed)
+    capacities = {c_id: rnd.choice((10, 15, 50)) for c_id in range(1, 6)}
+    candidates = []
+    weights = {}
+    for order_id in range(1, 80):
+        weights[order_id] = round(rnd.uniform(0.01, 20), 2)
+        for courier_id in rnd.sample(list(capacities), rnd.randint(1, 3)):
+            candidates.append((courier_id, order_id, weights[order_id]))
+
+    assigned = solve_assignment(capacities, candidates)
+
+    eligible = {(c_id, o_id) for c_id, o_id, _ in candidates}
+    taken = [o_id for orders in assigned.values() for o_id in orders]
+    assert len(taken) == len(set(taken))
+    for courier_id, orders in assigned.items():
+        assert all((courier_id, o_id) in eligible for o_id in orders)
+        load = sum(weights[o_id] for o_id in orders)
+        assert load <= capacities[courier_id]
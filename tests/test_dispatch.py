@@ -0,0 +1,176 @@
+import asyncio
+
+import pytest
+
+from candy_delivery.dispatch import Dispatcher
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_shard_is_region_modulo():
+    async def check():
+        dispatcher = Dispatcher(4)
+        try:
+            assert dispatcher.shards == 4
+            assert [dispatcher.shard(r) for r in (0, 1, 4, 5, 11, 400)] == [
+                0, 1, 0, 1, 3, 0
+            ]
+        finally:
+            await dispatcher.close()
+
+    run(check())
+
+
+def test_jobs_run_on_their_shard():
+    async def check():
+        dispatcher = Dispatcher(4)
+        release = asyncio.Event()
+        try:
+            # region 5 holds shard 1, region 2 on shard 2 doesn't wait
+            held = asyncio.ensure_future(dispatcher.run([5], release.wait))
+            await asyncio.sleep(0)
+            same_shard = asyncio.ensure_future(
+                dispatcher.run([9], lambda: asyncio.sleep(0, "9"))
+            )
+            other = await dispatcher.run([2], lambda: asyncio.sleep(0, "2"))
+            assert other == "2"
+            await asyncio.sleep(0.01)
+            assert not same_shard.done()
+            assert dispatcher.queued() == [0, 1, 0, 0]
+
+            release.set()
+            await held
+            assert await same_shard == "9"
+            assert dispatcher.queued() == [0, 0, 0, 0]
+        finally:
+            await dispatcher.close()
+
+    run(check())
+
+
+def test_fifo_one_at_a_time_within_shard():
+    async def check():
+        dispatcher = Dispatcher(2)
+        order, running = [], []
+
+        def job(i):
+            async def func():
+                running.append(i)
+                assert len(running) == 1
+                await asyncio.sleep(0.001 * (5 - i % 5))
+                order.append(i)
+                running.remove(i)
+                return i
+
+            return func
+
+        try:
+            results = await asyncio.gather(
+                *(dispatcher.run([2 * i], job(i)) for i in range(10))
+            )
+            assert results == list(range(10))
+            assert order == list(range(10))
+        finally:
+            await dispatcher.close()
+
+    run(check())
+
+
+def test_job_across_shards_waits_for_all():
+    async def check():
+        dispatcher = Dispatcher(3)
+        release = asyncio.Event()
+        try:
+            held = asyncio.ensure_future(dispatcher.run([1], release.wait))
+            await asyncio.sleep(0)
+            both = asyncio.ensure_future(
+                dispatcher.run([0, 1], lambda: asyncio.sleep(0, "both"))
+            )
+            # shard 0 is taken by the spanning job until it has run
+            after = asyncio.ensure_future(
+                dispatcher.run([3], lambda: asyncio.sleep(0, "after"))
+            )
+            await asyncio.sleep(0.01)
+            assert not both.done() and not after.done()
+
+            release.set()
+            await held
+            assert await both == "both"
+            assert await after == "after"
+            assert await dispatcher.run_everywhere(
+                lambda: asyncio.sleep(0, "all")
+            ) == "all"
+        finally:
+            await dispatcher.close()
+
+    run(check())
+
+
+def test_no_regions_runs_directly():
+    async def check():
+        dispatcher = Dispatcher(2)
+        try:
+            assert await dispatcher.run([], lambda: asyncio.sleep(0, 1)) == 1
+            assert dispatcher.queued() == [0, 0]
+        finally:
+            await dispatcher.close()
+
+    run(check())
+
+
+def test_error_reaches_caller_and_shard_goes_on():
+    async def check():
+        dispatcher = Dispatcher(1)
+
+        async def fail():
+            raise ValueError("no")
+
+        try:
+            with pytest.raises(ValueError):
+                await dispatcher.run([0], fail)
+            assert await dispatcher.run([0], lambda: asyncio.sleep(0, 1)) == 1
+        finally:
+            await dispatcher.close()
+
+    run(check())
+
+
+def test_close_cancels_running_and_queued():
+    async def check():
+        dispatcher = Dispatcher(2)
+        started = asyncio.Event()
+        cancelled = []
+
+        async def hold():
+            started.set()
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append("running")
+                raise
+
+        running = asyncio.ensure_future(dispatcher.run([0], hold))
+        await started.wait()
+        queued = [
+            asyncio.ensure_future(
+                dispatcher.run([0], lambda: asyncio.sleep(0, "ran"))
+            )
+            for _ in range(3)
+        ]
+        await asyncio.sleep(0)
+        assert dispatcher.queued() == [3, 0]
+
+        await dispatcher.close()
+        assert cancelled == ["running"]
+        assert dispatcher.queued() == [0, 0]
+        for future in queued:
+            with pytest.raises(asyncio.CancelledError):
+                await future
+        # the running job's caller isn't left waiting forever
+        await asyncio.wait_for(
+            asyncio.gather(running, return_exceptions=True), 1
+        )
+
+    run(check())
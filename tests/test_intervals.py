@@ -0,0 +1,86 @@
+import pytest
+
+from candy_delivery.intervals import (
+    IntervalSet,
+    format_windows,
+    parse_borders,
+    parse_window,
+)
+
+
+def test_touching_intervals_merge():
+    intervals = IntervalSet([(660, 720), (600, 660), (800, 900)])
+    assert list(intervals) == [(600, 720), (800, 900)]
+
+
+def test_overlapping_intervals_merge():
+    intervals = IntervalSet([(600, 700), (650, 680), (690, 750)])
+    assert list(intervals) == [(600, 750)]
+
+
+def test_reversed_interval_rejected():
+    with pytest.raises(ValueError):
+        IntervalSet([(700, 600)])
+
+
+def test_from_hhmm_splits_midnight():
+    intervals = IntervalSet.from_hhmm([(2200, 200), (1000, 1100)])
+    assert list(intervals) == [(0, 120), (600, 660), (1320, 1440)]
+    assert intervals.contains(1380, 1440)
+    assert intervals.contains(0, 60)
+    assert not intervals.contains(1380, 1500)
+
+
+def test_from_hhmm_round_trip():
+    intervals = IntervalSet.from_hhmm([(930, 1145), (2330, 2400)])
+    assert intervals.to_hhmm() == ([930, 2330], [1145, 2400])
+
+
+def test_contains_and_overlaps():
+    intervals = IntervalSet([(600, 720), (800, 900)])
+    assert intervals.contains(600, 720)
+    assert not intervals.contains(700, 810)
+    assert intervals.overlaps(700, 810)
+    assert intervals.overlaps(720, 730)
+    assert not intervals.overlaps(730, 790)
+    assert intervals.contains_any([(0, 10), (810, 820)])
+    assert not IntervalSet().contains(0, 0)
+
+
+def test_parse_window():
+    assert parse_window("09:30-11:00") == [(570, 660)]
+    assert parse_window("22:00-02:00") == [(1320, 1440), (0, 120)]
+    assert parse_window("00:00-24:00") == [(0, 1440)]
+
+
+@pytest.mark.parametrize(
+    "window",
+    [
+        "",
+        "09:00",
+        "09:00-",
+        "9-10",
+        "aa:bb-10:00",
+        "09:00-10:00-11:00",
+        "25:00-26:00",
+        "10:60-11:00",
+        "-1:00-02:00",
+        "23:00-24:01",
+    ],
+)
+def test_parse_window_rejects_bad_input(window):
+    with pytest.raises(ValueError):
+        parse_window(window)
+
+
+@pytest.mark.parametrize(
+    "windows",
+    [
+        ["09:30-11:00"],
+        ["00:00-24:00", "10:00-10:00"],
+        ["22:00-02:00", "09:00-18:00"],
+        ["23:00-24:00", "00:00-01:00"],
+    ],
+)
+def test_format_windows_round_trip(windows):
+    assert format_windows(parse_borders(w) for w in windows) == windows
@@ -0,0 +1,135 @@
+import asyncio
+import os
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from candy_delivery.db.dao import DAO
+from candy_delivery.db.rating import (
+    CourierRating,
+    RatingAccumulator,
+    rating_by_delivery_time,
+)
+from candy_delivery.db.schema import CourierType
+
+
+START = datetime(2021, 3, 1, 10, 0, tzinfo=timezone.utc)
+
+
+def at(minutes: float) -> datetime:
+    return START + timedelta(minutes=minutes)
+
+
+# (id, region, assigned_at, completed_at, delivery_type, archived): the
+# orders of one assignment share assigned_at and are timed one after the
+# other, a region's first order from the assignment
+HISTORY = [
+    (1, 1, at(0), at(10), CourierType.car, True),
+    (2, 1, at(0), at(25), CourierType.car, True),
+    (3, 1, at(30), at(31), CourierType.bike, False),
+    (4, 2, at(0), at(50), CourierType.foot, True),
+    (5, 2, at(0), at(110), CourierType.foot, False),
+    (6, 3, at(200), at(200.5), None, False),
+    (7, 3, at(200), at(207), CourierType.car, False),
+    (8, 1, at(300), at(300), CourierType.car, False),
+]
+
+
+def sorted_rows(history):
+    return [
+        (region, assigned_at, completed_at, delivery_type)
+        for _, region, assigned_at, completed_at, delivery_type, _ in sorted(
+            history, key=lambda row: (row[1], row[3], row[0])
+        )
+    ]
+
+
+def test_rating_by_delivery_time():
+    assert rating_by_delivery_time(0) == 5
+    assert rating_by_delivery_time(1800) == 2.5
+    assert rating_by_delivery_time(3600) == 0
+    assert rating_by_delivery_time(7200) == 0
+
+
+def test_accumulator_on_fixture():
+    accumulator = RatingAccumulator()
+    accumulator.extend(sorted_rows(HISTORY))
+    # region 1: 10, 15, 6, 0 minutes; region 2: 50, 60; region 3: 0.5, 6.5
+    times = {
+        1: (10 + 15 + 6 + 0) / 4,
+        2: (50 + 60) / 2,
+        3: (0.5 + 6.5) / 2,
+    }
+    assert accumulator.result() == CourierRating(
+        orders_count=8,
+        rating=rating_by_delivery_time(min(times.values()) * 60),
+        earnings=500 * (9 * 4 + 5 + 2 * 2),
+    )
+
+
+def test_accumulator_without_history():
+    assert RatingAccumulator().result() == CourierRating(0, 0.0, 0)
+
+
+# the same history in Postgres, checked against COURIER_RATING; runs only
+# with TEST_DB_URL set, migrates that database and rolls its rows back
+TEST_DB_URL = os.getenv("TEST_DB_URL")
+
+
+@pytest.mark.skipif(not TEST_DB_URL, reason="TEST_DB_URL is not set")
+def test_accumulator_matches_query():
+    async def check():
+        dao = DAO(TEST_DB_URL)
+        try:
+            await dao.migrate()
+            async with dao._engine.connect() as conn:
+                transaction = await conn.begin()
+                try:
+                    session = AsyncSession(bind=conn)
+                    await insert_history(session)
+                    expected = await dao._query_rating(session, 900001)
+                    accumulator = RatingAccumulator()
+                    accumulator.extend(sorted_rows(HISTORY))
+                    assert accumulator.result() == expected
+                    # the accumulator over the rows the DAO streams
+                    streamed = await dao._stream_rating(session, 900001)
+                    assert streamed == expected
+
+                    empty = await dao._query_rating(session, 900002)
+                    assert empty == CourierRating(0, 0.0, 0)
+                    assert await dao._stream_rating(session, 900002) == empty
+                finally:
+                    await transaction.rollback()
+        finally:
+            await dao.close()
+
+    asyncio.run(check())
+
+
+async def insert_history(session: AsyncSession):
+    await session.execute(
+        text(
+            "INSERT INTO couriers (id, courier_type)"
+            " VALUES (900001, 'car'), (900002, 'foot')"
+        )
+    )
+    for row in HISTORY:
+        order_id, region, assigned_at, completed_at, delivery_type = row[:5]
+        table = "orders_archive" if row[5] else "orders"
+        await session.execute(
+            text(
+                f"INSERT INTO {table} (id, weight, region, courier_id,"
+                " assigned_at, completed_at, delivery_type)"
+                " VALUES (:id, 1, :region, 900001, :assigned_at,"
+                " :completed_at, CAST(:delivery_type AS courier_type))"
+            ),
+            {
+                "id": 900000 + order_id,
+                "region": region,
+                "assigned_at": assigned_at,
+                "completed_at": completed_at,
+                "delivery_type": delivery_type and delivery_type.value,
+            },
+        )
@@ -0,0 +1,110 @@
+import random
+from collections import defaultdict
+from typing import List
+
+import pytest
+
+from candy_delivery.db.revalidation import (
+    WEIGHT_EPSILON,
+    CourierChange,
+    orders_to_drop,
+)
+from candy_delivery.intervals import IntervalSet, from_hhmm, to_hhmm
+
+
+# the rules checked order by order, as update_courier did before
+def drop_loop(changes, orders, windows) -> List[int]:
+    by_courier = {change.courier_id: change for change in changes}
+    order_windows = defaultdict(list)
+    for order_id, from_border, to_border in windows:
+        order_windows[order_id].append(
+            (from_hhmm(from_border), from_hhmm(to_border))
+        )
+
+    kept, dropped = defaultdict(list), []
+    for order_id, courier_id, weight, region in orders:
+        change = by_courier[courier_id]
+        fits = (
+            change.regions is None or region in set(change.regions)
+        ) and (
+            change.shifts is None
+            or change.shifts.contains_any(order_windows[order_id])
+        )
+        if fits:
+            kept[courier_id].append((weight, order_id))
+        else:
+            dropped.append(order_id)
+
+    for courier_id, courier_orders in kept.items():
+        left = sum(weight for weight, _ in courier_orders)
+        max_weight = by_courier[courier_id].max_weight + WEIGHT_EPSILON
+        for weight, order_id in sorted(
+            courier_orders, key=lambda o: (-o[0], o[1])
+        ):
+            if left <= max_weight:
+                break
+            dropped.append(order_id)
+            left -= weight
+    return dropped
+
+
+def random_batch(rnd: random.Random, couriers: int):
+    changes, orders, windows = [], [], []
+    order_id = 0
+    for courier_id in rnd.sample(range(1, 1000), couriers):
+        shifts = []
+        for _ in range(rnd.randint(0, 3)):
+            start = rnd.randrange(0, 22 * 60)
+            shifts.append((start, start + rnd.randrange(0, 120)))
+        regions = rnd.sample(range(1, 10), rnd.randint(0, 3))
+        changes.append(
+            CourierChange(
+                courier_id=courier_id,
+                max_weight=rnd.choice((10, 15, 50)),
+                # unchanged regions or shifts keep every order
+                regions=None if rnd.random() < 0.2 else regions,
+                shifts=None if rnd.random() < 0.2 else IntervalSet(shifts),
+            )
+        )
+        for _ in range(rnd.randint(0, 30)):
+            order_id += 1
+            orders.append(
+                (
+                    order_id,
+                    courier_id,
+                    rnd.choice((0.01, 0.5, 1, round(rnd.uniform(0.01, 8), 2))),
+                    rnd.randrange(1, 10),
+                )
+            )
+            for _ in range(rnd.randint(1, 3)):
+                start = rnd.randrange(0, 23 * 60)
+                end = min(start + rnd.randrange(0, 90), 24 * 60)
+                windows.append((order_id, to_hhmm(start), to_hhmm(end)))
+    rnd.shuffle(orders)
+    return changes, orders, windows
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_matches_loop(seed):
+    rnd = random.Random(seed)
+    changes, orders, windows = random_batch(rnd, rnd.randint(1, 8))
+    assert sorted(orders_to_drop(changes, orders, windows)) == sorted(
+        drop_loop(changes, orders, windows)
+    )
+
+
+def test_no_orders():
+    changes = [CourierChange(1, 10, [1], IntervalSet([(600, 720)]))]
+    assert orders_to_drop(changes, [], []) == []
+
+
+def test_heaviest_cut_first():
+    changes = [CourierChange(1, 10)]
+    orders = [(1, 1, 4, 1), (2, 1, 6, 1), (3, 1, 3, 1)]
+    assert orders_to_drop(changes, orders, []) == [2]
+
+
+def test_float_weights_fill_capacity_exactly():
+    changes = [CourierChange(1, 10)]
+    orders = [(i, 1, 0.1, 1) for i in range(1, 101)]
+    assert orders_to_drop(changes, orders, []) == []
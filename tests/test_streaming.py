@@ -0,0 +1,220 @@
+import asyncio
+import json
+from contextlib import asynccontextmanager
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+from candy_delivery.api.add_couriers import AddCouriers
+from candy_delivery.api.middleware import error_middleware
+from candy_delivery.api.streaming import (
+    INGEST_SETTINGS_KEY,
+    IngestSettings,
+    MalformedBody,
+    _JSONItemsReader,
+)
+from candy_delivery.db.dao import DAO_KEY
+from candy_delivery.dto.dto import CDValidationError
+
+
+class ChunkedStream:
+    # hands out the body in the given pieces, whatever size is asked for
+    def __init__(self, chunks):
+        self._chunks = list(chunks)
+
+    async def read(self, n: int = -1) -> bytes:
+        return self._chunks.pop(0) if self._chunks else b""
+
+
+def chunked(body: bytes, size: int):
+    return [body[i:i + size] for i in range(0, len(body), size)]
+
+
+def read_items(chunks, max_item_size=1024):
+    async def read():
+        reader = _JSONItemsReader(
+            ChunkedStream(chunks), "data", 1, max_item_size
+        )
+        return [item async for item in reader.items()]
+
+    return asyncio.run(read())
+
+
+BODY = json.dumps(
+    {
+        "data": [
+            {"courier_id": 1, "regions": [1, 12], "working_hours": []},
+            "quote \" bracket ] brace } comma , colon :",
+            "back\\slash é中 \U0001f69a",
+            [1, 2.5, None, True],
+            12345,
+        ]
+    },
+    ensure_ascii=False,
+).encode()
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 5, 7, 16, 64, len(BODY)])
+def test_items_split_across_chunks(size):
+    # multibyte characters and escapes are cut at every position too
+    assert read_items(chunked(BODY, size)) == json.loads(BODY)["data"]
+
+
+def test_escaped_strings():
+    body = r'{"data": ["\"]}", "\\", "é\n", "🚚"]}'.encode()
+    for size in range(1, len(body) + 1):
+        assert read_items(chunked(body, size)) == [
+            '"]}', "\\", "é\n", "\U0001f69a"
+        ]
+
+
+def test_whitespace_and_empty_list():
+    assert read_items([b' \n{ "data" :\t[ ] }\r\n']) == []
+
+
+@pytest.mark.parametrize("end", range(len(BODY)))
+def test_truncated_body(end):
+    with pytest.raises(MalformedBody):
+        read_items(chunked(BODY[:end], 4))
+
+
+@pytest.mark.parametrize(
+    "body",
+    [
+        b'{"data": [1 2]}',
+        b'{"data": [1,]}',
+        b'{"data": []} []',
+        b'[{"data": []}]',
+        b'{"data": ["\xff"]}',
+    ],
+)
+def test_malformed_body(body):
+    with pytest.raises(MalformedBody):
+        read_items([body])
+
+
+def test_item_too_large():
+    with pytest.raises(MalformedBody):
+        read_items(chunked(b'{"data": ["' + b"x" * 100 + b'"]}', 8), 50)
+
+
+@pytest.mark.parametrize(
+    "body, loc, msg, error_type",
+    [
+        (b"{}", "data", "field required", "value_error.missing"),
+        (
+            b'{"couriers": []}',
+            "couriers",
+            "extra fields not permitted",
+            "value_error.extra",
+        ),
+        (
+            b'{"data": [], "extra": 1}',
+            "extra",
+            "extra fields not permitted",
+            "value_error.extra",
+        ),
+        (
+            b'{"data": {}}',
+            "data",
+            "value is not a valid list",
+            "type_error.list",
+        ),
+    ],
+)
+def test_structure_errors(body, loc, msg, error_type):
+    with pytest.raises(CDValidationError) as ex:
+        read_items([body])
+    assert ex.value.details == [
+        {"loc": [loc], "msg": msg, "type": error_type, "in": "body"}
+    ]
+
+
+class FakeDAO:
+    def __init__(self) -> None:
+        self.couriers = []
+
+    @asynccontextmanager
+    async def ingest_couriers(self):
+        async def ingest(couriers):
+            self.couriers.extend(couriers)
+
+        yield ingest
+
+
+def post_couriers(body: bytes):
+    async def post():
+        app = web.Application(middlewares=[error_middleware])
+        # every body is streamed
+        app[INGEST_SETTINGS_KEY] = IngestSettings(
+            stream_threshold=0, chunk_size=2
+        )
+        app[DAO_KEY] = FakeDAO()
+        app.router.add_view("/couriers", AddCouriers)
+        async with TestClient(TestServer(app)) as client:
+            resp = await client.post("/couriers", data=body)
+            return resp.status, await resp.json(), app[DAO_KEY].couriers
+
+    return asyncio.run(post())
+
+
+def courier(courier_id: int, **fields) -> dict:
+    return {
+        "courier_id": courier_id,
+        "courier_type": "foot",
+        "regions": [1],
+        "working_hours": ["09:00-18:00"],
+        **fields,
+    }
+
+
+def test_streamed_import():
+    body = json.dumps({"data": [courier(i) for i in range(1, 6)]}).encode()
+    status, resp, couriers = post_couriers(body)
+    assert status == 201
+    assert resp == {"couriers": [{"id": i} for i in range(1, 6)]}
+    assert [c.courier_id for c in couriers] == [1, 2, 3, 4, 5]
+
+
+def test_streamed_missing_data():
+    status, resp, couriers = post_couriers(b"{}")
+    assert status == 400
+    assert resp == {
+        "validation_error": [
+            {
+                "loc": ["data"],
+                "msg": "field required",
+                "type": "value_error.missing",
+                "in": "body",
+            }
+        ]
+    }
+    assert couriers == []
+
+
+def test_streamed_invalid_items():
+    body = json.dumps(
+        {
+            "data": [
+                courier(1),
+                courier(2, courier_type="plane"),
+                courier(3),
+                courier(4, unknown=1),
+            ]
+        }
+    ).encode()
+    status, resp, couriers = post_couriers(body)
+    assert status == 400
+    assert resp == {
+        "validation_error": {"couriers": [{"id": 2}, {"id": 4}]}
+    }
+    assert couriers == []
+
+
+def test_streamed_truncated():
+    body = json.dumps({"data": [courier(1)]}).encode()
+    status, resp, couriers = post_couriers(body[:-3])
+    assert status == 400
+    assert resp == {"error": "Malformed JSON"}
+    assert couriers == []